@@ -0,0 +1,131 @@
+# Fonction : aligner les mesures de N capteurs sur des intervalles de temps communs
+#
+# Remplace l'appairage esp1 <-> esp2 : chaque mesure est rangee dans l'intervalle
+# (ALIGN_BUCKET_MS) qui contient son instant. Un intervalle est garde en memoire jusqu'a
+# ce que tous les capteurs attendus aient envoye, ou jusqu'a son echeance (voir
+# scheduler.py), puis ses mesures partent dans la file d'ecriture (ingest.py).
+# Chaque mesure garde son propre ts : l'intervalle sert seulement a regrouper les
+# mesures, et les graphiques mettent sur la meme ligne les mesures d'un meme
+# intervalle (snap, voir api.align_columns). Deux mesures d'un capteur dans le meme
+# intervalle sont ecrites toutes les deux.
+# Le cout d'une mesure ne depend pas du nombre de capteurs (pas de ligne vide ajoutee).
+
+try:
+    from app import ingest, scheduler
+except:
+    import ingest
+    import scheduler
+
+import atexit
+import os
+import threading
+
+# Largeur d'un intervalle (ms), par defaut l'intervalle d'envoi des ESP32 (SEND_INTERVAL)
+ALIGN_BUCKET_MS = int(os.environ.get('ALIGN_BUCKET_MS', 20000))
+# Attente maximum des autres capteurs apres la premiere mesure d'un intervalle (secondes)
+ALIGN_TIMEOUT = float(os.environ.get('ALIGN_TIMEOUT', 17.0))
+# Un capteur est attendu s'il a envoye dans les ALIGN_ACTIVE_BUCKETS derniers intervalles
+ALIGN_ACTIVE_BUCKETS = int(os.environ.get('ALIGN_ACTIVE_BUCKETS', 3))
+
+_buckets = {}    # debut de l'intervalle (ts ms) -> {sensor_id: [mesures]}
+_last_seen = {}  # sensor_id -> debut du dernier intervalle ou le capteur a envoye
+_written = {}    # debut de l'intervalle -> capteurs deja ecrits (mesure arrivee apres l'ecriture)
+_lock = threading.Lock()
+
+
+def snap(ts):
+    """Retourne le debut de l'intervalle qui contient ts (ms)"""
+    return ts - ts % ALIGN_BUCKET_MS
+
+
+def expected_sensors(bucket):
+    """Capteurs attendus pour un intervalle : ceux qui ont envoye recemment (appele avec _lock)"""
+    oldest = bucket - ALIGN_ACTIVE_BUCKETS * ALIGN_BUCKET_MS
+    return {sensor_id for sensor_id, seen in _last_seen.items() if seen >= oldest}
+
+
+def add(reading):
+    """
+    Range une mesure dans son intervalle
+    (dict {"sensor_id", "ts", "temperature", "humidity", "pressure"}, ts garde tel quel).
+    L'intervalle est ecrit des que tous les capteurs attendus ont envoye.
+    Retourne (debut de l'intervalle, True si l'intervalle est complet et ecrit).
+    """
+    sensor_id = reading["sensor_id"]
+    bucket = snap(reading["ts"])
+
+    with _lock:
+        if _last_seen.get(sensor_id, bucket) <= bucket:
+            _last_seen[sensor_id] = bucket
+
+        readings = _buckets.get(bucket)
+        if readings is None:
+            readings = _buckets[bucket] = {}
+            scheduler.schedule(bucket, ALIGN_TIMEOUT)
+        # Deux mesures du meme capteur dans un intervalle : les deux sont gardees
+        readings.setdefault(sensor_id, []).append(reading)
+
+        complete = expected_sensors(bucket) <= readings.keys() | _written.get(bucket, set())
+        if complete:
+            del _buckets[bucket]
+            scheduler.cancel(bucket)
+            _mark_written(bucket, readings)
+
+    if complete:
+        _write(readings)
+    return bucket, complete
+
+
+def pending_count():
+    """Retourne le nombre de mesures en attente dans les intervalles ouverts"""
+    with _lock:
+        return sum(len(sensor) for readings in _buckets.values() for sensor in readings.values())
+
+
+def flush_all():
+    """Ecrit tous les intervalles ouverts (appele a l'arret du serveur)"""
+    with _lock:
+        buckets = list(_buckets.items())
+        _buckets.clear()
+    for bucket, readings in buckets:
+        scheduler.cancel(bucket)
+        _write(readings)
+
+
+def timeout_callback(expired):
+    """
+    Appelee par le planificateur avec les intervalles dont l'echeance est depassee :
+    les mesures recues sont ecrites, sans ligne vide pour les capteurs absents.
+    """
+    for bucket, _ in expired:
+        with _lock:
+            readings = _buckets.pop(bucket, None)
+            if not readings:
+                continue
+            missing = expected_sensors(bucket) - readings.keys() - _written.get(bucket, set())
+            _mark_written(bucket, readings)
+        absent = ", ".join(f"esp{sensor_id}" for sensor_id in sorted(missing)) or "-"
+        count = sum(len(sensor) for sensor in readings.values())
+        print(f"Timeout intervalle {bucket}: {count} mesure(s) ecrite(s), capteurs absents: {absent}")
+        _write(readings)
+
+
+def _mark_written(bucket, readings):
+    """Retient les capteurs ecrits pour un intervalle, oublie les anciens intervalles (appele avec _lock)"""
+    _written.setdefault(bucket, set()).update(readings)
+    oldest = bucket - ALIGN_ACTIVE_BUCKETS * ALIGN_BUCKET_MS
+    for old in [b for b in _written if b < oldest]:
+        del _written[old]
+
+
+def _write(readings):
+    """Envoie les mesures d'un intervalle a la file d'ecriture"""
+    for sensor_id in sorted(readings):
+        for reading in readings[sensor_id]:
+            ingest.submit(reading)
+
+
+# Un seul planificateur : les echeances des intervalles
+scheduler.set_handler(timeout_callback)
+# Ecrire les intervalles ouverts avant de vider la file d'ecriture (atexit : ordre inverse)
+atexit.register(flush_all)
@@ -0,0 +1,287 @@
+# Fonction : calculs sur les series de mesures avec NumPy (reduction du nombre de points)
+#
+# Les graphiques n'ont pas besoin de dizaines de milliers de points : les series
+# sont reduites cote serveur, soit par intervalles de temps (moyenne/min/max),
+# soit avec l'algorithme LTTB (Largest-Triangle-Three-Buckets) qui garde la forme
+# de la courbe avec peu de points.
+# Statistiques d'une periode (moyenne, ecart-type, percentiles, moyennes glissantes)
+# calculees sur les tableaux entiers, sans boucle Python par mesure.
+
+import numpy as np
+
+PERCENTILES = (5, 50, 95)
+# Taille d'un bloc de calcul de la moyenne exponentielle, en constantes de temps
+# (exp(EMA_BLOCK) doit rester representable en float64)
+EMA_BLOCK = 100
+
+
+def to_float_array(rows):
+    """
+    Lignes de la DB -> tableau float64 (une ligne par ligne). NULL et valeurs non numeriques
+    (texte ecrit avant la validation des mesures) deviennent NaN au lieu de lever une exception.
+    """
+    try:
+        return np.array(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([[_as_float(value) for value in row] for row in rows], dtype=np.float64)
+
+
+def _as_float(value):
+    """Nombre -> float, autre chose (None, texte, bool) -> NaN"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+def to_arrays(rows):
+    """
+    Convertit des lignes (ts, valeur) en deux tableaux NumPy.
+    Les valeurs NULL (None) ou non numeriques deviennent NaN.
+    """
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    data = to_float_array(rows)
+    return data[:, 0].astype(np.int64), data[:, 1]
+
+
+def exact(values):
+    """
+    Valeurs mesurees -> float64, telles que stockees et servies par tous les niveaux
+    (DB, mois archives, resumes) : la representation la plus courte du float32
+    (21.3 et pas 21.299999237, 20.999998 et pas 20.99999870490893). NaN reste NaN.
+    """
+    return np.asarray(values, dtype=np.float32).astype(str).astype(np.float64)
+
+
+def exact_value(value):
+    """Une valeur mesuree (voir exact). None et valeurs non numeriques sont rendues telles quelles"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    return float(str(np.float32(value)))
+
+
+def to_json_list(values):
+    """
+    Convertit un tableau NumPy en liste Python, NaN -> None (null en JSON).
+    Un tableau float32 (mesures) garde la valeur recue : 21.3 et pas 21.299999237 (voir exact).
+    """
+    values = np.asarray(values)
+    values = exact(values) if values.dtype == np.float32 else values.astype(np.float64)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def parse_resolution(value):
+    """
+    Convertit une resolution ("30s", "5m", "1h", "1d" ou des millisecondes) en ms.
+    Leve ValueError si le format n'est pas reconnu.
+    """
+    units = {"s": 1000, "m": 60 * 1000, "h": 3600 * 1000, "d": 86400 * 1000}
+    value = str(value).strip().lower()
+    if value.isdigit():
+        return int(value)
+    if len(value) >= 2 and value[-1] in units and value[:-1].isdigit():
+        return int(value[:-1]) * units[value[-1]]
+    raise ValueError(f"resolution invalide: {value}")
+
+
+def bucket_aggregate(ts, values, start, width, count, rollup=None):
+    """
+    Regroupe une serie par intervalles de temps de largeur `width` (ms) a partir de `start`.
+    Retourne (moyenne, min, max) pour chacun des `count` intervalles, NaN si l'intervalle est vide.
+    rollup : resume deja calcule pour les periodes sans mesures brutes
+    (ts, somme, nombre, min, max), voir database.read_hourly.
+    ts doit etre trie (ordre croissant).
+    """
+    avg = np.full(count, np.nan)
+    low = np.full(count, np.nan)
+    high = np.full(count, np.nan)
+
+    valid = ~np.isnan(values)
+    ts, values = ts[valid], values[valid]
+    # Somme en float64 meme pour des valeurs float32 (mois archives, voir archive.py)
+    sums, sizes, lows, highs = values.astype(np.float64), np.ones(len(values)), values, values
+    if rollup is not None and len(rollup[0]):
+        ts = np.concatenate((rollup[0], ts))
+        sums, sizes, lows, highs = (np.concatenate((part, column)) for part, column in
+                                    zip(rollup[1:], (sums, sizes, lows, highs)))
+        order = np.argsort(ts, kind="stable")
+        ts, sums, sizes, lows, highs = ts[order], sums[order], sizes[order], lows[order], highs[order]
+    if len(ts) == 0:
+        return avg, low, high
+
+    index = np.clip((ts - start) // width, 0, count - 1).astype(np.int64)
+    # Debut de chaque groupe d'intervalles consecutifs (ts trie -> index trie)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(index)) + 1))
+    buckets = index[starts]
+
+    avg[buckets] = np.add.reduceat(sums, starts) / np.add.reduceat(sizes, starts)
+    low[buckets] = np.minimum.reduceat(lows, starts)
+    high[buckets] = np.maximum.reduceat(highs, starts)
+    return avg, low, high
+
+
+def bucket_starts(start, width, count):
+    """Debut (ts en ms) de chacun des `count` intervalles"""
+    return start + width * np.arange(count, dtype=np.int64)
+
+
+def lttb(ts, values, points):
+    """
+    Reduit une serie a `points` points avec Largest-Triangle-Three-Buckets.
+    Garde le premier et le dernier point, et dans chaque intervalle le point qui forme
+    le plus grand triangle avec le point retenu avant et la moyenne de l'intervalle suivant.
+    Les valeurs NaN sont ignorees. Retourne (ts, valeurs) reduits.
+    """
+    valid = ~np.isnan(values)
+    ts, values = ts[valid], values[valid]
+    size = len(ts)
+    if points >= size or points < 3:
+        return ts, values
+
+    x = ts.astype(np.float64)
+    # Bornes des points-2 intervalles entre le premier et le dernier point
+    edges = (np.arange(points - 1) * (size - 2) / (points - 2)).astype(np.int64) + 1
+    edges[-1] = size - 1
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Moyenne de l'intervalle suivant (le dernier point pour le dernier intervalle)
+        next_lo, next_hi = hi, (edges[i + 2] if i + 2 < len(edges) else size)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = values[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (values[lo:hi] - values[a])
+                      - (x[a] - x[lo:hi]) * (avg_y - values[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return ts[selected], values[selected]
+
+
+def describe(values, rollup=None):
+    """
+    Statistiques d'une serie : nombre de valeurs, valeurs absentes, moyenne, ecart-type
+    (population), min, max et percentiles (PERCENTILES). Les NaN (NULL en DB) sont masques (np.ma).
+    rollup : resume horaire des periodes sans mesures brutes (ts, somme, nombre, min, max),
+    voir database.read_hourly. Il compte dans count, mean, min et max ; l'ecart-type et les
+    percentiles ne peuvent pas etre calcules a partir du resume (None).
+    Retourne un dict pret pour le JSON (None si aucune valeur).
+    """
+    data = np.ma.masked_invalid(np.asarray(values, dtype=np.float64))
+    count = int(data.count())
+    names = ("mean", "std", "min", "max", *(f"p{p}" for p in PERCENTILES))
+    if rollup is not None and len(rollup[0]):
+        _, sums, sizes, lows, highs = rollup
+        total = count + int(sizes.sum())
+        raw = data.compressed()
+        stats = [(raw.sum() + sums.sum()) / total, np.nan,
+                 min(raw.min(initial=np.inf), lows.min()), max(raw.max(initial=-np.inf), highs.max()),
+                 *[np.nan] * len(PERCENTILES)]
+        stats = to_json_result(stats, values)
+        return {"count": total, "missing": len(data) - count, **dict(zip(names, stats))}
+    if count:
+        # np.ma n'a pas de percentile : calcul sur les valeurs presentes
+        stats = [data.mean(), data.std(), data.min(), data.max(), *np.percentile(data.compressed(), PERCENTILES)]
+    else:
+        stats = [np.nan] * len(names)
+    stats = to_json_result(stats, values)
+    return {"count": count, "missing": len(data) - count, **dict(zip(names, stats))}
+
+
+def with_rollup(ts, values, rollup):
+    """
+    Serie brute completee par le resume horaire (une moyenne par heure resumee, au debut
+    de l'heure), triee par ts. Sans resume, retourne la serie telle quelle.
+    """
+    if rollup is None or not len(rollup[0]):
+        return ts, values
+    ts = np.concatenate((rollup[0], ts))
+    values = np.concatenate((rollup[1] / rollup[2], np.asarray(values, dtype=np.float64)))
+    order = np.argsort(ts, kind="stable")
+    return ts[order], values[order]
+
+
+def rolling_mean(ts, values, window, at):
+    """
+    Moyenne glissante sur le temps : pour chaque instant de `at`, moyenne des valeurs
+    mesurees dans (t - window, t] (ms). Sommes cumulees + recherche dichotomique,
+    le cout ne depend pas de la largeur de la fenetre. NaN ignores, NaN si la fenetre est vide.
+    ts doit etre trie (ordre croissant).
+    """
+    data = np.ma.masked_invalid(np.asarray(values, dtype=np.float64))
+    valid = ~np.ma.getmaskarray(data)
+    ts, values = ts[valid], data.compressed()
+    at = np.asarray(at, dtype=np.int64)
+    if len(ts) == 0:
+        return np.full(len(at), np.nan)
+
+    # Sommes relatives a la premiere valeur : meilleure precision sur de longues series
+    sums = np.concatenate(([0.0], np.cumsum(values - values[0])))
+    lo = np.searchsorted(ts, at - window, side="right")
+    hi = np.searchsorted(ts, at, side="right")
+    sizes = hi - lo
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (sums[hi] - sums[lo]) / sizes + values[0]
+    result[sizes == 0] = np.nan
+    return result
+
+
+def ema(ts, values, span):
+    """
+    Moyenne mobile exponentielle sur le temps (constante de temps `span` ms), adaptee aux
+    mesures irregulieres : e_i = d_i * e_(i-1) + (1 - d_i) * x_i avec d_i = exp(-(t_i - t_(i-1)) / span).
+    Forme fermee par sommes cumulees, par blocs de EMA_BLOCK constantes de temps.
+    NaN ignores. Retourne (ts, ema) des valeurs presentes. ts doit etre trie (ordre croissant).
+    """
+    data = np.ma.masked_invalid(np.asarray(values, dtype=np.float64))
+    valid = ~np.ma.getmaskarray(data)
+    ts, values = ts[valid], data.compressed()
+    size = len(ts)
+    result = np.empty(size)
+    if size == 0:
+        return ts, result
+
+    x = ts.astype(np.float64) / span
+    # Poids de chaque nouvelle valeur (la premiere valeur demarre la moyenne : poids 1)
+    weights = np.empty(size)
+    weights[0] = 1.0
+    weights[1:] = -np.expm1(-np.diff(x))
+
+    previous, first = 0.0, 0
+    while first < size:
+        last = max(int(np.searchsorted(x, x[first] + EMA_BLOCK, side="right")), first + 1)
+        # e_j = D_j * (C + somme_k w_k x_k / D_k), D_j = exp(-(t_j - t_first) / span)
+        offsets = x[first:last] - x[first]
+        carry = previous * (1.0 - weights[first])
+        result[first:last] = np.exp(-offsets) * (
+            carry + np.cumsum(weights[first:last] * values[first:last] * np.exp(offsets)))
+        previous, first = result[last - 1], last
+    return ts, result
+
+
+def value_at(ts, values, at):
+    """Pour chaque instant de `at`, derniere valeur de la serie a ts <= t (NaN avant la premiere)"""
+    index = np.searchsorted(ts, np.asarray(at, dtype=np.int64), side="right") - 1
+    result = np.asarray(values, dtype=np.float64)[np.maximum(index, 0)] if len(ts) else np.full(len(index), np.nan)
+    result[index < 0] = np.nan
+    return result
+
+
+def sample_times(ts, points):
+    """Instants ou les series glissantes sont donnees : toutes les mesures, ou `points` instants regulierement espaces"""
+    if len(ts) <= points:
+        return np.asarray(ts, dtype=np.int64)
+    return np.linspace(ts[0], ts[-1], points).astype(np.int64)
+
+
+def to_json_result(values, source):
+    """Resultat d'un calcul -> liste JSON, avec la precision de la serie d'origine (float32 pour les mesures)"""
+    return to_json_list(np.asarray(values, dtype=np.float64).astype(_result_dtype(source)))
+
+
+def _result_dtype(source):
+    """float32 si la serie d'origine est en float32 : pas de faux chiffres (21.3 et pas 21.29999995)"""
+    return np.float32 if np.asarray(source).dtype == np.float32 else np.float64
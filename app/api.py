@@ -1,8 +1,19 @@
-from flask import jsonify,Blueprint,request
+from flask import jsonify,Blueprint,request,Response
+import hashlib
+import math
+import numpy as np
+from datetime import datetime, timezone
 try:
     import app.database as db
+    from app import align, cache, analytics, broadcast, charts, export
 except:
     import database as db
+    import align
+    import cache
+    import analytics
+    import broadcast
+    import charts
+    import export
 
 api = Blueprint("api",__name__)
 
@@ -27,20 +38,30 @@ def get_sensors_status():
     Retourne le statut de tous les capteurs avec leur derniere activite.
     Un capteur est considere "online" s'il a envoye des donnees dans les 2 dernieres minutes.
     """
+    return jsonify(sensors_status())
+
+
+def sensors_status(all_latest=None):
+    """
+    Calcule le statut de tous les capteurs (utilise par /sensors/status, /stream et /dashboard).
+    all_latest : dernieres mesures deja lues dans le cache (sinon lues ici). Aucune requete SQL.
+    """
     from datetime import datetime, timedelta
     from zoneinfo import ZoneInfo
 
-    sensors_status = db.get_all_sensors_status()
+    # Derniere activite de chaque capteur servie depuis le cache
+    if all_latest is None:
+        all_latest = cache.get_all_latest()
+    sensors_status = [
+        {"name": sensor, "last_activity": latest["last_activity"] if latest else None}
+        for sensor, latest in all_latest.items()
+    ]
     result = []
 
     now = datetime.now(ZoneInfo("Europe/Zurich"))
 
-    # Recuperer les noms personnalises depuis esp32_devices
-    esp32_devices = db.get_all_esp32_devices()
-    sensor_names = {}
-    for device in esp32_devices:
-        if device["sensor_number"]:
-            sensor_names[str(device["sensor_number"])] = device["name"]
+    # Noms personnalises (esp32_devices), depuis le registre des capteurs
+    sensor_names = db.get_sensor_names()
 
     for sensor in sensors_status:
         sensor_num = sensor["name"].replace("esp", "")
@@ -66,7 +87,7 @@ def get_sensors_status():
 
             # Calculer si le capteur est online (derniere activite < 2 minutes)
             try:
-                last_datetime = datetime.strptime(f"{last_date} {last_hour}", "%Y-%m-%d %H:%M:%S")
+                last_datetime = datetime.strptime(f"{last_date} {last_hour}", "%Y-%m-%d %H:%M:%S").replace(tzinfo=ZoneInfo("Europe/Zurich"))
                 diff = now - last_datetime
 
                 if diff.total_seconds() < 120:  # 2 minutes
@@ -89,7 +110,86 @@ def get_sensors_status():
 
         result.append(sensor_info)
 
-    return jsonify({"sensors": result, "count": len(result), "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")})
+    return {"sensors": result, "count": len(result), "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+broadcast.set_status_provider(sensors_status)
+
+
+@api.route("/stream")
+def stream():
+    """
+    Flux Server-Sent Events des nouvelles mesures et des changements de statut.
+    A l'ouverture : la derniere mesure de chaque capteur ("reading") et le statut ("status"),
+    puis un evenement a chaque nouvelle mesure ou changement de statut.
+    Trop de pages ouvertes (broadcast.STREAM_MAX_SUBSCRIBERS) : 503, la page actualise
+    /api/dashboard a la place (voir stream.js).
+    """
+    q = broadcast.subscribe()
+    if q is None:
+        return jsonify({"error": "Trop de connexions /api/stream"}), 503, {"Retry-After": "60"}
+    return Response(broadcast.stream(q, stream_initial_events()), mimetype="text/event-stream",
+                    headers=STREAM_HEADERS)
+
+
+# En-tetes du flux /stream (pas de cache, pas de mise en tampon par un proxy nginx)
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def stream_initial_events():
+    """Evenements envoyes a l'ouverture du flux : derniere mesure de chaque capteur et statut"""
+    initial = [("reading", broadcast.reading_event(table, entry))
+               for table, entry in cache.get_all_latest().items() if entry]
+    initial.append(("status", sensors_status()))
+    return initial
+
+
+@api.route("/dashboard")
+def get_dashboard():
+    """
+    Tout ce qu'il faut pour afficher le dashboard en une seule requete :
+    derniere mesure, statut et nom de chaque capteur.
+    L'ETag depend de la derniere mesure de chaque capteur, des statuts et des noms :
+    une page deja a jour recoit 304 Not Modified sans corps, sans lire les mesures.
+    Cout SQL par requete : deux PRAGMA data_version (cache des dernieres mesures et registre
+    des capteurs) ; si une autre connexion a ecrit depuis, en plus un SELECT sur
+    sensors.last_write (cache.py) et un sur registry_version, puis le rechargement des
+    seuls capteurs ecrits par un autre processus.
+    """
+    all_latest = cache.get_all_latest()
+    status = sensors_status(all_latest)
+
+    etag = dashboard_etag(all_latest, status)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        sensors = []
+        for sensor in status["sensors"]:
+            latest = all_latest.get(sensor["id"]) or {}
+            sensors.append({
+                **sensor,
+                "ts": latest.get("ts"),
+                "temperature": latest.get("temperature"),
+                "humidity": latest.get("humidity"),
+                "pressure": latest.get("pressure"),
+                "date": latest.get("date"),
+                "hour": latest.get("hour")
+            })
+        response = jsonify({"sensors": sensors, "count": len(sensors), "timestamp": status["timestamp"]})
+
+    response.set_etag(etag)
+    # Le navigateur garde la reponse mais redemande toujours avec If-None-Match
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def dashboard_etag(all_latest, status):
+    """ETag du dashboard : ts de la derniere mesure de chaque capteur + statuts et noms affiches"""
+    parts = [
+        f"{sensor['id']}:{(all_latest.get(sensor['id']) or {}).get('ts')}:{sensor['name']}:{sensor['status_text']}"
+        for sensor in status["sensors"]
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
 
 
 @api.route("/sensor/<int:sensor_id>/latest")
@@ -100,27 +200,23 @@ def get_sensor_latest(sensor_id):
     """
     table_name = f"esp{sensor_id}"
 
+    # Derniere mesure servie depuis le cache (pas de requete SQL)
+    all_latest = cache.get_all_latest()
+
     # Verifier si le capteur existe
-    if table_name not in db.get_all_sensors():
+    if table_name not in all_latest:
         return jsonify({"error": f"Capteur {sensor_id} non trouve"}), 404
 
-    try:
-        temp = db.read_data(table_name, column="temperature", order="id DESC LIMIT 1")
-        hum = db.read_data(table_name, column="humidity", order="id DESC LIMIT 1")
-        press = db.read_data(table_name, column="pressure", order="id DESC LIMIT 1")
-        date = db.read_data(table_name, column="date", order="id DESC LIMIT 1")
-        hour = db.read_data(table_name, column="hour", order="id DESC LIMIT 1")
+    latest = all_latest[table_name] or {}
 
-        return jsonify({
-            "sensor": sensor_id,
-            "temperature": temp[0][0] if temp else None,
-            "humidity": hum[0][0] if hum else None,
-            "pressure": press[0][0] if press else None,
-            "date": date[0][0] if date else None,
-            "hour": hour[0][0] if hour else None
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "sensor": sensor_id,
+        "temperature": latest.get("temperature"),
+        "humidity": latest.get("humidity"),
+        "pressure": latest.get("pressure"),
+        "date": latest.get("date"),
+        "hour": latest.get("hour")
+    })
 
 
 @api.route("/sensor/<int:sensor_id>/history")
@@ -128,41 +224,190 @@ def get_sensor_history(sensor_id):
     """
     Retourne l'historique d'un capteur.
     Parametres optionnels: ?date=2026-01-22&limit=50
+    ou un intervalle: ?from=2026-01-01&to=2026-01-31 (dates, "2026-01-22T08:00" ou ts en ms)
+    Page suivante : ?before_id=<next_before_id> (plus ancien) ou ?after_id=<next_after_id> (plus recent)
     """
-    table_name = f"esp{sensor_id}"
+    if not db.is_known_sensor(sensor_id):
+        return jsonify({"error": f"Capteur {sensor_id} non trouve"}), 404
 
-    if table_name not in db.get_all_sensors():
+    return history_response(sensor_id, extra={"sensor": sensor_id})
+
+
+@api.route("/sensor/<int:sensor_id>/export")
+def export_sensor_history(sensor_id):
+    """
+    Exporte tout l'historique d'un capteur, envoye au fur et a mesure (voir export.py).
+    Parametres optionnels: ?from=2026-01-01&to=2026-01-31 (ou ?date=...), ?format=csv|ndjson (csv par defaut),
+    ?gzip=1 (fichier .gz)
+    """
+    if not db.is_known_sensor(sensor_id):
         return jsonify({"error": f"Capteur {sensor_id} non trouve"}), 404
 
-    selected_date = request.args.get("date", type=str)
-    limit = request.args.get("limit", default=50, type=int)
+    fmt = request.args.get("format", default="csv", type=str)
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"format invalide: {fmt} (csv ou ndjson)"}), 400
+    gzip = request.args.get("gzip", default="0", type=str) not in ("0", "false", "")
 
     try:
-        if selected_date:
-            where_clause = f"date = '{selected_date}'"
-            temp = db.read_data(table_name, column="temperature", where=where_clause, order=f"id DESC LIMIT {limit}")
-            hum = db.read_data(table_name, column="humidity", where=where_clause, order=f"id DESC LIMIT {limit}")
-            press = db.read_data(table_name, column="pressure", where=where_clause, order=f"id DESC LIMIT {limit}")
-            dates = db.read_data(table_name, column="date", where=where_clause, order=f"id DESC LIMIT {limit}")
-            hours = db.read_data(table_name, column="hour", where=where_clause, order=f"id DESC LIMIT {limit}")
-        else:
-            temp = db.read_data(table_name, column="temperature", order=f"id DESC LIMIT {limit}")
-            hum = db.read_data(table_name, column="humidity", order=f"id DESC LIMIT {limit}")
-            press = db.read_data(table_name, column="pressure", order=f"id DESC LIMIT {limit}")
-            dates = db.read_data(table_name, column="date", order=f"id DESC LIMIT {limit}")
-            hours = db.read_data(table_name, column="hour", order=f"id DESC LIMIT {limit}")
+        start, end = _range_args()
+    except ValueError as e:
+        return jsonify({"error": f"Parametre de date invalide: {e}"}), 400
+
+    filename = export.export_filename(sensor_id, fmt, start, end, gzip)
+    return Response(
+        export.export_stream(sensor_id, fmt, start, end, gzip),
+        content_type="application/gzip" if gzip else export.FORMATS[fmt],
+        headers={**STREAM_HEADERS, "Content-Disposition": f"attachment; filename={filename}"}
+    )
 
-        return jsonify({
-            "sensor": sensor_id,
-            "temperature": [r[0] for r in temp][::-1],
-            "humidity": [r[0] for r in hum][::-1],
-            "pressure": [r[0] for r in press][::-1],
-            "date": [r[0] for r in dates][::-1],
-            "hour": [r[0] for r in hours][::-1]
-        })
+
+# Nombre d'instants par defaut des moyennes glissantes de /api/sensor/<id>/stats
+STATS_POINTS = 500
+
+
+@api.route("/sensor/<int:sensor_id>/stats")
+def get_sensor_stats(sensor_id):
+    """
+    Statistiques d'un capteur sur une periode (tout l'historique par defaut) :
+    moyenne, ecart-type, min, max, p5/p50/p95 par grandeur (voir analytics.describe).
+    Parametres optionnels: ?from=2026-01-01&to=2026-03-31 (ou ?date=...), ?type=temperature,
+    ?window=1h (ajoute la moyenne glissante et la moyenne exponentielle sur cette fenetre),
+    ?points=500 (nombre d'instants des series glissantes)
+    """
+    if not db.is_known_sensor(sensor_id):
+        return jsonify({"error": f"Capteur {sensor_id} non trouve"}), 404
+
+    metrics = request.args.get("type", default=",".join(db.METRICS), type=str).split(",")
+    if any(metric not in db.METRICS for metric in metrics):
+        return jsonify({"error": f"type invalide: {','.join(metrics)}"}), 400
+
+    try:
+        start, end = _range_args()
+        window = request.args.get("window", type=str)
+        window = analytics.parse_resolution(window) if window else None
+        if window is not None and window <= 0:
+            raise ValueError(f"fenetre invalide: {window}")
+    except ValueError as e:
+        return jsonify({"error": f"Parametre invalide: {e}"}), 400
+    points = min(request.args.get("points", default=STATS_POINTS, type=int), MAX_POINTS)
+
+    validators = _validators((sensor_id,))
+    if _not_modified(validators):
+        return _with_validators(Response(status=304), validators)
+
+    return _with_validators(jsonify(sensor_stats(sensor_id, metrics, start, end, window, points)), validators)
+
+
+def sensor_stats(sensor_id, metrics, start=None, end=None, window=None, points=STATS_POINTS):
+    """
+    Statistiques de /api/sensor/<id>/stats : les colonnes de la periode sont lues une seule fois
+    (database.read_columns) puis chaque calcul porte sur le tableau entier (analytics.py).
+    Les periodes dont les mesures brutes ont ete resumees par heure (retention.py) sont lues
+    dans hourly_rollup. "tier" indique la source : "raw", "hourly", "mixed" (les deux) ou None.
+    """
+    columns = db.read_columns(sensor_id, metrics, start, end)
+    rollups = {metric: db.read_hourly(sensor_id, metric, start, end) for metric in metrics}
+    ts = columns["ts"]
+    hours = [rollup[0] for rollup in rollups.values() if len(rollup[0])]
+    first = [int(column[0]) for column in (ts, *hours) if len(column)]
+    last = [int(column[-1]) + 1 for column in (ts, *hours) if len(column)]
+    result = {
+        "sensor": sensor_id,
+        "from": start if start is not None else min(first, default=None),
+        "to": end if end is not None else max(last, default=None),
+        "window": window,
+        "tier": {(True, False): "raw", (False, True): "hourly", (True, True): "mixed"}.get((len(ts) > 0, bool(hours)))
+    }
+    for metric in metrics:
+        result[metric] = analytics.describe(columns[metric], rollups[metric])
+
+    if window is not None:
+        series = {metric: analytics.with_rollup(ts, columns[metric], rollups[metric]) for metric in metrics}
+        all_ts = np.unique(np.concatenate([metric_ts for metric_ts, _ in series.values()]))
+        at = analytics.sample_times(all_ts, max(points, 2))
+        rolling = {"ts": at.tolist(), "hours": _labels(at)}
+        for metric in metrics:
+            metric_ts, values = series[metric]
+            ema_ts, ema_values = analytics.ema(metric_ts, values, window)
+            rolling[metric] = {
+                "mean": analytics.to_json_result(analytics.rolling_mean(metric_ts, values, window, at), columns[metric]),
+                "ema": analytics.to_json_result(analytics.value_at(ema_ts, ema_values, at), columns[metric])
+            }
+        result["rolling"] = rolling
+    return result
+
+
+# Taille d'une page d'historique : par defaut celle de la page /history, au plus
+# HISTORY_MAX_LIMIT lignes (tout un historique : /api/sensor/<id>/export)
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_LIMIT = 1000
+
+
+def history_response(sensor_id, default_limit=HISTORY_PAGE_SIZE, extra=None):
+    """
+    Reponse JSON d'historique d'un capteur (avec ETag, voir _validators).
+    Parametres : ?date=...&limit=..., ?from=...&to=..., ?before_id=... / ?after_id=...
+    limit est ramene entre 1 et HISTORY_MAX_LIMIT.
+    """
+    limit = request.args.get("limit", default=default_limit, type=int)
+    limit = min(max(limit or default_limit, 1), HISTORY_MAX_LIMIT)
+
+    try:
+        start, end = _range_args()
+    except ValueError as e:
+        return jsonify({"error": f"Parametre de date invalide: {e}"}), 400
+
+    validators = _validators((sensor_id,))
+    if _not_modified(validators):
+        return _with_validators(Response(status=304), validators)
+
+    try:
+        page = history_page(sensor_id, start, end, limit,
+                            before_id=request.args.get("before_id", type=int),
+                            after_id=request.args.get("after_id", type=int))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    return _with_validators(jsonify({**(extra or {}), **page}), validators)
+
+
+def history_page(sensor_id, start, end, limit, before_id=None, after_id=None):
+    """
+    Une page d'historique lue en une seule requete et rangee en colonnes
+    (du plus ancien au plus recent) : toutes les colonnes viennent des memes lignes.
+    Pagination par curseur (id = ts de la mesure) :
+    - before_id : les `limit` lignes juste avant (pages plus anciennes)
+    - after_id  : les `limit` lignes juste apres (nouvelles mesures)
+    Le cout d'une page ne depend pas de sa position dans l'historique.
+    """
+    newest_first = after_id is None
+    rows = db.read_range(sensor_id, ("ts", "temperature", "humidity", "pressure"), start, end,
+                         limit + 1 if limit is not None else None, newest_first=newest_first,
+                         before=before_id, after=after_id)
+
+    # Une ligne de plus que demande : il reste des lignes au-dela de la page
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit]
+    if newest_first:
+        rows.reverse()
+
+    ids, temperature, humidity, pressure = (list(column) for column in zip(*rows)) if rows else ([], [], [], [])
+    dates, hours = (list(column) for column in zip(*map(db.ts_to_date_hour, ids))) if ids else ([], [])
+
+    # Plus ancien : toujours possible apres after_id, sinon seulement s'il reste des lignes
+    older = has_more if newest_first else bool(ids)
+    return {
+        "id": ids,
+        "date": dates,
+        "hour": hours,
+        "temperature": temperature,
+        "humidity": humidity,
+        "pressure": pressure,
+        "next_before_id": ids[0] if ids and older else None,
+        "next_after_id": ids[-1] if ids else after_id,
+        "has_more": has_more
+    }
+
 
 @api.route("/all/latest")
 def get_all_latest():
@@ -170,23 +415,16 @@ def get_all_latest():
     Retourne les dernieres valeurs de TOUS les capteurs.
     Utile pour le dashboard.
     """
-    sensors = db.get_all_sensors()
     result = {}
 
-    for sensor in sensors:
-        sensor_num = sensor.replace("esp", "")
-        try:
-            temp = db.read_data(sensor, column="temperature", order="id DESC LIMIT 1")
-            hum = db.read_data(sensor, column="humidity", order="id DESC LIMIT 1")
-            press = db.read_data(sensor, column="pressure", order="id DESC LIMIT 1")
-
-            result[sensor] = {
-                "temperature": temp[0][0] if temp else None,
-                "humidity": hum[0][0] if hum else None,
-                "pressure": press[0][0] if press else None
-            }
-        except:
-            result[sensor] = {"temperature": None, "humidity": None, "pressure": None}
+    # Dernieres mesures servies depuis le cache (pas de requete SQL)
+    for sensor, latest in cache.get_all_latest().items():
+        latest = latest or {}
+        result[sensor] = {
+            "temperature": latest.get("temperature"),
+            "humidity": latest.get("humidity"),
+            "pressure": latest.get("pressure")
+        }
 
     return jsonify(result)
 
@@ -207,74 +445,28 @@ def api_data(type_str):
     if col not in ALLOWED_COLUMNS:
         return "Colonne non autorisée"
 
-    # Requête : dernière valeur pour ce device_id, triée par date_heure DESC
-    results = db.read_data(
-        device_name,
-        column=col,
-        order=f"id DESC LIMIT 1"
-    )
+    # Dernière valeur pour ce device_id, servie depuis le cache
+    latest = cache.get_latest(device_name)
 
-    if results and len(results) > 0:
-        value = results[0][0]  # Premier tuple, première colonne
+    if latest:
+        value = latest[col]
         return str(value) if value is not None else "NULL"
     else:
         return "Aucune donnée"
 
 
-def api_datas_list(type_str, limit=100, date_filter="today"):
-    """Retourne une liste des dernières valeurs pour une colonne"""
-    if not type_str or len(type_str) < 2:
-        print(f"❌ type_str invalide : '{type_str}'")
-        return []
-
-    if type_str == "hour":
-        col = "hour"
-        sensors = db.get_all_sensors()
-        device_name = sensors[0] if sensors else "esp1"
-    elif type_str == "date":
-        col = "date"
-        sensors = db.get_all_sensors()
-        device_name = sensors[0] if sensors else "esp1"
-    else:
-        # Vérifier que le dernier caractère est un chiffre
-        if not type_str[-1].isdigit():
-            print(f"❌ device_id invalide dans : '{type_str}'")
-            return []
-        col = type_str[:-1]
-        device_name = "esp" + type_str[-1]
-
-    ALLOWED_COLUMNS = {"temperature", "humidity", "pressure", "date", "hour"}
-
-    if col not in ALLOWED_COLUMNS:
-        print(f"❌ Colonne non autorisée : '{col}'")
-        return []
-
-    # Tri par id DESC (du plus récent au plus ancien)
-    if date_filter == "today":
-        results = db.read_data(
-            device_name,
-            column=col,
-            order=f"id DESC LIMIT {limit}"
-        )
-    else:
-        try:
-            results = db.read_data(
-                device_name,
-                column=col,
-                where=f"date = '{date_filter}'",
-                order=f"id DESC LIMIT {limit}"
-            )
-        except Exception as e:
-            print(f"❌ Erreur lors de la lecture avec date '{date_filter}' : {e}")
-            return []
-
-    if not results:
-        return []
+def _range_args():
+    """
+    Lit l'intervalle de temps demande : ?date=AAAA-MM-JJ et/ou ?from=...&to=...
+    Retourne (start, end) en ts (ms), None si pas de borne. Leve ValueError si invalide.
+    """
+    return db.time_range(
+        date=request.args.get("date", type=str),
+        start=request.args.get("from", type=str),
+        end=request.args.get("to", type=str)
+    )
 
-    values = [row[0] for row in results]
 
-    # Inverser pour avoir le plus ancien en premier (si nécessaire)
-    return values[::-1]
 # exemple d'utilisation
 # temp = api_data("temperature1")
 
@@ -329,84 +521,274 @@ def api_humidity2():
 ##########################___API POUR L'HISTORIQUE___###########################
 
 
-@api.route("/dates_unique")
-def get_dates_unique():
+# Cache navigateur des historiques : un jour termine peut encore changer (envoi groupe
+# apres une coupure, voir /request/batch), il est garde peu de temps puis revalide
+CLOSED_RANGE_MAX_AGE = 300  # secondes
+
+
+def _validators(sensor_ids):
     """
-    Retourne la liste des dates uniques (sans doublons) de la table weather_data
+    Validateurs HTTP d'une reponse d'historique, calcules sans relire les mesures :
+    ETag et Last-Modified a partir de sensors.last_write des capteurs concernes.
+    Un intervalle termine avant aujourd'hui peut etre garde quelques minutes par le navigateur.
     """
-    # Utiliser DISTINCT pour ne pas avoir de doublons
-    results = db.read_data(
-        "esp1",
-        column="DISTINCT date"
-    )
+    writes = db.get_last_writes(sensor_ids)
+    key = request.full_path + "|" + ",".join(f"{sensor_id}:{writes[sensor_id]}" for sensor_id in sorted(writes))
 
-    if not results:
-        return jsonify([])
+    try:
+        _, end = _range_args()
+    except ValueError:
+        end = None
+    today = db.ts_to_date_hour(db.now_ts())[0]
+
+    return {
+        "etag": hashlib.sha1(key.encode()).hexdigest(),
+        "last_write": max(writes.values(), default=0),
+        "closed": end is not None and end <= db.day_bounds(today)[0]
+    }
 
-    # Extraire les valeurs
-    dates = [row[0] for row in results if row[0] is not None]
 
-    return jsonify(dates[::-1])
+def _not_modified(validators):
+    """
+    Indique si le navigateur a deja cette version : If-None-Match s'il est present (seul
+    l'ETag compte, RFC 9110), sinon If-Modified-Since. Last-Modified est a la seconde
+    pres : une ecriture dans la meme seconde que la date du navigateur compte comme modifiee.
+    """
+    if "If-None-Match" in request.headers:
+        return request.if_none_match.contains(validators["etag"])
+    since = request.if_modified_since
+    return (since is not None and bool(validators["last_write"])
+            and since.timestamp() >= math.ceil(validators["last_write"] / 1000))
+
+
+def _with_validators(response, validators):
+    """Ajoute ETag, Last-Modified et Cache-Control a une reponse d'historique"""
+    response.set_etag(validators["etag"])
+    if validators["last_write"]:
+        response.last_modified = datetime.fromtimestamp(validators["last_write"] // 1000, timezone.utc)
+    if validators["closed"]:
+        response.headers["Cache-Control"] = f"public, max-age={CLOSED_RANGE_MAX_AGE}, must-revalidate"
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@api.route("/dates_unique")
+def get_dates_unique():
+    """
+    Retourne la liste des dates uniques (sans doublons) où des mesures existent,
+    de la plus récente à la plus ancienne (lue dans le résumé journalier)
+    """
+    validators = _validators(db.sensor_id_of(table) for table in db.get_all_sensors())
+    if _not_modified(validators):
+        return _with_validators(Response(status=304), validators)
+    return _with_validators(jsonify(db.get_rollup_days()), validators)
 
 @api.route('/history1', methods=["GET"])
 def get_history1():
-    try :
-        selected_date = request.args.get("date",type=str)
-    except:
-        selected_date = "today"
-        print("Date non valide, mis a today par defaut")
+    """Historique du capteur 1 (une seule requete, voir history_page)"""
+    return history_response(1)
 
-    try :
-        selected_limit = request.args.get("limit",type=int)
-    except:
-        selected_limit = 50
-        print("Limit non valide, mis a 50 par defaut")
 
-    date_list = api_datas_list("date", limit=selected_limit, date_filter=selected_date)
-    hour_list = api_datas_list("hour", limit=selected_limit, date_filter=selected_date)
-    temp_list = api_datas_list("temperature1", limit=selected_limit, date_filter=selected_date)
-    hum_list = api_datas_list("humidity1", limit=selected_limit, date_filter=selected_date)
-    press_list = api_datas_list("pressure1", limit=selected_limit, date_filter=selected_date)
 
-    return jsonify({
-        "date": date_list,
-        "hour": hour_list,
-        "temperature": temp_list,
-        "humidity": hum_list,
-        "pressure": press_list
-    })
+@api.route('/history2', methods=["GET"])
+def get_history2():
+    """Historique du capteur 2 (une seule requete, voir history_page)"""
+    return history_response(2)
 
+#########################___API POUR LES GRAPHIQUES___##########################
 
 
-@api.route('/history2',methods=["GET"])
-def get_history2():
-    try :
-        selected_date = request.args.get("date",type=str)
-    except:
-        selected_date = "today"
-        print("Date non valide, mis a today par defaut")
+# Nombre maximum de points par serie renvoyes par /statistical (points= / resolution=)
+MAX_POINTS = 2000
 
-    try :
-        selected_limit = request.args.get("limit",type=int)
-    except:
-        selected_limit = 50
-        print("Limit non valide, mis a 50 par defaut")
-    
-    date_list = api_datas_list("date", limit=selected_limit, date_filter=selected_date)
-    hour_list = api_datas_list("hour", limit=selected_limit, date_filter=selected_date)
-    temp_list = api_datas_list("temperature2", limit=selected_limit, date_filter=selected_date)
-    hum_list = api_datas_list("humidity2", limit=selected_limit, date_filter=selected_date)
-    press_list = api_datas_list("pressure2", limit=selected_limit, date_filter=selected_date)
 
-    return jsonify({
-        "date": date_list,
-        "hour": hour_list,
-        "temperature": temp_list,
-        "humidity": hum_list,
-        "pressure": press_list
-    })
+def _labels(ts_list):
+    """Heures a afficher sous le graphique ("AAAA-MM-JJ HH:MM:SS" si plusieurs jours)"""
+    pairs = [db.ts_to_date_hour(int(ts)) for ts in ts_list]
+    if len({d for d, _ in pairs}) > 1:
+        return [f"{d} {h}" for d, h in pairs]
+    return [h for _, h in pairs]
 
-#########################___API POUR LES GRAPHIQUES___##########################
+
+def statistical_sensors():
+    """Numeros des capteurs affiches dans les graphiques (1 et 2 toujours presents)"""
+    return sorted({1, 2} | {db.sensor_id_of(name) for name in db.get_all_sensors()})
+
+
+def statistical_aligned(data_type, date_filter, start, end, limit, sensor_ids):
+    """
+    Series brutes alignees par ts, les `limit` derniers instants.
+    Leve ValueError si un parametre est invalide.
+    """
+    if data_type not in db.METRICS:
+        raise ValueError(f"type invalide: {data_type}")
+    start, end = db.time_range(date=date_filter, start=start, end=end)
+    columns = {sensor_id: dict(db.read_range(sensor_id, ("ts", data_type), start, end, limit))
+               for sensor_id in sensor_ids}
+    return align_columns(columns, limit)
+
+
+def align_columns(columns, limit=None):
+    """
+    Aligne les series de plusieurs capteurs ({numero: {ts: valeur}}) : une ligne par intervalle
+    de reception (align.snap, ts = debut de l'intervalle), une valeur (ou None) par capteur.
+    Chaque mesure est en DB avec son propre ts ; si un capteur a envoye deux fois dans le meme
+    intervalle, la plus recente est affichee.
+    """
+    columns = {sensor_id: {align.snap(ts): value for ts, value in sorted(values.items())}
+               for sensor_id, values in columns.items()}
+    all_ts = sorted(set().union(*columns.values()))
+    if limit:
+        all_ts = all_ts[-limit:]
+
+    result = {f"data{sensor_id}": [values.get(ts) for ts in all_ts] for sensor_id, values in columns.items()}
+    result["sensors"] = list(columns)
+    result["ts"] = all_ts
+    result["hours"] = _labels(all_ts)
+    return result
+
+
+def statistical_downsampled(data_type, date_filter, start, end, limit, points=None, resolution=None, method="avg", sensor_ids=(1, 2)):
+    """
+    Series reduites pour les graphiques : au plus `points` points par capteur (ou un point
+    par intervalle `resolution`), quelle que soit la longueur de la periode.
+    method = "avg" (moyenne + min/max par intervalle, meme grille pour tous les capteurs)
+    ou "lttb" (points representatifs de chaque serie, avec leurs propres ts).
+    Sans date ni from/to, les `limit` dernieres mesures sont reduites.
+    Leve ValueError si un parametre est invalide.
+    """
+    if data_type not in db.METRICS:
+        raise ValueError(f"type invalide: {data_type}")
+    if method not in ("avg", "lttb"):
+        raise ValueError(f"method invalide: {method}")
+
+    start, end = db.time_range(date=date_filter, start=start, end=end)
+    with_range = start is not None or end is not None
+
+    series = {}
+    rollups = {}
+    for sensor_id in sensor_ids:
+        if with_range:
+            # Colonnes contigues, tranches des mois archives sans copie (voir archive.py)
+            series[sensor_id] = db.read_arrays(sensor_id, data_type, start, end)
+            # Periodes dont les mesures brutes ont ete resumees par heure (voir retention.py)
+            rollups[sensor_id] = db.read_hourly(sensor_id, data_type, start, end)
+        else:
+            series[sensor_id] = analytics.to_arrays(db.read_range(sensor_id, ("ts", data_type), limit=limit)[::-1])
+            rollups[sensor_id] = None
+    has_rollup = any(rollup is not None and len(rollup[0]) for rollup in rollups.values())
+
+    # Assez peu de mesures : series brutes alignees par ts, comme sans points=
+    if points and not resolution and not has_rollup and all(len(ts) <= points for ts, _ in series.values()):
+        return align_columns({
+            sensor_id: dict(zip(ts.tolist(), analytics.to_json_list(values)))
+            for sensor_id, (ts, values) in series.items()
+        })
+
+    if method == "lttb":
+        count = min(points or MAX_POINTS, MAX_POINTS)
+        result = {"sensors": list(sensor_ids)}
+        for sensor_id, (ts, values) in series.items():
+            rollup = rollups[sensor_id]
+            if rollup is not None and len(rollup[0]):
+                # Une moyenne par heure resumee, avant les mesures brutes
+                ts = np.concatenate((rollup[0], ts))
+                values = np.concatenate((rollup[1] / rollup[2], values))
+            ts, values = analytics.lttb(ts, values, count)
+            # Precision du float32 aussi pour les moyennes horaires (voir analytics.exact)
+            result[f"data{sensor_id}"] = analytics.to_json_result(values, series[sensor_id][1])
+            result[f"ts{sensor_id}"] = ts.tolist()
+        result["hours"] = _labels(result[f"ts{sensor_ids[0]}"])
+        return result
+
+    # Grille commune : de start (ou de la premiere mesure) jusqu'a la derniere mesure
+    all_ts = [ts for ts, _ in series.values() if len(ts)]
+    all_ts += [rollup[0] for rollup in rollups.values() if rollup is not None and len(rollup[0])]
+    if not all_ts:
+        result = {"sensors": list(sensor_ids), "hours": [], "ts": [], "resolution": None}
+        for sensor_id in sensor_ids:
+            result.update({f"data{sensor_id}": [], f"min{sensor_id}": [], f"max{sensor_id}": []})
+        return result
+    first = start if start is not None else min(int(ts[0]) for ts in all_ts)
+    last = max(int(ts[-1]) for ts in all_ts) + 1
+    span = max(last - first, 1)
+
+    if resolution:
+        width = analytics.parse_resolution(resolution)
+        if width <= 0:
+            raise ValueError(f"resolution invalide: {resolution}")
+    else:
+        width = -(-span // min(points, MAX_POINTS))
+    # Borne la taille de la reponse meme si la resolution demandee est tres fine
+    width = max(width, -(-span // MAX_POINTS))
+    count = -(-span // width)
+
+    result = {"sensors": list(sensor_ids)}
+    for sensor_id, (ts, values) in series.items():
+        avg, low, high = analytics.bucket_aggregate(ts, values, first, width, count, rollups[sensor_id])
+        # min/max en float64 : meme valeur que la mesure lue en DB ou dans l'archive
+        result[f"data{sensor_id}"] = analytics.to_json_result(avg, values)
+        result[f"min{sensor_id}"] = analytics.to_json_result(low, values)
+        result[f"max{sensor_id}"] = analytics.to_json_result(high, values)
+    bucket_ts = analytics.bucket_starts(first, width, count)
+    result["ts"] = bucket_ts.tolist()
+    result["hours"] = _labels(bucket_ts)
+    result["resolution"] = width
+    return result
+
+
+@api.route("/chart/<int:sensor_id>/<metric>.png")
+def get_chart(sensor_id, metric):
+    """
+    Graphique PNG d'une grandeur, rendu par le serveur (voir charts.py).
+    Parametres optionnels: ?from=2026-01-01&to=2026-01-31 ou ?date=2026-01-22 (aujourd'hui par defaut)
+    Le graphique est servi depuis le cache tant qu'aucune mesure n'a ete ecrite pour ce capteur.
+    """
+    if not db.is_known_sensor(sensor_id):
+        return jsonify({"error": f"Capteur {sensor_id} non trouve"}), 404
+    if metric not in db.METRICS:
+        return jsonify({"error": f"type invalide: {metric}"}), 404
+
+    try:
+        start, end = _range_args()
+    except ValueError as e:
+        return jsonify({"error": f"Parametre de date invalide: {e}"}), 400
+    if start is None and end is None:
+        start, end = db.day_bounds(db.ts_to_date_hour(db.now_ts())[0])
+
+    validators = _validators((sensor_id,))
+    if _not_modified(validators):
+        return _with_validators(Response(status=304), validators)
+
+    # Une mesure peut encore arriver pour un jour passe : la version est toujours last_write
+    name = charts.cache_name(sensor_id, metric, start, end, validators["last_write"])
+    try:
+        png = charts.chart_png(name, lambda: chart_series(sensor_id, metric, start, end))
+    except Exception as e:
+        return jsonify({"error": f"Rendu du graphique impossible: {e}"}), 500
+
+    return _with_validators(Response(png, mimetype="image/png"), validators)
+
+
+def chart_series(sensor_id, metric, start, end):
+    """Serie d'un graphique PNG : moyenne/min/max sur au plus charts.CHART_POINTS intervalles"""
+    ts, values = db.read_arrays(sensor_id, metric, start, end)
+    rollup = db.read_hourly(sensor_id, metric, start, end)
+    title, unit = charts.LABELS[metric]
+    series = {"title": f"esp{sensor_id} - {title}", "unit": unit}
+    all_ts = [column for column in (rollup[0], ts) if len(column)]
+    if not all_ts:
+        return {**series, "ts": [], "avg": [], "low": [], "high": []}
+
+    first = start if start is not None else int(all_ts[0][0])
+    last = end if end is not None else int(all_ts[-1][-1]) + 1
+    width = max(-(-(last - first) // charts.CHART_POINTS), 1)
+    count = -(-(last - first) // width)
+    avg, low, high = analytics.bucket_aggregate(ts, values, first, width, count, rollup)
+    # Point au milieu de chaque intervalle
+    bucket_ts = analytics.bucket_starts(first, width, count) + width // 2
+    return {**series, "ts": bucket_ts.tolist(), "avg": avg, "low": low, "high": high}
 
 
 @api.route("/statistical", methods=["GET"])
@@ -417,6 +799,10 @@ def refresh_statistical():
         selected_date = "today"
         print("Date non valide, mis a today par defaut")
 
+    # Intervalle optionnel ?from=...&to=... (dates, "AAAA-MM-JJTHH:MM" ou ts en ms)
+    selected_from = request.args.get("from", type=str)
+    selected_to = request.args.get("to", type=str)
+
     try :
         selected_limit = request.args.get("limit",default=50,type=int)
         
@@ -425,25 +811,37 @@ def refresh_statistical():
         print("Limit non valide, mis a 20 par defaut")
 
     data_type = request.args.get("type", default="None", type=str)
-    if data_type :
-        data1 = api_datas_list(f"{data_type}1", date_filter=selected_date,limit=selected_limit)
-        data2 = api_datas_list(f"{data_type}2", date_filter=selected_date,limit=selected_limit)
-        hours = api_datas_list("hour", date_filter=selected_date,limit=selected_limit)
-        print(selected_limit,selected_date,data_type)
-    else :
-        return jsonify(data_final = {
-        "data1": [],
-        "data2": [],
-        "hours": []
-    }),400
-    
-    data_final = {
-        "data1": data1,
-        "data2": data2,
-        "hours": hours
-    }
-    
-    return jsonify(data_final),200
+
+    sensor_ids = statistical_sensors()
+    validators = _validators(sensor_ids)
+    if _not_modified(validators):
+        return _with_validators(Response(status=304), validators)
+
+    # Serie reduite cote serveur : ?points=N ou ?resolution=5m (method=avg|lttb)
+    points = request.args.get("points", type=int)
+    resolution = request.args.get("resolution", type=str)
+    if points or resolution:
+        if points is not None and points < 3:
+            return jsonify({"error": "points doit etre >= 3"}), 400
+        try:
+            data_final = statistical_downsampled(
+                data_type, selected_date, selected_from, selected_to, selected_limit,
+                points=points, resolution=resolution,
+                method=request.args.get("method", default="avg", type=str),
+                sensor_ids=sensor_ids
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return _with_validators(jsonify(data_final), validators), 200
+
+    # Series brutes de tous les capteurs, alignees par ts (data1, data2, data3, ...)
+    try:
+        data_final = statistical_aligned(data_type, selected_date, selected_from, selected_to, selected_limit, sensor_ids)
+    except ValueError as e:
+        return jsonify({"error": str(e), "data1": [], "data2": [], "hours": []}), 400
+    print(selected_limit,selected_date,data_type)
+
+    return _with_validators(jsonify(data_final), validators),200
 
 
 
@@ -565,6 +963,7 @@ def configure_esp32():
     success = db.set_esp32_sensor_number(mac_address, sensor_number, name)
 
     if success:
+        cache.warm()
         return jsonify({
             "status": "success",
             "message": f"ESP32 configure comme Capteur {sensor_number}"
@@ -586,11 +985,28 @@ def delete_esp32():
     success = db.delete_esp32_device(data["mac_address"])
 
     if success:
+        cache.warm()
+        # Le numero du capteur peut etre reattribue : pas d'ancien graphique en cache
+        charts.clear()
         return jsonify({"status": "success", "message": "ESP32 supprime"})
     else:
         return jsonify({"error": "ESP32 non trouve"}), 404
 
 
+@api.route("/slow_queries", methods=["GET", "DELETE"])
+def slow_queries():
+    """
+    Journal des requetes SQL lentes (voir database.log_slow_query), pour l'interface admin.
+    GET : {"threshold_ms", "queries": [...]} (la plus recente en premier, ?limit=N)
+    DELETE : vide le journal
+    """
+    if request.method == "DELETE":
+        db.clear_slow_queries()
+        return jsonify({"status": "success"})
+    limit = request.args.get("limit", type=int)
+    return jsonify({"threshold_ms": db.SLOW_QUERY_MS, "queries": db.get_slow_queries(limit)})
+
+
 #api/daily_summary?data=12.3.1
 @api.route("/daily_summary", methods=["GET"])
 def daily_summary():
@@ -602,96 +1018,23 @@ def daily_summary():
     if sensor_id not in (1, 2):
         return jsonify([]), 400
 
-    data = summary(sensor_id, limit,date_filter=date)
+    data = summary(sensor_id, limit,date_filter=date,
+                   start=request.args.get("from", type=str), end=request.args.get("to", type=str))
 
     if not data:
         return jsonify([])
     return jsonify(data)
 
 
-def summary(sensor_id, limit=7,date_filter="today"):
+def summary(sensor_id, limit=7,date_filter="today", start=None, end=None):
     """
-    Calcule les max/min par jour pour un capteur donné.
-    Si db.read_data ne supporte pas group_by, on fait le regroupement en Python.
+    Retourne les max/min par jour pour un capteur donné (du plus récent au plus ancien).
+    Les valeurs viennent du résumé journalier (daily_rollup), mis à jour à chaque mesure :
+    le coût dépend du nombre de jours, pas du nombre de mesures.
     """
-    device_name = f"esp{sensor_id}"
-
-    # Récupérer TOUTES les données (ou les N dernières)
     try:
-        # Récupérer les données avec date, temperature, humidity, pressure
-        if date_filter != "today":
-            results = db.read_data(
-            device_name,
-            column="date, temperature, humidity, pressure",
-            where=f"date = '{date_filter}'",
-            order="id DESC",  # Du plus récent au plus ancien Par id
-            limit=limit       # Récupérer jusqu'à 24h par jour (sécurité)
-        )
-        else:
-            results = db.read_data(
-                device_name,
-                column="date, temperature, humidity, pressure",
-                order="id DESC",  # Du plus récent au plus ancien Par id
-                limit=limit    # Récupérer jusqu'à 24h par jour (sécurité)
-            )
+        start, end = db.time_range(date=date_filter, start=start, end=end)
+        return db.read_daily_summary(sensor_id, start, end, limit)
     except Exception as e:
         print(f"Erreur dans summary({sensor_id}): {e}")
         return []
-
-    # Si pas de données
-    if not results:
-        return []
-
-    # Regrouper par date en Python
-    from collections import defaultdict
-    grouped = defaultdict(lambda: {
-        "temperature": [],
-        "humidity": [],
-        "pressure": []
-    })
-
-    for row in results:
-        date = row[0]
-        temp = row[1]
-        hum = row[2]
-        press = row[3]
-
-        if temp is not None:
-            grouped[date]["temperature"].append(temp)
-        if hum is not None:
-            grouped[date]["humidity"].append(hum)
-        if press is not None:
-            grouped[date]["pressure"].append(press)
-
-    # Créer la liste des jours (max/min)
-    formatted = []
-    for date in grouped:
-        t_list = grouped[date]["temperature"]
-        h_list = grouped[date]["humidity"]
-        p_list = grouped[date]["pressure"]
-
-        formatted.append({
-            "date": date,
-            "temperature": {
-                "max": max(t_list) if t_list else None,
-                "min": min(t_list) if t_list else None
-            },
-            "humidity": {
-                "max": max(h_list) if h_list else None,
-                "min": min(h_list) if h_list else None
-            },
-            "pressure": {
-                "max": max(p_list) if p_list else None,
-                "min": min(p_list) if p_list else None
-            }
-        })
-
-    # Trier par date décroissante (du plus récent au plus ancien)
-    formatted.sort(key=lambda x: x["date"], reverse=True)
-
-    # Limiter au nombre de jours demandé
-    return formatted[:limit]
-
-
-
-
@@ -0,0 +1,135 @@
+# Fonction : archive des mois termines dans des fichiers en colonnes (NumPy .npy)
+#
+# Les mesures d'un mois termine sont deplacees de la table readings vers
+#   <archive>/espN/AAAA-MM/ts.npy, temperature.npy, humidity.npy, pressure.npy
+# ts en int64 (ms, trie), grandeurs en float32 (NaN = pas de valeur).
+# Les fichiers sont ouverts avec np.load(mmap_mode="r") : lire un intervalle revient a
+# prendre une tranche du fichier (recherche dichotomique sur ts), sans copie.
+# La fusion avec les mesures encore en DB est faite par database.py (read_range, iter_range,
+# read_arrays) : la table readings ne garde que les mois recents.
+
+try:
+    from app import analytics
+except:
+    import analytics
+
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+COLUMNS = ("ts", "temperature", "humidity", "pressure")
+MONTH = re.compile(r"\d{4}-\d{2}")
+
+_maps = {}  # dossier du mois -> (identite du fichier ts.npy, colonnes en memmap)
+_lock = threading.Lock()
+
+
+def sensor_dir(directory, sensor_id):
+    """Dossier des mois archives d'un capteur"""
+    return os.path.join(directory, f"esp{sensor_id}")
+
+
+def months(directory, sensor_id):
+    """Mois archives d'un capteur ("AAAA-MM"), du plus ancien au plus recent"""
+    try:
+        names = os.listdir(sensor_dir(directory, sensor_id))
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if MONTH.fullmatch(name))
+
+
+def load(directory, sensor_id, month):
+    """Colonnes d'un mois archive ({nom: tableau en memmap}), ouvertes une seule fois"""
+    path = os.path.join(sensor_dir(directory, sensor_id), month)
+    stat = os.stat(os.path.join(path, "ts.npy"))
+    identity = (stat.st_ino, stat.st_mtime_ns)
+    with _lock:
+        cached = _maps.get(path)
+        if cached and cached[0] == identity:
+            return cached[1]
+
+    columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+    with _lock:
+        _maps[path] = (identity, columns)
+    return columns
+
+
+def write(directory, sensor_id, month, columns):
+    """
+    Ecrit (ou remplace) un mois archive. Les fichiers sont ecrits dans un dossier
+    temporaire puis mis en place par renommage : un lecteur voit l'ancien ou le nouveau mois.
+    """
+    base = sensor_dir(directory, sensor_id)
+    final = os.path.join(base, month)
+    tmp, old = final + ".tmp", final + ".old"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    np.save(os.path.join(tmp, "ts.npy"), np.ascontiguousarray(columns["ts"], dtype=np.int64))
+    for name in COLUMNS[1:]:
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(columns[name], dtype=np.float32))
+
+    if os.path.exists(final):
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(final, old)
+    os.rename(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def remove(directory, sensor_id):
+    """Supprime toutes les archives d'un capteur"""
+    shutil.rmtree(sensor_dir(directory, sensor_id), ignore_errors=True)
+
+
+def detach(directory, sensor_id, month):
+    """Retire un mois de la liste des mois archives sans supprimer ses fichiers (voir purge)"""
+    path = os.path.join(sensor_dir(directory, sensor_id), month)
+    os.rename(path, path + ".expired")
+    with _lock:
+        _maps.pop(path, None)
+
+
+def reattach(directory, sensor_id, month):
+    """Annule detach (transaction en echec)"""
+    path = os.path.join(sensor_dir(directory, sensor_id), month)
+    os.rename(path + ".expired", path)
+
+
+def purge(directory, sensor_id, month):
+    """Supprime les fichiers d'un mois retire par detach"""
+    shutil.rmtree(os.path.join(sensor_dir(directory, sensor_id), month) + ".expired", ignore_errors=True)
+
+
+def slice_columns(columns, lo=None, hi=None):
+    """Lignes avec lo <= ts < hi (None = pas de borne) : vues sur les fichiers, sans copie"""
+    ts = columns["ts"]
+    first = int(np.searchsorted(ts, lo, side="left")) if lo is not None else 0
+    last = int(np.searchsorted(ts, hi, side="left")) if hi is not None else len(ts)
+    return {name: values[first:last] for name, values in columns.items()}
+
+
+def to_columns(rows, names=COLUMNS):
+    """Lignes de la DB (ts, puis les grandeurs de `names`) -> colonnes (None ou valeur non numerique -> NaN)"""
+    if not rows:
+        return {"ts": np.empty(0, dtype=np.int64), **{name: np.empty(0, dtype=np.float32) for name in names[1:]}}
+    data = analytics.to_float_array(rows)
+    return {"ts": data[:, 0].astype(np.int64), **{name: data[:, i].astype(np.float32) for i, name in enumerate(names[1:], 1)}}
+
+
+def merge(archived, live):
+    """
+    Fusionne les colonnes d'un mois archive et les mesures du meme mois encore en DB
+    (arrivees apres l'archivage). Pour un meme ts, la mesure en DB est gardee.
+    """
+    if not len(live["ts"]):
+        return archived
+    ts = np.concatenate((archived["ts"], live["ts"]))
+    # Tri stable : a ts egal, la ligne de la DB (ajoutee en dernier) reste apres celle de l'archive
+    order = np.argsort(ts, kind="stable")
+    ts = ts[order]
+    keep = np.ones(len(ts), dtype=bool)
+    keep[:-1] = ts[1:] != ts[:-1]
+    return {name: np.concatenate((archived[name], live[name]))[order][keep] for name in COLUMNS}
@@ -0,0 +1,215 @@
+# Fonction : mode de service asynchrone (ASGI) pour un grand nombre de capteurs et de pages ouvertes
+#
+# En mode Gunicorn classique, chaque requete (POST d'un ESP32, page ouverte sur /api/stream)
+# occupe un thread du worker. Ici, les connexions sont gerees par une boucle asyncio :
+#  - /api/stream est servi directement en asyncio, une page ouverte ne bloque aucun thread
+#  - les autres routes (blueprints esp et api, pages) passent par l'application Flask,
+#    executee dans un pool de threads borne (acces DB) une fois le corps de la requete recu ;
+#    la reponse est envoyee morceau par morceau (exports en flux)
+#
+# Lancement : uvicorn app.asgi:app --host 0.0.0.0 --port 5000
+#        ou : gunicorn app.asgi:app -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000
+
+try:
+    from app.main import app as flask_app
+    from app import align, api, broadcast, ingest
+except:
+    from main import app as flask_app
+    import align
+    import api
+    import broadcast
+    import ingest
+
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads pour les requetes Flask (acces DB) et nombre maximum de requetes en cours ou en attente
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 16))
+ASGI_MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', 1000))
+# Taille maximum du corps d'une requete (un lot /request/batch de 1000 mesures fait ~100 Ko)
+ASGI_MAX_BODY = int(os.environ.get('ASGI_MAX_BODY', 1024 * 1024))
+
+STREAM_PATH = "/api/stream"
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi-flask")
+_pending = None  # asyncio.Semaphore, cree dans la boucle
+
+
+async def app(scope, receive, send):
+    """Point d'entree ASGI"""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] == "http":
+        if scope["path"] == STREAM_PATH and scope["method"] == "GET":
+            await _stream(scope, receive, send)
+        else:
+            await _flask(scope, receive, send)
+
+
+async def _lifespan(receive, send):
+    """Demarrage / arret du serveur : a l'arret, les mesures en attente et en file sont ecrites"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.get_running_loop().run_in_executor(_executor, _shutdown)
+            _executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def _shutdown():
+    """Ecrit les intervalles ouverts (align.py) puis vide la file d'ecriture"""
+    align.flush_all()
+    ingest.stop_writer()
+
+
+async def _stream(scope, receive, send):
+    """Flux Server-Sent Events servi par la boucle asyncio (meme contenu que api.stream)"""
+    loop = asyncio.get_running_loop()
+    q = broadcast.subscribe_async(loop)
+    initial = await loop.run_in_executor(_executor, api.stream_initial_events)
+
+    headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+    headers += [(name.lower().encode(), value.encode()) for name, value in api.STREAM_HEADERS.items()]
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+    # Fin de la connexion cote navigateur
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    events = broadcast.stream_async(q, initial)
+    chunk = None
+    try:
+        while True:
+            chunk = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait((chunk, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                return
+            try:
+                message = chunk.result()
+            except StopAsyncIteration:
+                # Connexion fermee par le serveur (trop lente)
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+    finally:
+        disconnected.cancel()
+        if chunk is not None and not chunk.done():
+            chunk.cancel()
+            await asyncio.gather(chunk, return_exceptions=True)
+        await events.aclose()
+        broadcast.unsubscribe(q)
+
+
+async def _wait_disconnect(receive):
+    """Attend la deconnexion du client"""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _flask(scope, receive, send):
+    """Execute l'application Flask (WSGI) dans le pool de threads borne"""
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(ASGI_MAX_PENDING)
+
+    # Le corps est lu par la boucle : un client lent n'occupe pas de thread
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body += message.get("body", b"")
+        if len(body) > ASGI_MAX_BODY:
+            await _simple_response(send, 413, b"Request Entity Too Large")
+            return
+        if not message.get("more_body"):
+            break
+
+    if _pending.locked():
+        await _simple_response(send, 503, b"Service Unavailable")
+        return
+
+    loop = asyncio.get_running_loop()
+    disconnected = threading.Event()
+    watcher = asyncio.ensure_future(_wait_disconnect(receive))
+    watcher.add_done_callback(lambda _: disconnected.set())
+    try:
+        async with _pending:
+            environ = _environ(scope, bytes(body))
+            await loop.run_in_executor(_executor, _call_wsgi, environ, loop, send, disconnected)
+    finally:
+        watcher.cancel()
+
+
+async def _simple_response(send, status, body):
+    """Reponse texte sans passer par Flask"""
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _environ(scope, body):
+    """Construit l'environnement WSGI (PEP 3333) d'une requete ASGI"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ, loop, send, disconnected):
+    """
+    Appelle Flask dans un thread du pool et envoie la reponse morceau par morceau
+    (une reponse en flux, par ex. /api/sensor/<id>/export, n'est jamais gardee en entier).
+    S'arrete si le client se deconnecte.
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+    def send_message(message):
+        # Attend l'envoi : un client lent ralentit la lecture au lieu de remplir la memoire
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    result = flask_app(environ, start_response)
+    try:
+        send_message({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+        for chunk in result:
+            if disconnected.is_set():
+                return
+            if chunk:
+                send_message({"type": "http.response.body", "body": chunk, "more_body": True})
+        send_message({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            result.close()
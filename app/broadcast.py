@@ -0,0 +1,255 @@
+# Fonction : diffuser les nouvelles mesures et les changements de statut aux pages ouvertes (Server-Sent Events)
+#
+# Chaque page ouverte garde une connexion /api/stream et recoit les evenements
+# au lieu d'interroger l'API toutes les 20 secondes. Un seul thread surveille les
+# dernieres mesures (cache.py) et envoie chaque evenement a toutes les connexions :
+# la charge depend du nombre de mesures recues, pas du nombre d'onglets ouverts.
+
+try:
+    from app import cache
+except:
+    import cache
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+
+# Evenements gardes pour une connexion lente avant de la fermer (le navigateur se reconnecte)
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', 100))
+# Connexions servies par un thread (Gunicorn gthread) : chacune occupe un thread tant que la page
+# est ouverte. Au-dela, /api/stream repond 503 et la page actualise /api/dashboard a la place,
+# pour laisser des threads aux ESP32 et aux autres requetes. A garder sous --threads (Procfile : 32).
+# Les connexions servies par asyncio (asgi.py) ne sont pas limitees.
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 16))
+# Commentaire envoye pour garder la connexion ouverte (proxy, navigateur)
+KEEPALIVE_INTERVAL = 15.0  # secondes
+# Verification des mesures ecrites par un autre worker (sans notify())
+WATCH_INTERVAL = 1.0  # secondes
+# Recalcul du statut des capteurs (en ligne / hors ligne)
+STATUS_INTERVAL = 10.0  # secondes
+
+_subscribers = set()
+_thread_subscribers = 0  # connexions de _subscribers servies par un thread (voir STREAM_MAX_SUBSCRIBERS)
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_thread = None
+_status_provider = None
+_CLOSE = None
+
+
+def set_status_provider(provider):
+    """
+    Definit la fonction qui calcule le statut des capteurs :
+    provider() -> {"sensors": [...], ...} (meme format que /api/sensors/status)
+    """
+    global _status_provider
+    _status_provider = provider
+
+
+def format_event(event, data):
+    """Formate un evenement Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def reading_event(table, entry):
+    """Donnees de l'evenement "reading" pour la derniere mesure d'un capteur"""
+    return {
+        "sensor": table,
+        "number": table.replace("esp", ""),
+        "ts": entry["ts"],
+        "temperature": entry["temperature"],
+        "humidity": entry["humidity"],
+        "pressure": entry["pressure"],
+        "date": entry["date"],
+        "hour": entry["hour"]
+    }
+
+
+def subscribe():
+    """
+    Ajoute une connexion servie par un thread, retourne sa file d'evenements
+    (None si STREAM_MAX_SUBSCRIBERS connexions sont deja ouvertes).
+    """
+    global _thread_subscribers
+    q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _lock:
+        if _thread_subscribers >= STREAM_MAX_SUBSCRIBERS:
+            return None
+        _thread_subscribers += 1
+        _subscribers.add(q)
+        _start_thread()
+    _wakeup.set()
+    return q
+
+
+def unsubscribe(q):
+    """Retire une connexion"""
+    global _thread_subscribers
+    with _lock:
+        if q in _subscribers:
+            _subscribers.discard(q)
+            if not isinstance(q, LoopQueue):
+                _thread_subscribers -= 1
+
+
+def subscriber_count():
+    """Retourne le nombre de connexions ouvertes"""
+    with _lock:
+        return len(_subscribers)
+
+
+def publish(event, data):
+    """
+    Envoie un evenement a toutes les connexions (formate une seule fois).
+    Une connexion dont la file est pleine est fermee.
+    """
+    message = format_event(event, data)
+    with _lock:
+        subscribers = list(_subscribers)
+
+    for q in subscribers:
+        try:
+            q.put_nowait(message)
+        except queue.Full:
+            print("Connexion /api/stream trop lente, fermee")
+            unsubscribe(q)
+            if isinstance(q, LoopQueue):
+                q.close()
+                continue
+            try:
+                q.get_nowait()
+                q.put_nowait(_CLOSE)
+            except (queue.Empty, queue.Full):
+                pass
+
+
+class LoopQueue(asyncio.Queue):
+    """
+    File d'evenements d'une connexion servie par asyncio (voir asgi.py).
+    publish() l'alimente depuis d'autres threads : l'ajout est fait dans la boucle asyncio.
+    """
+
+    def __init__(self, loop, maxsize):
+        super().__init__(maxsize)
+        self._owner = loop
+
+    def put_nowait(self, item):
+        if self.full():
+            raise queue.Full
+        self._owner.call_soon_threadsafe(self._put_safe, item)
+
+    def close(self):
+        self._owner.call_soon_threadsafe(self._close_safe)
+
+    def _put_safe(self, item):
+        if not self.full():
+            super().put_nowait(item)
+
+    def _close_safe(self):
+        # Vide la file pour que la fermeture passe devant les evenements en retard
+        while not self.empty():
+            self.get_nowait()
+        super().put_nowait(_CLOSE)
+
+
+def subscribe_async(loop):
+    """Comme subscribe(), pour une connexion servie par une boucle asyncio"""
+    q = LoopQueue(loop, SUBSCRIBER_QUEUE_SIZE)
+    with _lock:
+        _subscribers.add(q)
+        _start_thread()
+    _wakeup.set()
+    return q
+
+
+def notify():
+    """Signale une nouvelle mesure (appele par le chemin d'ecriture, voir ingest.py)"""
+    _wakeup.set()
+
+
+def stream(q, initial=()):
+    """
+    Generateur de la reponse text/event-stream d'une connexion.
+    initial : evenements (nom, donnees) envoyes a l'ouverture.
+    """
+    try:
+        yield "retry: 5000\n\n"
+        for event, data in initial:
+            yield format_event(event, data)
+        while True:
+            try:
+                message = q.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if message is _CLOSE:
+                return
+            yield message
+    finally:
+        unsubscribe(q)
+
+
+async def stream_async(q, initial=()):
+    """Comme stream(), pour une connexion servie par asyncio (aucun thread bloque)"""
+    try:
+        yield "retry: 5000\n\n"
+        for event, data in initial:
+            yield format_event(event, data)
+        while True:
+            try:
+                message = await asyncio.wait_for(q.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is _CLOSE:
+                return
+            yield message
+    finally:
+        unsubscribe(q)
+
+
+def _start_thread():
+    """Demarre le thread de surveillance s'il ne tourne pas (appele avec _lock)"""
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_run, name="stream-broadcast", daemon=True)
+        _thread.start()
+
+
+def _run():
+    """Boucle du thread : publie les nouvelles mesures et les changements de statut"""
+    # ts de la derniere mesure publiee, par capteur. Une mesure peut etre recue deux fois
+    # (etat initial de la connexion + evenement), jamais perdue.
+    published = {}
+    last_status = None
+    next_status = 0.0
+
+    while True:
+        _wakeup.wait(WATCH_INTERVAL)
+        _wakeup.clear()
+
+        if not subscriber_count():
+            # Personne a prevenir
+            last_status = None
+            continue
+
+        try:
+            for table, entry in cache.get_all_latest().items():
+                if entry and entry["ts"] > published.get(table, -1):
+                    published[table] = entry["ts"]
+                    publish("reading", reading_event(table, entry))
+                    # Un capteur qui envoie peut passer "en ligne" : statut recalcule tout de suite
+                    next_status = 0.0
+
+            now = time.monotonic()
+            if _status_provider and now >= next_status:
+                next_status = now + STATUS_INTERVAL
+                status = _status_provider()
+                if last_status is not None and status["sensors"] != last_status:
+                    publish("status", status)
+                last_status = status["sensors"]
+        except Exception as e:
+            print(f"Erreur diffusion /api/stream: {e}")
@@ -0,0 +1,136 @@
+# Fonction : cache en memoire de la derniere mesure de chaque capteur
+#
+# Le cache est mis a jour par la file d'ecriture (ingest.py) a chaque mesure recue
+# et rempli depuis la DB au demarrage. Les endpoints "derniere valeur" et le statut
+# des capteurs sont servis depuis ce cache, sans requete SQL.
+# Si la DB a change (PRAGMA data_version de la connexion du thread), sensors.last_write est
+# relu en une requete : seuls les capteurs ecrits par un autre processus (worker gunicorn)
+# sont recharges. Les ecritures de ce processus (file d'ecriture, lots) ont deja mis a
+# jour le cache, leur last_write est connu (database.own_last_write).
+
+try:
+    import app.database as db
+except:
+    import database as db
+
+import threading
+
+# "espX" -> {"ts", "temperature", "humidity", "pressure", "date", "hour", "last_activity"}
+_latest = {}
+# sensor_id -> sensors.last_write correspondant au contenu du cache
+_known_writes = {}
+_lock = threading.Lock()
+# data_version deja vu par la connexion de chaque thread
+_local = threading.local()
+
+
+def _entry(reading):
+    """Construit l'entree du cache a partir d'une mesure de readings (valeurs comme en DB, 40 -> 40.0)"""
+    date, hour = db.ts_to_date_hour(reading["ts"])
+    reading = db.exact_reading(reading)
+    return {
+        "ts": reading["ts"],
+        "temperature": reading["temperature"],
+        "humidity": reading["humidity"],
+        "pressure": reading["pressure"],
+        "date": date,
+        "hour": hour,
+    }
+
+
+def update(reading):
+    """Enregistre la derniere mesure d'un capteur (appele a chaque insertion)"""
+    table = f"esp{reading['sensor_id']}"
+    entry = _entry(reading)
+    with _lock:
+        cached = _latest.get(table)
+        # Une mesure plus ancienne (donnees bufferisees) ne remplace pas la derniere
+        if cached and cached["ts"] > entry["ts"]:
+            if entry["temperature"] is not None and not cached.get("last_activity"):
+                cached["last_activity"] = {"date": entry["date"], "hour": entry["hour"]}
+            return
+        # Les lignes NULL (synchronisation entre capteurs) ne comptent pas comme activite
+        if entry["temperature"] is not None:
+            entry["last_activity"] = {"date": entry["date"], "hour": entry["hour"]}
+        else:
+            entry["last_activity"] = cached.get("last_activity") if cached else None
+        _latest[table] = entry
+
+
+def get_latest(table):
+    """Retourne la derniere mesure d'un capteur, ou None si aucune donnee"""
+    _refresh_if_changed()
+    with _lock:
+        entry = _latest.get(table)
+        return dict(entry) if entry else None
+
+
+def get_all_latest():
+    """Retourne {table: derniere mesure ou None} pour tous les capteurs connus"""
+    _refresh_if_changed()
+    with _lock:
+        return {table: dict(entry) if entry else None
+                for table, entry in sorted(_latest.items(), key=lambda item: db.sensor_id_of(item[0]))}
+
+
+def warm():
+    """Recharge le cache depuis la DB (une ligne par capteur)"""
+    writes = db.get_all_last_writes()
+    _reload([f"esp{sensor_id}" for sensor_id in writes], writes, remove_missing=True)
+
+
+def _load(table):
+    """Derniere mesure d'un capteur lue en DB (entree du cache, None si aucune mesure)"""
+    reading = db.get_latest_reading(db.sensor_id_of(table))
+    if not reading:
+        return None
+    entry = _entry(reading)
+    entry["last_activity"] = db.get_sensor_last_activity(table)
+    return entry
+
+
+def _reload(tables, writes, remove_missing=False):
+    """Recharge des capteurs depuis la DB ; remove_missing : oublie les capteurs absents de `writes`"""
+    loaded = {table: _load(table) for table in tables}
+    with _lock:
+        for table, entry in loaded.items():
+            _known_writes[db.sensor_id_of(table)] = writes.get(db.sensor_id_of(table))
+            cached = _latest.get(table)
+            # Garder la valeur du cache si elle est plus recente (pas encore ecrite en DB)
+            if cached and (entry is None or cached["ts"] > entry["ts"]):
+                continue
+            _latest[table] = entry
+        if remove_missing:
+            # Capteurs supprimes entre temps
+            for table in list(_latest):
+                if db.sensor_id_of(table) not in writes:
+                    del _latest[table]
+                    _known_writes.pop(db.sensor_id_of(table), None)
+
+
+def _refresh_if_changed():
+    """
+    Si la DB a ete modifiee depuis la derniere lecture de ce thread, recharge seulement
+    les capteurs ecrits par un autre processus (ou ajoutes / supprimes).
+    """
+    conn = db.get_db_connection()
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if getattr(_local, "conn", None) is conn and _local.version == version:
+        return
+    _local.conn = conn
+    _local.version = version
+
+    writes = db.get_all_last_writes()
+    changed = []
+    with _lock:
+        for sensor_id, last_write in writes.items():
+            if _known_writes.get(sensor_id, -1) == last_write:
+                continue
+            if last_write == db.own_last_write(sensor_id) and f"esp{sensor_id}" in _latest:
+                # Ecrit par ce processus : le cache est deja a jour
+                _known_writes[sensor_id] = last_write
+                continue
+            changed.append(f"esp{sensor_id}")
+        removed = [table for table in _latest if db.sensor_id_of(table) not in writes]
+    if changed or removed:
+        _reload(changed, writes, remove_missing=bool(removed))
@@ -0,0 +1,196 @@
+# Fonction : graphiques PNG rendus cote serveur (matplotlib) avec un cache disque
+#
+# Les tablettes murales n'ont qu'a afficher une image au lieu de redessiner des milliers
+# de points. Le rendu matplotlib tourne dans un pool de processus (ProcessPoolExecutor) :
+# il ne prend pas le GIL des threads Flask et matplotlib n'est jamais utilise par deux
+# threads a la fois. Les series sont lues et reduites par le serveur (api.chart_series),
+# le processus ne recoit que quelques centaines de points et renvoie le PNG.
+#
+# Cache : un fichier par graphique dans CHART_CACHE_DIR, taille totale bornee
+# (CHART_CACHE_MAX_MB), les moins recemment utilises sont supprimes en premier
+# (la date de modification est mise a jour a chaque lecture).
+
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Dossier du cache (par defaut weather_data_charts/ a cote de la DB)
+CHART_CACHE_DIR = os.environ.get('CHART_CACHE_DIR') or \
+    os.path.splitext(os.environ.get('DATABASE_PATH', 'weather_data.db'))[0] + "_charts"
+CHART_CACHE_MAX_MB = float(os.environ.get('CHART_CACHE_MAX_MB', 64))
+# Processus de rendu et attente maximum d'un rendu (secondes)
+CHART_WORKERS = int(os.environ.get('CHART_WORKERS', 2))
+CHART_TIMEOUT = float(os.environ.get('CHART_TIMEOUT', 30))
+# Taille de l'image (pixels) et nombre de points traces
+CHART_WIDTH = int(os.environ.get('CHART_WIDTH', 800))
+CHART_HEIGHT = int(os.environ.get('CHART_HEIGHT', 400))
+CHART_POINTS = int(os.environ.get('CHART_POINTS', 400))
+
+LABELS = {
+    "temperature": ("Temperature", "°C"),
+    "humidity": ("Humidite", "%"),
+    "pressure": ("Pression", "hPa")
+}
+TIMEZONE_SUISSE = ZoneInfo("Europe/Zurich")
+
+_pool = None
+_inflight = {}  # nom du fichier -> rendu en cours (une seule fois pour des requetes identiques)
+_lock = threading.Lock()
+
+
+def cache_name(sensor_id, metric, start, end, version):
+    """
+    Nom du fichier d'un graphique : capteur, grandeur, intervalle et version des donnees
+    (sensors.last_write du capteur).
+    """
+    return f"esp{sensor_id}_{metric}_{start}_{end}_{version}.png"
+
+
+def cached(name):
+    """PNG en cache (None si absent), marque comme recemment utilise"""
+    path = os.path.join(CHART_CACHE_DIR, name)
+    try:
+        with open(path, "rb") as f:
+            png = f.read()
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return png
+
+
+def store(name, png):
+    """Ajoute un PNG au cache (remplace les anciennes versions du meme graphique), puis borne la taille"""
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    path = os.path.join(CHART_CACHE_DIR, name)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(png)
+    os.replace(tmp, path)
+
+    prefix = name.rsplit("_", 1)[0] + "_"
+    for entry in os.scandir(CHART_CACHE_DIR):
+        if entry.name != name and entry.name.startswith(prefix) and entry.name.endswith(".png"):
+            _remove(entry.path)
+    evict()
+
+
+def evict(max_bytes=None):
+    """Supprime les graphiques les moins recemment utilises tant que le cache depasse max_bytes"""
+    max_bytes = CHART_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    try:
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                   for entry in os.scandir(CHART_CACHE_DIR) if entry.name.endswith(".png")]
+    except FileNotFoundError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def clear():
+    """Vide le cache (capteur supprime)"""
+    evict(max_bytes=0)
+
+
+def chart_png(name, load):
+    """
+    Retourne le PNG d'un graphique : depuis le cache, sinon rendu dans le pool de processus.
+    load() lit la serie (appele seulement si le graphique n'est ni en cache ni en cours de rendu)
+    et retourne les arguments de render_png.
+    """
+    png = cached(name)
+    if png is not None:
+        return png
+
+    with _lock:
+        future = _inflight.get(name)
+    owner = future is None
+    if owner:
+        series = load()
+        with _lock:
+            future = _inflight.get(name)
+            owner = future is None
+            if owner:
+                future = _inflight[name] = _get_pool().submit(render_png, **series)
+
+    try:
+        png = future.result(timeout=CHART_TIMEOUT)
+        if owner:
+            store(name, png)
+        return png
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+    finally:
+        if owner:
+            with _lock:
+                _inflight.pop(name, None)
+
+
+def render_png(title, unit, ts, avg, low, high):
+    """
+    Dessine une serie (moyenne par intervalle + bande min/max) et retourne le PNG.
+    Execute dans un processus du pool : matplotlib n'est importe que la.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+    from matplotlib.figure import Figure
+
+    dpi = 100
+    fig = Figure(figsize=(CHART_WIDTH / dpi, CHART_HEIGHT / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_title(title)
+    ax.set_ylabel(unit)
+    ax.grid(True, alpha=0.3)
+
+    if len(ts):
+        dates = [datetime.fromtimestamp(t / 1000, TIMEZONE_SUISSE) for t in ts]
+        ax.fill_between(dates, low, high, alpha=0.25, linewidth=0)
+        ax.plot(dates, avg, linewidth=1.5)
+        locator = AutoDateLocator(tz=TIMEZONE_SUISSE)
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator, tz=TIMEZONE_SUISSE))
+    else:
+        ax.text(0.5, 0.5, "Aucune donnee", ha="center", va="center", transform=ax.transAxes)
+
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def _get_pool():
+    """Pool de processus de rendu, cree a la premiere demande (appele avec _lock)"""
+    global _pool
+    if _pool is None:
+        # spawn : pas de copie des threads et verrous du serveur dans les processus de rendu
+        _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _reset_pool():
+    """Un processus de rendu est mort : le pool sera recree a la prochaine demande"""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _remove(path):
+    """Supprime un fichier du cache (deja supprime par un autre worker : ignore)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
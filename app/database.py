@@ -4,125 +4,1100 @@
 # Fonction : créer la DB SQLite et gérer les opérations de base de données
 
 import sqlite3
+import json
 import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+try:
+    from app import analytics, archive, metrics
+except:
+    import analytics
+    import archive
+    import metrics
 
 # Chemin de la base de donnees (configurable via variable d'environnement pour Railway)
 DB_PATH = os.environ.get('DATABASE_PATH', 'weather_data.db')
+# Dossier des mois archives (voir archive.py), par defaut a cote de la DB : weather_data_archive/
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')
+
+# Reglages SQLite appliques une seule fois, a l'ouverture de chaque connexion
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_KB = int(os.environ.get('SQLITE_CACHE_KB', 16384))  # cache de pages (16 Mo)
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))  # lecture via mmap (128 Mo)
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# Journal des requetes lentes (voir log_slow_query) : seuil en ms (0 = desactive), nombre de
+# requetes gardees en memoire, fichier optionnel (une ligne JSON par requete, partage par les
+# workers gunicorn) et sa taille maximum avant rotation (fichier.1)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 200))
+SLOW_QUERY_FILE = os.environ.get('SLOW_QUERY_FILE')
+SLOW_QUERY_FILE_MB = float(os.environ.get('SLOW_QUERY_FILE_MB', 5))
+
+# Une connexion par thread, gardee ouverte et reutilisee d'une requete a l'autre
+_local = threading.local()
+
+# Les dates/heures affichees sont en heure suisse, les mesures sont stockees en UTC (ts)
+TIMEZONE_SUISSE = ZoneInfo("Europe/Zurich")
+
+# Anciennes tables de donnees, une par capteur (esp1, esp2, ...)
+SENSOR_TABLE = re.compile(r"^esp(\d+)$")
+
+
+###############################################################################
+########################___DATES ET TIMESTAMPS (ts)___#########################
+###############################################################################
+
+def now_ts():
+    """Retourne l'instant present en millisecondes depuis 1970 (UTC)"""
+    return int(datetime.now(TIMEZONE_SUISSE).timestamp() * 1000)
+
+
+def ts_to_date_hour(ts):
+    """Convertit un ts (ms) en ("AAAA-MM-JJ", "HH:MM:SS") heure suisse"""
+    local = datetime.fromtimestamp(ts / 1000, TIMEZONE_SUISSE)
+    return local.strftime("%Y-%m-%d"), local.strftime("%H:%M:%S")
+
+
+def date_hour_to_ts(date, hour="00:00:00", fold=0):
+    """Convertit une date et une heure suisse en ts (ms)"""
+    local = datetime.strptime(f"{date} {hour}", "%Y-%m-%d %H:%M:%S")
+    return int(local.replace(tzinfo=TIMEZONE_SUISSE, fold=fold).timestamp() * 1000)
+
+
+def day_bounds(date):
+    """Retourne (debut du jour, debut du jour suivant) en ts (ms) pour une date suisse "AAAA-MM-JJ" """
+    start = datetime.strptime(date, "%Y-%m-%d")
+    end = start + timedelta(days=1)
+    return (int(start.replace(tzinfo=TIMEZONE_SUISSE).timestamp() * 1000),
+            int(end.replace(tzinfo=TIMEZONE_SUISSE).timestamp() * 1000))
+
+
+def parse_time(value, end=False):
+    """
+    Convertit un parametre from/to en ts (ms). Accepte :
+    un ts en millisecondes, "AAAA-MM-JJ" ou "AAAA-MM-JJTHH:MM[:SS]" (heure suisse).
+    Avec end=True, une date seule designe la fin de ce jour (le jour est inclus).
+    Leve ValueError si le format n'est pas reconnu.
+    """
+    if value is None or value == "":
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    if len(value) == 10:
+        start, stop = day_bounds(value)
+        return stop if end else start
+    local = datetime.fromisoformat(value.replace(" ", "T"))
+    if local.tzinfo is None:
+        local = local.replace(tzinfo=TIMEZONE_SUISSE)
+    return int(local.timestamp() * 1000)
+
+
+def time_range(date=None, start=None, end=None):
+    """
+    Combine un jour ("AAAA-MM-JJ", "today" = pas de filtre) et des bornes from/to
+    en un intervalle (start inclus, end exclu) de ts en ms. None = pas de borne.
+    """
+    start = parse_time(start)
+    end = parse_time(end, end=True)
+    if date and date not in ("today", "None"):
+        day_start, day_end = day_bounds(date)
+        start = max(start, day_start) if start is not None else day_start
+        end = min(end, day_end) if end is not None else day_end
+    return start, end
+
+
+def _local_date(ts):
+    """Fonction SQL local_date(ts) -> 'AAAA-MM-JJ' (heure suisse)"""
+    return ts_to_date_hour(ts)[0] if ts is not None else None
+
+
+def _local_hour(ts):
+    """Fonction SQL local_hour(ts) -> 'HH:MM:SS' (heure suisse)"""
+    return ts_to_date_hour(ts)[1] if ts is not None else None
+
+
+def sensor_id_of(table):
+    """Retourne le numero d'un capteur a partir de son nom ("esp3" -> 3), sinon None"""
+    match = SENSOR_TABLE.match(str(table))
+    return int(match.group(1)) if match else None
+
+
+class MeteredCursor(sqlite3.Cursor):
+    """
+    Curseur qui compte les requetes, les lignes et le temps passe dans SQLite (voir metrics.py)
+    et signale les requetes lentes (execute + lectures de la requete > SLOW_QUERY_MS).
+    """
+
+    _sql = None
+    _params = None
+    _spent = 0.0
+    _rows = 0
+    _logged = False
+
+    def execute(self, sql, parameters=()):
+        self._start_query(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            # rowcount : lignes modifiees (INSERT/UPDATE/DELETE), -1 pour un SELECT
+            self._account(time.perf_counter() - start, max(self.rowcount, 0), 1)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Plan de la requete avec le premier jeu de parametres (si c'est une liste)
+        first = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else None
+        self._start_query(sql, first)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._account(time.perf_counter() - start, max(self.rowcount, 0), 1)
+
+    def executescript(self, sql_script):
+        self._start_query(sql_script, None)
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._account(time.perf_counter() - start, 0, 1)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._account(time.perf_counter() - start, int(row is not None))
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._account(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._account(time.perf_counter() - start, len(rows))
+        return rows
+
+    def __next__(self):
+        # Lectures ligne par ligne (petites requetes) : les grandes lectures utilisent fetchall/fetchmany
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._account(time.perf_counter() - start, 0)
+            raise
+        self._account(time.perf_counter() - start, 1)
+        return row
+
+    def _start_query(self, sql, parameters):
+        """Nouvelle requete sur ce curseur : le temps et les lignes repartent de zero"""
+        self._sql = sql
+        self._params = parameters
+        self._spent = 0.0
+        self._rows = 0
+        self._logged = False
+
+    def _account(self, elapsed, rows, queries=0):
+        """Ajoute le temps et les lignes a la requete en cours, la signale une fois si elle devient lente"""
+        metrics.record_sql(elapsed, rows, queries)
+        self._spent += elapsed
+        self._rows += rows
+        if SLOW_QUERY_MS and not self._logged and self._spent * 1000 >= SLOW_QUERY_MS and self._sql is not None:
+            self._logged = True
+            log_slow_query(self.connection, self._sql, self._params, self._spent, self._rows)
+
+
+class MeteredConnection(sqlite3.Connection):
+    """Connexion dont les curseurs (et conn.execute) sont des MeteredCursor"""
+
+    def cursor(self, factory=MeteredCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def _open_connection():
+    """Ouvre une connexion SQLite et applique les PRAGMA de performance"""
+    factory = MeteredConnection if metrics.METRICS_ENABLED or SLOW_QUERY_MS else sqlite3.Connection
+    conn = sqlite3.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, factory=factory)
+    metrics.record_connection()
+    # Pages liberees rendues au systeme petit a petit (voir incremental_vacuum). Doit preceder
+    # le passage en WAL ; sans effet sur une base existante : python -m app.manage vacuum
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL : les lecteurs ne bloquent plus l'ecriture (et inversement)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL : plus de fsync a chaque commit, la DB reste coherente en WAL
+    conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Date et heure suisse calculees dans les requetes SQL a partir de ts
+    conn.create_function("local_date", 1, _local_date, deterministic=True)
+    conn.create_function("local_hour", 1, _local_hour, deterministic=True)
+    return conn
+
 
 def get_db_connection():
-    """Retourne une connexion SQLite (thread-safe)"""
-    conn = sqlite3.connect(DB_PATH)
+    """Retourne la connexion SQLite du thread courant (ouverte une seule fois)"""
+    conn = getattr(_local, "conn", None)
+    # Nouvelle connexion si le thread n'en a pas, si la DB a change ou apres un fork (gunicorn)
+    if conn is None or _local.path != DB_PATH or _local.pid != os.getpid():
+        conn = _open_connection()
+        _local.conn = conn
+        _local.path = DB_PATH
+        _local.pid = os.getpid()
+        _local.depth = 0
     return conn
 
+
+def close_db_connection():
+    """Ferme la connexion du thread courant (elle sera rouverte au besoin)"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+@contextmanager
+def db_connection():
+    """
+    Fournit la connexion du thread courant.
+    Le commit est fait a la sortie du bloc le plus externe, rollback en cas d'erreur.
+    Exemple :
+        with db_connection() as conn:
+            conn.execute("INSERT ...")
+    """
+    conn = get_db_connection()
+    _local.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.rollback()
+        raise
+    _local.depth -= 1
+    if _local.depth == 0:
+        conn.commit()
+
+###############################################################################
+###########################___REQUETES LENTES___###############################
+###############################################################################
+
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_slow_lock = threading.Lock()
+
+
+def log_slow_query(conn, sql, params, elapsed, rows):
+    """
+    Enregistre une requete plus lente que SLOW_QUERY_MS : SQL, parametres, endpoint appelant,
+    duree (execute + lectures jusqu'au depassement du seuil), lignes et plan d'execution
+    (EXPLAIN QUERY PLAN). "scan" signale un parcours complet d'une table (index manquant ?).
+    """
+    plan = _query_plan(conn, sql, params)
+    entry = {
+        "time": datetime.now(TIMEZONE_SUISSE).strftime("%Y-%m-%d %H:%M:%S"),
+        "ms": round(elapsed * 1000, 1),
+        "endpoint": metrics.current_endpoint(),
+        "sql": " ".join(sql.split()),
+        "params": _short_repr(params),
+        "rows": rows,
+        "plan": plan,
+        "scan": any(line.strip().startswith("SCAN ") and "CONSTANT ROW" not in line for line in plan),
+        "pid": os.getpid()
+    }
+    print(f"Requete lente ({entry['ms']} ms, {entry['endpoint']}) : {entry['sql'][:120]}")
+    with _slow_lock:
+        _slow_queries.append(entry)
+        if SLOW_QUERY_FILE:
+            try:
+                _append_slow_file(entry)
+            except OSError as e:
+                print(f"Erreur journal des requetes lentes : {e}")
+    return entry
+
+
+def get_slow_queries(limit=None):
+    """
+    Dernieres requetes lentes, la plus recente en premier.
+    Avec SLOW_QUERY_FILE, lues dans le fichier (tous les workers), sinon celles de ce processus.
+    """
+    limit = SLOW_QUERY_LOG_SIZE if limit is None else limit
+    if not SLOW_QUERY_FILE:
+        with _slow_lock:
+            entries = list(_slow_queries)
+        return entries[::-1][:limit]
+
+    entries = deque(maxlen=limit)
+    for path in (SLOW_QUERY_FILE + ".1", SLOW_QUERY_FILE):
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        pass  # ligne coupee par une rotation
+        except FileNotFoundError:
+            pass
+    return list(entries)[::-1]
+
+
+def clear_slow_queries():
+    """Vide le journal des requetes lentes (memoire et fichier)"""
+    with _slow_lock:
+        _slow_queries.clear()
+        if SLOW_QUERY_FILE:
+            for path in (SLOW_QUERY_FILE, SLOW_QUERY_FILE + ".1"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def _query_plan(conn, sql, params):
+    """Lignes de EXPLAIN QUERY PLAN, indentees comme dans le shell sqlite3"""
+    try:
+        # Connexion de base : le plan n'est ni compte ni signale comme requete lente
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+    except (sqlite3.Error, ValueError) as e:
+        return [f"(plan indisponible : {e})"]
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def _short_repr(params, size=200):
+    """Parametres d'une requete pour le journal (coupes a `size` caracteres)"""
+    text = repr(params)
+    return text if len(text) <= size else text[:size] + "..."
+
+
+def _append_slow_file(entry):
+    """Ajoute une ligne au fichier des requetes lentes, rotation au-dela de SLOW_QUERY_FILE_MB (appele avec _slow_lock)"""
+    try:
+        if os.path.getsize(SLOW_QUERY_FILE) > SLOW_QUERY_FILE_MB * 1024 * 1024:
+            os.replace(SLOW_QUERY_FILE, SLOW_QUERY_FILE + ".1")
+    except FileNotFoundError:
+        pass
+    with open(SLOW_QUERY_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, default=str) + "\n")
+
+###############################################################################
+###########################___TABLES ET MESURES___#############################
+###############################################################################
+
 def create_tables():
     """Crée les tables si elles n'existent pas
-    Le nom de la table est l'adresse ip de l'appareil"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    Toutes les mesures sont dans la table readings (une ligne par capteur et par instant)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    name = ["esp1","esp2"]
-    for i in name :
-        cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {i} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+        # Liste des capteurs connus (remplace le parcours de sqlite_master)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sensors (
+            sensor_id INTEGER PRIMARY KEY,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_write INTEGER NOT NULL DEFAULT 0   -- ts (ms) du dernier ajout de mesures
+        );
+        """)
+        # Base creee avant la colonne last_write
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(sensors)")]
+        if "last_write" not in columns:
+            cursor.execute("ALTER TABLE sensors ADD COLUMN last_write INTEGER NOT NULL DEFAULT 0")
+
+        # Mesures de tous les capteurs. La cle (sensor_id, ts) sert d'index :
+        # les lignes d'un capteur sont rangees dans l'ordre du temps (WITHOUT ROWID)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS readings (
+            sensor_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,     -- millisecondes depuis 1970 (UTC)
             temperature REAL,
             humidity REAL,
             pressure REAL,
-            date TEXT NOT NULL,
-            hour TEXT NOT NULL
+            PRIMARY KEY (sensor_id, ts)
+        ) WITHOUT ROWID;
+        """)
+
+        # Min/max/somme/nombre par capteur, jour (heure suisse) et grandeur.
+        # Mis a jour a chaque insertion : le resume journalier ne relit pas les mesures
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            sensor_id INTEGER NOT NULL,
+            day TEXT NOT NULL,       -- "AAAA-MM-JJ"
+            metric TEXT NOT NULL,    -- temperature, humidity, pressure
+            min REAL,
+            max REAL,
+            sum REAL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (sensor_id, day, metric)
+        ) WITHOUT ROWID;
+        """)
+
+        # Meme resume par heure, pour les periodes dont les mesures brutes ont ete
+        # supprimees (retention.py). hour = ts (ms) du debut de l'heure
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS hourly_rollup (
+            sensor_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            min REAL,
+            max REAL,
+            sum REAL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (sensor_id, hour, metric)
+        ) WITHOUT ROWID;
+        """)
+
+        # Les capteurs 1 et 2 existent toujours (comme les anciennes tables esp1/esp2)
+        cursor.executemany("INSERT OR IGNORE INTO sensors (sensor_id) VALUES (?)", [(1,), (2,)])
+
+        # Table pour la configuration des ESP32
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS esp32_devices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mac_address TEXT UNIQUE NOT NULL,
+            sensor_number INTEGER,
+            name TEXT,
+            last_seen TEXT,
+            ip_address TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
         );
         """)
 
-    # Table pour la configuration des ESP32
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS esp32_devices (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        mac_address TEXT UNIQUE NOT NULL,
-        sensor_number INTEGER,
-        name TEXT,
-        last_seen TEXT,
-        ip_address TEXT,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
+        # Version du registre des capteurs (voir _sensor_registry), incrementee par des triggers
+        # a chaque ajout, suppression ou renommage : les autres workers relisent leur registre
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS registry_version (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            version INTEGER NOT NULL
+        );
+        """)
+        cursor.execute("INSERT OR IGNORE INTO registry_version (id, version) VALUES (0, 0)")
+        for name, event in (
+            ("sensors_insert", "AFTER INSERT ON sensors"),
+            ("sensors_delete", "AFTER DELETE ON sensors"),
+            ("devices_insert", "AFTER INSERT ON esp32_devices"),
+            ("devices_update", "AFTER UPDATE OF sensor_number, name ON esp32_devices"),
+            ("devices_delete", "AFTER DELETE ON esp32_devices"),
+        ):
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS registry_{name} {event}
+            BEGIN UPDATE registry_version SET version = version + 1; END
+            """)
 
-    conn.commit()
-    conn.close()
+    legacy = get_legacy_tables()
+    if legacy:
+        print(f"Anciennes tables {', '.join(legacy)} a migrer : python -m app.manage migrate")
 
-def add_data(table, value={}):
-    """Ajoute une ligne dans une table"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        rollup_missing = (conn.execute("SELECT 1 FROM daily_rollup LIMIT 1").fetchone() is None
+                          and conn.execute("SELECT 1 FROM readings LIMIT 1").fetchone() is not None)
+    if rollup_missing:
+        print("Resume journalier vide : python -m app.manage rebuild-rollup")
 
-    columns = ", ".join(f"`{k}`" for k in value.keys())
-    placeholders = ", ".join("?" for _ in value.values())
-    command = f"INSERT INTO `{table}` ({columns}) VALUES ({placeholders})"
 
-    values = tuple(value.values())
-    cursor.execute(command, values)
-    conn.commit()
-    conn.close()
-    return True
+# Grandeurs mesurees par les capteurs
+METRICS = ("temperature", "humidity", "pressure")
 
-def read_data(table, column="*", where=None,order=None):
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        command = f"SELECT {column} FROM `{table}`"
-        if where:
-            command += f" WHERE {where}"
-        if order:
-            command += f" ORDER BY {order}"
-        cursor.execute(command)
-        results = cursor.fetchall()
-        return results
-    except Exception as e:
-        print(f"Erreur lecture table {table}: {e}")
-        return []
-    finally:
-        conn.close()
 
+def add_readings(readings):
+    """
+    Ajoute des mesures dans la table readings en une seule transaction.
+    readings : liste de dict {"sensor_id", "ts", "temperature", "humidity", "pressure"}
+    Une mesure deja presente (meme capteur, meme ts) est ignoree.
+    Le resume journalier (daily_rollup) est mis a jour dans la meme transaction.
+    Retourne le nombre de mesures ajoutees.
+    """
+    return len(insert_readings(readings))
 
-def create_table_if_not_exists(table_name):
+
+def insert_readings(readings):
     """
-    Cree une table pour un nouveau capteur si elle n'existe pas.
-    Permet d'ajouter des capteurs dynamiquement (esp1, esp2, esp3, esp4...)
+    Comme add_readings(), mais retourne la liste des mesures ajoutees
+    (sans celles deja en DB ni les doublons du lot, la premiere occurrence est gardee).
+    Les valeurs sont ecrites avec la precision du float32 (analytics.exact_value) : la DB,
+    les mois archives et les resumes servent le meme nombre pour une mesure.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(f"""
-    CREATE TABLE IF NOT EXISTS {table_name} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        temperature REAL,
-        humidity REAL,
-        pressure REAL,
-        date TEXT NOT NULL,
-        hour TEXT NOT NULL
-    );
-    """)
+    readings = [exact_reading(r) for r in readings]
+    with db_connection() as conn:
+        new = _new_readings(conn, readings)
+        conn.executemany(
+            "INSERT OR IGNORE INTO readings (sensor_id, ts, temperature, humidity, pressure) VALUES (?, ?, ?, ?, ?)",
+            [(r["sensor_id"], r["ts"], r.get("temperature"), r.get("humidity"), r.get("pressure")) for r in new]
+        )
+        _update_daily_rollup(conn, new)
+        _touch_sensors(conn, {r["sensor_id"] for r in new})
+    return new
 
-    conn.commit()
-    conn.close()
-    print(f"Table {table_name} prete")
 
+def exact_reading(reading):
+    """Mesure avec ses valeurs telles qu'elles sont ecrites en DB (voir insert_readings)"""
+    return {**reading, **{metric: analytics.exact_value(reading.get(metric)) for metric in METRICS}}
 
-def get_all_sensors():
+
+# Derniere valeur de sensors.last_write ecrite par ce processus, par capteur : le cache
+# (cache.py) ne recharge un capteur que si une autre valeur est en DB (autre processus)
+_own_writes = {}
+
+
+def _touch_sensors(conn, sensor_ids):
     """
-    Retourne la liste de tous les capteurs (tables esp*) dans la base de donnees.
+    Note l'instant de la derniere ecriture des capteurs (sensors.last_write).
+    Sert de validateur (ETag / Last-Modified) pour les historiques, toujours croissant.
     """
+    now = now_ts()
+    for sensor_id in sensor_ids:
+        row = conn.execute(
+            "UPDATE sensors SET last_write = MAX(last_write + 1, ?) WHERE sensor_id = ? RETURNING last_write",
+            (now, sensor_id)
+        ).fetchone()
+        if row:
+            _own_writes[sensor_id] = row[0]
+
+
+def own_last_write(sensor_id):
+    """Derniere valeur de sensors.last_write ecrite par ce processus (None si aucune)"""
+    return _own_writes.get(sensor_id)
+
+
+def get_all_last_writes():
+    """Retourne {sensor_id: last_write} pour tous les capteurs (une seule requete)"""
+    with db_connection() as conn:
+        return dict(conn.execute("SELECT sensor_id, last_write FROM sensors").fetchall())
+
+
+def get_last_writes(sensor_ids):
+    """Retourne {sensor_id: ts (ms) de la derniere ecriture} (0 si aucune)"""
+    sensor_ids = list(sensor_ids)
+    if not sensor_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in sensor_ids)
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT sensor_id, last_write FROM sensors WHERE sensor_id IN ({placeholders})", sensor_ids
+        ).fetchall()
+    writes = {sensor_id: 0 for sensor_id in sensor_ids}
+    writes.update(rows)
+    return writes
+
+
+def _new_readings(conn, readings):
+    """Retire les mesures deja en DB (ou en double dans le lot), pour ne pas les compter deux fois"""
+    by_sensor = {}
+    for r in readings:
+        by_sensor.setdefault(r["sensor_id"], set()).add(r["ts"])
+
+    existing = set()
+    for sensor_id, stamps in by_sensor.items():
+        stamps = sorted(stamps)
+        for i in range(0, len(stamps), 500):
+            chunk = stamps[i:i + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            for (ts,) in conn.execute(
+                f"SELECT ts FROM readings WHERE sensor_id = ? AND ts IN ({placeholders})", [sensor_id, *chunk]
+            ):
+                existing.add((sensor_id, ts))
+        # Mesure deja archivee (renvoi d'un ancien lot)
+        for ts in _archived_stamps(sensor_id, stamps):
+            existing.add((sensor_id, ts))
+
+    new = []
+    for r in readings:
+        key = (r["sensor_id"], r["ts"])
+        if key not in existing:
+            existing.add(key)
+            new.append(r)
+    return new
+
+
+def _archived_stamps(sensor_id, stamps):
+    """ts (tries) deja presents dans les mois archives du capteur"""
+    found = []
+    directory = archive_dir()
+    for month in archive.months(directory, sensor_id):
+        lo, hi = month_bounds(month)
+        if stamps[0] >= hi or stamps[-1] < lo:
+            continue
+        archived = archive.load(directory, sensor_id, month)["ts"]
+        candidates = np.array([ts for ts in stamps if lo <= ts < hi], dtype=np.int64)
+        found += candidates[np.isin(candidates, archived)].tolist()
+    return found
+
+
+def _update_daily_rollup(conn, readings):
+    """Ajoute des mesures au resume journalier (min, max, somme, nombre par jour et grandeur)"""
+    groups = {}
+    for r in readings:
+        day = ts_to_date_hour(r["ts"])[0]
+        for metric in METRICS:
+            value = r.get(metric)
+            if value is None:
+                continue
+            key = (r["sensor_id"], day, metric)
+            g = groups.get(key)
+            if g is None:
+                groups[key] = [value, value, value, 1]
+            else:
+                g[0] = min(g[0], value)
+                g[1] = max(g[1], value)
+                g[2] += value
+                g[3] += 1
+
+    conn.executemany("""
+        INSERT INTO daily_rollup (sensor_id, day, metric, min, max, sum, count)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (sensor_id, day, metric) DO UPDATE SET
+            min = MIN(min, excluded.min),
+            max = MAX(max, excluded.max),
+            sum = sum + excluded.sum,
+            count = count + excluded.count
+    """, [(*key, *g) for key, g in groups.items()])
+
+
+def rebuild_daily_rollup(sensor_id):
+    """
+    Recalcule le resume journalier d'un capteur a partir de toutes ses mesures
+    (en DB et dans les mois archives) et du resume horaire. Retourne le nombre de jours calcules.
+    """
+    with db_connection() as conn:
+        rows = conn.execute("""
+            SELECT local_date(ts) AS day,
+                   MIN(temperature), MAX(temperature), SUM(temperature), COUNT(temperature),
+                   MIN(humidity),    MAX(humidity),    SUM(humidity),    COUNT(humidity),
+                   MIN(pressure),    MAX(pressure),    SUM(pressure),    COUNT(pressure)
+            FROM readings
+            WHERE sensor_id = ?
+            GROUP BY day
+        """, (sensor_id,)).fetchall()
+
+        # min/max avec la precision du float32, comme les mois archives (mesures ecrites
+        # avant que insert_readings n'arrondisse les valeurs)
+        days = {}
+        for row in rows:
+            for i, metric in enumerate(METRICS):
+                mn, mx, total, count = row[1 + 4 * i:5 + 4 * i]
+                if count:
+                    days[(row[0], metric)] = (analytics.exact_value(mn), analytics.exact_value(mx), total, count)
+
+        # Mois archives : memes agregats par jour sur les colonnes (sans les ts encore en DB)
+        directory = archive_dir()
+        for month in archive.months(directory, sensor_id):
+            data = archive.load(directory, sensor_id, month)
+            lo, hi = month_bounds(month)
+            live = [ts for (ts,) in conn.execute(
+                "SELECT ts FROM readings WHERE sensor_id = ? AND ts >= ? AND ts < ?", (sensor_id, lo, hi))]
+            for day, values in _archived_days(data, month, live):
+                for metric in METRICS:
+                    column = analytics.exact(values[metric][~np.isnan(values[metric])])
+                    if not len(column):
+                        continue
+                    stats = (float(column.min()), float(column.max()), float(column.sum()), len(column))
+                    previous = days.get((day, metric))
+                    if previous:
+                        stats = (min(previous[0], stats[0]), max(previous[1], stats[1]),
+                                 previous[2] + stats[2], previous[3] + stats[3])
+                    days[(day, metric)] = stats
+
+        # Heures deja resumees (mesures brutes supprimees, voir retention.py)
+        for day, metric, *stats in conn.execute("""
+            SELECT local_date(hour), metric, MIN(min), MAX(max), SUM(sum), SUM(count)
+            FROM hourly_rollup
+            WHERE sensor_id = ?
+            GROUP BY 1, 2
+        """, (sensor_id,)):
+            previous = days.get((day, metric))
+            if previous:
+                stats = (min(previous[0], stats[0]), max(previous[1], stats[1]),
+                         previous[2] + stats[2], previous[3] + stats[3])
+            days[(day, metric)] = tuple(stats)
+
+        # Les jours plus anciens que les donnees restantes (resume horaire expire) sont gardes
+        if days:
+            first = min(day for day, _ in days)
+            conn.execute("DELETE FROM daily_rollup WHERE sensor_id = ? AND day >= ?", (sensor_id, first))
+        conn.executemany(
+            "INSERT INTO daily_rollup (sensor_id, day, metric, min, max, sum, count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(sensor_id, day, metric, *stats) for (day, metric), stats in days.items()]
+        )
+    return len({day for day, _ in days})
+
+
+def _archived_days(data, month, live_stamps):
+    """Decoupe les colonnes d'un mois archive par jour suisse : (jour, colonnes du jour)"""
+    if live_stamps:
+        keep = ~np.isin(data["ts"], np.array(live_stamps, dtype=np.int64))
+        data = {name: np.asarray(values)[keep] for name, values in data.items()}
+    day = f"{month}-01"
+    while day.startswith(month):
+        lo, hi = day_bounds(day)
+        values = archive.slice_columns(data, lo, hi)
+        if len(values["ts"]):
+            yield day, values
+        day = ts_to_date_hour(hi)[0]
+
+
+def read_daily_summary(sensor_id, start=None, end=None, limit=7):
+    """
+    Retourne les max/min par jour d'un capteur, du plus recent au plus ancien,
+    lus dans daily_rollup (cout proportionnel au nombre de jours, pas de mesures).
+    start/end en ts (ms) : les jours qui contiennent ces instants sont inclus.
+    """
+    command = "SELECT day, metric, min, max FROM daily_rollup WHERE sensor_id = ?"
+    params = [sensor_id]
+    if start is not None:
+        command += " AND day >= ?"
+        params.append(ts_to_date_hour(start)[0])
+    if end is not None:
+        command += " AND day <= ?"
+        params.append(ts_to_date_hour(end - 1)[0])
+    # Au plus 3 lignes (grandeurs) par jour
+    command += " ORDER BY day DESC LIMIT ?"
+    params.append(limit * len(METRICS))
+
+    with db_connection() as conn:
+        rows = conn.execute(command, params).fetchall()
+
+    days = {}
+    for day, metric, mn, mx in rows:
+        entry = days.setdefault(day, {
+            "date": day,
+            "temperature": {"max": None, "min": None},
+            "humidity": {"max": None, "min": None},
+            "pressure": {"max": None, "min": None},
+        })
+        entry[metric] = {"max": mx, "min": mn}
+
+    return list(days.values())[:limit]
+
+
+def get_rollup_days(sensor_id=None):
+    """Retourne les jours qui ont des mesures, pour un capteur ou pour tous (du plus recent au plus ancien)"""
+    with db_connection() as conn:
+        if sensor_id is None:
+            rows = conn.execute("SELECT DISTINCT day FROM daily_rollup ORDER BY day DESC").fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT DISTINCT day FROM daily_rollup WHERE sensor_id = ? ORDER BY day DESC", (sensor_id,)
+            ).fetchall()
+    return [row[0] for row in rows]
+
+
+# Colonnes lisibles dans readings (nom -> expression SQL)
+READING_COLUMNS = {
+    "ts": "ts",
+    "temperature": "temperature",
+    "humidity": "humidity",
+    "pressure": "pressure",
+    "date": "local_date(ts)",
+    "hour": "local_hour(ts)",
+}
+
+
+def read_range(sensor_id, columns=("ts", "temperature", "humidity", "pressure"),
+               start=None, end=None, limit=None, newest_first=True, before=None, after=None):
+    """
+    Lit les mesures d'un capteur entre start (inclus) et end (exclu), ts en ms.
+    before / after : curseur de pagination, seulement les lignes avec ts < before / ts > after.
+    La requete utilise la cle (sensor_id, ts) : seules les lignes de l'intervalle sont lues.
+    Les mois archives (voir archive.py) sont lus dans leurs fichiers et fusionnes.
+    Retourne une liste de tuples dans l'ordre des colonnes demandees.
+    """
+    if isinstance(columns, str):
+        columns = (columns,)
+    lo, hi = _bounds(start, end, before, after)
+    segments = _segments(sensor_id, lo, hi)
+
+    with db_connection() as conn:
+        if len(segments) == 1 and segments[0][2] is None:
+            command, params = _range_query(sensor_id, columns, start, end, limit, newest_first, before, after)
+            return conn.execute(command, params).fetchall()
+
+        # Morceaux dans l'ordre demande, jusqu'a `limit` lignes (une page ne lit que les derniers morceaux)
+        rows = []
+        for seg_lo, seg_hi, month in (reversed(segments) if newest_first else segments):
+            remaining = None if limit is None else limit - len(rows)
+            if remaining == 0:
+                break
+            if month is None:
+                command, params = _range_query(sensor_id, columns, seg_lo, seg_hi, remaining, newest_first)
+                rows += conn.execute(command, params).fetchall()
+            else:
+                rows += _archive_rows(_archived_columns(conn, sensor_id, month, seg_lo, seg_hi), columns,
+                                      remaining, newest_first)
+        return rows
+
+
+def iter_range(sensor_id, columns=("ts", "temperature", "humidity", "pressure"),
+               start=None, end=None, chunk_size=5000):
+    """
+    Comme read_range (du plus ancien au plus recent), mais par paquets de chunk_size lignes
+    lus au fur et a mesure sur le curseur SQLite (ou dans les fichiers des mois archives) :
+    la memoire ne depend pas de la periode.
+    Generateur de listes de tuples. A consommer dans le thread qui l'a cree.
+    """
+    with db_connection() as conn:
+        for seg_lo, seg_hi, month in _segments(sensor_id, start, end):
+            if month is not None:
+                data = _archived_columns(conn, sensor_id, month, seg_lo, seg_hi)
+                for first in range(0, len(data["ts"]), chunk_size):
+                    chunk = {name: values[first:first + chunk_size] for name, values in data.items()}
+                    yield _archive_rows(chunk, columns)
+                continue
+
+            command, params = _range_query(sensor_id, columns, seg_lo, seg_hi, newest_first=False)
+            cursor = conn.execute(command, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+
+def read_columns(sensor_id, metrics=METRICS, start=None, end=None):
+    """
+    Grandeurs d'un capteur pour les calculs (analytics.py), lues en une seule passe :
+    {"ts": int64, grandeur: float32 (NaN = pas de valeur)}, du plus ancien au plus recent.
+    Les mois archives sont des tranches des fichiers en memmap : un seul mois archive est lu sans copie.
+    """
+    names = ("ts", *metrics)
+    parts = []
+    with db_connection() as conn:
+        for seg_lo, seg_hi, month in _segments(sensor_id, start, end):
+            if month is None:
+                command, params = _range_query(sensor_id, names, seg_lo, seg_hi, newest_first=False)
+                data = archive.to_columns(conn.execute(command, params).fetchall(), names)
+            else:
+                data = _archived_columns(conn, sensor_id, month, seg_lo, seg_hi)
+            if len(data["ts"]):
+                parts.append(data)
+
+    if not parts:
+        return archive.to_columns([], names)
+    if len(parts) == 1:
+        return {name: parts[0][name] for name in names}
+    return {name: np.concatenate([part[name] for part in parts]) for name in names}
+
+
+def read_arrays(sensor_id, metric, start=None, end=None):
+    """Serie d'une grandeur : (ts int64, valeurs float32), voir read_columns"""
+    columns = read_columns(sensor_id, (metric,), start, end)
+    return columns["ts"], columns[metric]
+
+
+def _range_query(sensor_id, columns, start=None, end=None, limit=None, newest_first=True, before=None, after=None):
+    """Construit la requete de read_range / iter_range, retourne (commande, parametres)"""
+    if isinstance(columns, str):
+        columns = (columns,)
+    select = ", ".join(READING_COLUMNS[c] for c in columns)
+
+    command = f"SELECT {select} FROM readings WHERE sensor_id = ?"
+    params = [sensor_id]
+    if start is not None:
+        command += " AND ts >= ?"
+        params.append(start)
+    if end is not None:
+        command += " AND ts < ?"
+        params.append(end)
+    if before is not None:
+        command += " AND ts < ?"
+        params.append(before)
+    if after is not None:
+        command += " AND ts > ?"
+        params.append(after)
+    command += " ORDER BY ts DESC" if newest_first else " ORDER BY ts"
+    if limit is not None:
+        command += " LIMIT ?"
+        params.append(limit)
+    return command, params
+
+
+def _bounds(start=None, end=None, before=None, after=None):
+    """Combine l'intervalle et le curseur de pagination en [lo, hi) (None = pas de borne)"""
+    lo, hi = start, end
+    if after is not None:
+        lo = after + 1 if lo is None else max(lo, after + 1)
+    if before is not None:
+        hi = before if hi is None else min(hi, before)
+    return lo, hi
+
+
+def _segments(sensor_id, lo=None, hi=None):
+    """
+    Decoupe [lo, hi) en morceaux consecutifs (debut, fin, mois archive ou None pour la DB).
+    Sans archive pour ce capteur : un seul morceau [lo, hi) lu en DB.
+    """
+    segments = []
+    cursor = lo
+    for month in archive.months(archive_dir(), sensor_id):
+        month_lo, month_hi = month_bounds(month)
+        if (hi is not None and month_lo >= hi) or (lo is not None and month_hi <= lo):
+            continue
+        seg_lo = month_lo if lo is None else max(lo, month_lo)
+        seg_hi = month_hi if hi is None else min(hi, month_hi)
+        if cursor is None or cursor < seg_lo:
+            segments.append((cursor, seg_lo, None))
+        segments.append((seg_lo, seg_hi, month))
+        cursor = seg_hi
+    if not segments or hi is None or cursor < hi:
+        segments.append((cursor, hi, None))
+    return segments
+
+
+def _archived_columns(conn, sensor_id, month, lo, hi):
+    """Colonnes d'un mois archive entre lo et hi, avec les mesures de ce mois encore en DB"""
+    data = archive.slice_columns(archive.load(archive_dir(), sensor_id, month), lo, hi)
+    command, params = _range_query(sensor_id, archive.COLUMNS, lo, hi, newest_first=False)
+    return archive.merge(data, archive.to_columns(conn.execute(command, params).fetchall()))
+
+
+def _archive_rows(data, columns, limit=None, newest_first=False):
+    """Colonnes d'archive -> liste de tuples dans l'ordre des colonnes demandees (comme en DB)"""
+    if newest_first:
+        data = {name: values[::-1] for name, values in data.items()}
+    if limit is not None:
+        data = {name: values[:limit] for name, values in data.items()}
+
+    ts_list = data["ts"].tolist()
+    values = {}
+    for name in columns:
+        if name == "ts":
+            values[name] = ts_list
+        elif name in ("date", "hour"):
+            if "date" not in values:
+                values["date"], values["hour"] = (list(c) for c in zip(*map(ts_to_date_hour, ts_list))) if ts_list else ([], [])
+        else:
+            values[name] = analytics.to_json_list(data[name])
+    return list(zip(*(values[name] for name in columns)))
+
+
+def get_latest_reading(sensor_id):
+    """Retourne la derniere mesure d'un capteur (dict avec ts), ou None"""
+    with db_connection() as conn:
+        row = conn.execute(
+            "SELECT ts, temperature, humidity, pressure FROM readings WHERE sensor_id = ? ORDER BY ts DESC LIMIT 1",
+            (sensor_id,)
+        ).fetchone()
+    if not row:
+        return None
+    return {"sensor_id": sensor_id, "ts": row[0], "temperature": row[1], "humidity": row[2], "pressure": row[3]}
+
+
+# Registre des capteurs en memoire : les tables sensors et esp32_devices sont lues une seule fois,
+# puis relues seulement quand un capteur est ajoute, reassigne ou supprime.
+# Un autre worker qui modifie les capteurs incremente registry_version (triggers) : la version
+# est relue seulement si la DB a change (PRAGMA data_version de la connexion du thread).
+_sensors = None  # (DB_PATH, frozenset des sensor_id, {numero: nom personnalise}, version)
+_sensors_lock = threading.Lock()
+_registry_local = threading.local()  # data_version vu par la connexion de ce thread
+
+
+def _sensor_registry():
+    """Retourne le registre des capteurs (charge depuis la DB au premier appel)"""
+    global _sensors
+    registry = _sensors
+    if registry is not None and registry[0] == DB_PATH and not _registry_outdated(registry):
+        return registry
+
+    with _sensors_lock:
+        # Un autre thread a pu recharger le registre pendant l'attente
+        if _sensors is None or _sensors is registry or _sensors[0] != DB_PATH:
+            with db_connection() as conn:
+                version = conn.execute("SELECT version FROM registry_version").fetchone()[0]
+                rows = conn.execute("SELECT sensor_id FROM sensors").fetchall()
+                names = conn.execute(
+                    "SELECT sensor_number, name FROM esp32_devices WHERE sensor_number IS NOT NULL AND name IS NOT NULL"
+                ).fetchall()
+            _sensors = (DB_PATH, frozenset(row[0] for row in rows),
+                        {str(number): name for number, name in names if name}, version)
+        return _sensors
+
+
+def _registry_outdated(registry):
+    """Indique si un autre processus a modifie les capteurs depuis le chargement du registre"""
     conn = get_db_connection()
-    cursor = conn.cursor()
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if getattr(_registry_local, "conn", None) is conn and _registry_local.data_version == data_version:
+        return False
+    _registry_local.conn = conn
+    _registry_local.data_version = data_version
+    return conn.execute("SELECT version FROM registry_version").fetchone()[0] != registry[3]
+
+
+def _known_sensor_ids():
+    """Retourne l'ensemble des sensor_id connus"""
+    return _sensor_registry()[1]
 
-    # Recuperer toutes les tables qui commencent par 'esp'
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'esp%' ORDER BY name")
-    tables = cursor.fetchall()
 
-    conn.close()
+def get_sensor_names():
+    """Retourne les noms personnalises des capteurs {"1": "Salon", ...} (depuis le registre)"""
+    return dict(_sensor_registry()[2])
 
-    # Extraire les noms de tables (exclure esp32_devices qui est une table de config)
-    sensors = [table[0] for table in tables if table[0] != 'esp32_devices']
-    return sensors
+
+def invalidate_sensors():
+    """Vide le registre des capteurs, il sera relu depuis la DB au prochain appel"""
+    global _sensors
+    with _sensors_lock:
+        _sensors = None
+
+
+def is_known_sensor(sensor_id):
+    """
+    Indique si un capteur existe.
+    Un capteur inconnu relit la table sensors une fois (il a pu etre ajoute par un autre worker).
+    """
+    if sensor_id in _known_sensor_ids():
+        return True
+    invalidate_sensors()
+    return sensor_id in _known_sensor_ids()
+
+
+def register_sensor(sensor_id):
+    """Ajoute un capteur a la liste des capteurs s'il n'y est pas encore"""
+    if sensor_id in _known_sensor_ids():
+        return
+    with db_connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO sensors (sensor_id) VALUES (?)", (sensor_id,))
+    invalidate_sensors()
+
+
+def create_table_if_not_exists(table_name):
+    """
+    Compatibilite : enregistre un nouveau capteur (esp1, esp2, esp3, esp4...).
+    Ses mesures vont dans la table readings, il n'y a plus de table par capteur.
+    """
+    sensor_id = sensor_id_of(table_name)
+    if sensor_id is not None:
+        register_sensor(sensor_id)
+
+
+def get_all_sensors():
+    """
+    Retourne la liste de tous les capteurs ("esp1", "esp2", ...) tries par numero.
+    Servie depuis le registre en memoire (pas de requete SQL).
+    """
+    return [f"esp{sensor_id}" for sensor_id in sorted(_known_sensor_ids())]
 
 
 def get_sensor_count():
@@ -136,36 +1111,367 @@ def get_sensor_last_activity(table_name):
     """
     Retourne la date et l'heure de la derniere activite d'un capteur.
     """
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT date, hour FROM `{table_name}` WHERE temperature IS NOT NULL ORDER BY id DESC LIMIT 1")
-        result = cursor.fetchone()
+        with db_connection() as conn:
+            result = conn.execute(
+                "SELECT ts FROM readings WHERE sensor_id = ? AND temperature IS NOT NULL ORDER BY ts DESC LIMIT 1",
+                (sensor_id_of(table_name),)
+            ).fetchone()
         if result:
-            return {"date": result[0], "hour": result[1]}
+            date, hour = ts_to_date_hour(result[0])
+            return {"date": date, "hour": hour}
         return None
     except Exception as e:
         print(f"Erreur lecture activite {table_name}: {e}")
         return None
-    finally:
-        conn.close()
 
 
-def get_all_sensors_status():
+###############################################################################
+#################___MIGRATION DES ANCIENNES TABLES espX___#####################
+###############################################################################
+
+def get_legacy_tables():
+    """Retourne les anciennes tables espX qui n'ont pas encore ete migrees"""
+    with db_connection() as conn:
+        names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'esp%'")]
+        done = set()
+        if "legacy_migration" in [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]:
+            done = {row[0] for row in conn.execute("SELECT table_name FROM legacy_migration WHERE done = 1")}
+    tables = [name for name in names if SENSOR_TABLE.match(name) and name not in done]
+    return sorted(tables, key=sensor_id_of)
+
+
+def migrate_legacy_table(table_name, chunk_size=5000):
     """
-    Retourne le statut de tous les capteurs avec leur derniere activite.
+    Copie une ancienne table espX dans readings, par morceaux de chunk_size lignes.
+    Chaque morceau est une transaction courte : le serveur peut tourner pendant la migration.
+    La progression est gardee dans legacy_migration, on peut relancer apres une interruption.
+    Retourne le nombre de lignes copiees.
     """
-    sensors = get_all_sensors()
-    status_list = []
+    sensor_id = sensor_id_of(table_name)
+    with db_connection() as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS legacy_migration (
+            table_name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            last_ts INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0
+        );
+        """)
+        conn.execute("INSERT OR IGNORE INTO legacy_migration (table_name) VALUES (?)", (table_name,))
+        conn.execute("INSERT OR IGNORE INTO sensors (sensor_id) VALUES (?)", (sensor_id,))
+        last_id, previous_ts = conn.execute(
+            "SELECT last_id, last_ts FROM legacy_migration WHERE table_name = ?", (table_name,)
+        ).fetchone()
+    invalidate_sensors()
 
-    for sensor in sensors:
-        last_activity = get_sensor_last_activity(sensor)
-        status_list.append({
-            "name": sensor,
-            "last_activity": last_activity
-        })
+    copied = 0
+    while True:
+        with db_connection() as conn:
+            rows = conn.execute(
+                f"SELECT id, temperature, humidity, pressure, date, hour FROM `{table_name}` WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, chunk_size)
+            ).fetchall()
+            if not rows:
+                conn.execute("UPDATE legacy_migration SET done = 1 WHERE table_name = ?", (table_name,))
+                break
+
+            readings = []
+            for row_id, temperature, humidity, pressure, date, hour in rows:
+                try:
+                    ts = date_hour_to_ts(date, hour)
+                    # Heure en double au passage a l'heure d'hiver : prendre la 2e occurrence
+                    if ts < previous_ts:
+                        ts = max(ts, date_hour_to_ts(date, hour, fold=1))
+                except (TypeError, ValueError):
+                    print(f"Ligne {row_id} de {table_name} ignoree (date invalide: {date} {hour})")
+                    continue
+                # Deux lignes dans la meme seconde : decaler d'une milliseconde
+                ts = max(ts, previous_ts + 1)
+                previous_ts = ts
+                readings.append({"sensor_id": sensor_id, "ts": ts, "temperature": temperature,
+                                 "humidity": humidity, "pressure": pressure})
+
+            add_readings(readings)
+            last_id = rows[-1][0]
+            conn.execute(
+                "UPDATE legacy_migration SET last_id = ?, last_ts = ? WHERE table_name = ?",
+                (last_id, previous_ts, table_name)
+            )
+        copied += len(readings)
 
-    return status_list
+    return copied
+
+
+def get_migrated_legacy_tables():
+    """Retourne les anciennes tables espX deja copiees dans readings et encore presentes"""
+    with db_connection() as conn:
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if "legacy_migration" not in names:
+            return []
+        done = [row[0] for row in conn.execute("SELECT table_name FROM legacy_migration WHERE done = 1")]
+    return [table for table in done if table in names]
+
+
+def drop_legacy_table(table_name):
+    """Supprime une ancienne table espX deja migree"""
+    if sensor_id_of(table_name) is None:
+        return
+    with db_connection() as conn:
+        conn.execute(f"DROP TABLE IF EXISTS `{table_name}`")
+
+
+###############################################################################
+###################___ARCHIVE DES MOIS TERMINES (.npy)___######################
+###############################################################################
+
+def archive_dir():
+    """Dossier des mois archives (ARCHIVE_DIR, sinon weather_data_archive/ a cote de la DB)"""
+    return ARCHIVE_DIR or os.path.splitext(DB_PATH)[0] + "_archive"
+
+
+def month_bounds(month):
+    """Retourne (debut du mois, debut du mois suivant) en ts (ms) pour un mois suisse "AAAA-MM" """
+    year, number = (int(part) for part in month.split("-"))
+    following = f"{year + 1:04d}-01" if number == 12 else f"{year:04d}-{number + 1:02d}"
+    return date_hour_to_ts(f"{month}-01"), date_hour_to_ts(f"{following}-01")
+
+
+def _shift_month(month, count):
+    """Mois "AAAA-MM" decale de count mois"""
+    year, number = (int(part) for part in month.split("-"))
+    index = year * 12 + number - 1 + count
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def archivable_months(sensor_id, keep=2):
+    """
+    Mois termines d'un capteur qui ont encore des mesures en DB, du plus ancien au plus recent.
+    keep : nombre de mois recents gardes en DB (le mois en cours compris).
+    """
+    with db_connection() as conn:
+        first = conn.execute("SELECT MIN(ts) FROM readings WHERE sensor_id = ?", (sensor_id,)).fetchone()[0]
+        if first is None:
+            return []
+        month = ts_to_date_hour(first)[0][:7]
+        limit = _shift_month(ts_to_date_hour(now_ts())[0][:7], -max(keep, 1) + 1)
+
+        months = []
+        while month < limit:
+            lo, hi = month_bounds(month)
+            if conn.execute("SELECT 1 FROM readings WHERE sensor_id = ? AND ts >= ? AND ts < ? LIMIT 1",
+                            (sensor_id, lo, hi)).fetchone():
+                months.append(month)
+            month = _shift_month(month, 1)
+    return months
+
+
+def archive_month(sensor_id, month, chunk_size=5000):
+    """
+    Deplace les mesures d'un mois de la DB vers l'archive (fusionnees avec l'archive existante).
+    Les fichiers sont ecrits avant la suppression des lignes, et seules les lignes lues sont
+    supprimees (une mesure arrivee pendant l'archivage reste en DB). Le resume journalier
+    (daily_rollup) est garde tel quel. Retourne le nombre de lignes deplacees.
+    """
+    lo, hi = month_bounds(month)
+    directory = archive_dir()
+    with db_connection() as conn:
+        command, params = _range_query(sensor_id, archive.COLUMNS, lo, hi, newest_first=False)
+        rows = conn.execute(command, params).fetchall()
+    if not rows:
+        return 0
+
+    data = archive.to_columns(rows)
+    if month in archive.months(directory, sensor_id):
+        existing = {name: np.array(values) for name, values in archive.load(directory, sensor_id, month).items()}
+        data = archive.merge(existing, data)
+    archive.write(directory, sensor_id, month, data)
+
+    stamps = [row[0] for row in rows]
+    for i in range(0, len(stamps), chunk_size):
+        with db_connection() as conn:
+            conn.executemany("DELETE FROM readings WHERE sensor_id = ? AND ts = ?",
+                             [(sensor_id, ts) for ts in stamps[i:i + chunk_size]])
+    return len(rows)
+
+
+###############################################################################
+###################___RETENTION ET COMPACTAGE (retention.py)___################
+###############################################################################
+
+HOUR_MS = 3600 * 1000
+
+
+def read_hourly(sensor_id, metric, start=None, end=None):
+    """
+    Resume horaire d'une grandeur (periodes sans mesures brutes) :
+    (debut de l'heure, somme, nombre, min, max) en tableaux NumPy, du plus ancien au plus recent.
+    """
+    command = "SELECT hour, sum, count, min, max FROM hourly_rollup WHERE sensor_id = ? AND metric = ?"
+    params = [sensor_id, metric]
+    if start is not None:
+        command += " AND hour >= ?"
+        params.append(start)
+    if end is not None:
+        command += " AND hour < ?"
+        params.append(end)
+    with db_connection() as conn:
+        rows = conn.execute(command + " ORDER BY hour", params).fetchall()
+
+    if not rows:
+        return (np.empty(0, dtype=np.int64), *(np.empty(0) for _ in range(4)))
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0].astype(np.int64), data[:, 1], data[:, 2], data[:, 3], data[:, 4]
+
+
+def _hourly_groups(columns):
+    """Colonnes (ts trie + grandeurs, NaN = pas de valeur) -> [(heure, grandeur, min, max, somme, nombre)]"""
+    groups = []
+    hours = columns["ts"] - columns["ts"] % HOUR_MS
+    for metric in METRICS:
+        values = analytics.exact(columns[metric])
+        valid = ~np.isnan(values)
+        if not valid.any():
+            continue
+        metric_hours, values = hours[valid], values[valid]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(metric_hours)) + 1))
+        counts = np.diff(np.concatenate((starts, [len(values)])))
+        groups += zip(metric_hours[starts].tolist(), [metric] * len(starts),
+                      np.minimum.reduceat(values, starts).tolist(), np.maximum.reduceat(values, starts).tolist(),
+                      np.add.reduceat(values, starts).tolist(), counts.tolist())
+    return groups
+
+
+def _update_hourly_rollup(conn, sensor_id, columns):
+    """Ajoute des mesures (colonnes) au resume horaire"""
+    conn.executemany("""
+        INSERT INTO hourly_rollup (sensor_id, hour, metric, min, max, sum, count)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (sensor_id, hour, metric) DO UPDATE SET
+            min = MIN(min, excluded.min),
+            max = MAX(max, excluded.max),
+            sum = sum + excluded.sum,
+            count = count + excluded.count
+    """, [(sensor_id, *group) for group in _hourly_groups(columns)])
+
+
+def compact_readings(sensor_id, cutoff, chunk_size=5000, pause=0.0):
+    """
+    Resume par heure puis supprime les mesures en DB d'un capteur avant cutoff (ts ms),
+    une transaction courte par paquet de chunk_size lignes (pause en secondes entre deux paquets).
+    DELETE ... RETURNING : exactement les lignes supprimees sont resumees, meme si une mesure
+    en retard arrive pendant le compactage. Retourne le nombre de lignes supprimees.
+    """
+    removed = 0
+    while True:
+        with db_connection() as conn:
+            bound = conn.execute(
+                "SELECT ts FROM readings WHERE sensor_id = ? AND ts < ? ORDER BY ts LIMIT 1 OFFSET ?",
+                (sensor_id, cutoff, chunk_size - 1)
+            ).fetchone()
+            limit = min(bound[0] + 1, cutoff) if bound else cutoff
+            rows = conn.execute(
+                "DELETE FROM readings WHERE sensor_id = ? AND ts < ? RETURNING ts, temperature, humidity, pressure",
+                (sensor_id, limit)
+            ).fetchall()
+            if rows:
+                rows.sort()
+                _update_hourly_rollup(conn, sensor_id, archive.to_columns(rows))
+                _touch_sensors(conn, {sensor_id})
+        removed += len(rows)
+        if not bound:
+            return removed
+        if pause:
+            time.sleep(pause)
+
+
+def compact_archive(sensor_id, cutoff):
+    """
+    Resume par heure puis supprime les mois archives d'un capteur termines avant cutoff.
+    Chaque mois est traite dans une transaction d'ecriture (BEGIN IMMEDIATE) : deux workers
+    ne peuvent pas resumer le meme mois. Retourne le nombre de mois supprimes.
+    """
+    directory = archive_dir()
+    removed = 0
+    for month in archive.months(directory, sensor_id):
+        lo, hi = month_bounds(month)
+        if hi > cutoff:
+            break
+        try:
+            with db_connection() as conn:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                if month not in archive.months(directory, sensor_id):
+                    continue
+                # Les mesures du mois encore en DB sont resumees par compact_readings
+                live = [ts for (ts,) in conn.execute(
+                    "SELECT ts FROM readings WHERE sensor_id = ? AND ts >= ? AND ts < ?", (sensor_id, lo, hi))]
+                data = archive.load(directory, sensor_id, month)
+                if live:
+                    keep = ~np.isin(data["ts"], np.array(live, dtype=np.int64))
+                    data = {name: np.asarray(values)[keep] for name, values in data.items()}
+                _update_hourly_rollup(conn, sensor_id, data)
+                _touch_sensors(conn, {sensor_id})
+                # Hors de la liste des mois avant le commit, fichiers supprimes apres
+                archive.detach(directory, sensor_id, month)
+        except BaseException:
+            if month not in archive.months(directory, sensor_id):
+                archive.reattach(directory, sensor_id, month)
+            raise
+        archive.purge(directory, sensor_id, month)
+        removed += 1
+    return removed
+
+
+def expire_hourly(sensor_id, cutoff, chunk_size=5000):
+    """Supprime le resume horaire d'un capteur avant cutoff, par paquets. Retourne le nombre de lignes"""
+    removed = 0
+    while True:
+        with db_connection() as conn:
+            bound = conn.execute(
+                "SELECT hour FROM hourly_rollup WHERE sensor_id = ? AND hour < ? ORDER BY hour LIMIT 1 OFFSET ?",
+                (sensor_id, cutoff, chunk_size - 1)
+            ).fetchone()
+            limit = min(bound[0] + 1, cutoff) if bound else cutoff
+            count = conn.execute("DELETE FROM hourly_rollup WHERE sensor_id = ? AND hour < ?",
+                                 (sensor_id, limit)).rowcount
+            if count:
+                _touch_sensors(conn, {sensor_id})
+        removed += count
+        if not bound:
+            return removed
+
+
+def incremental_vacuum(pages=1000):
+    """
+    Rend au systeme les pages libres de la DB, pages par pages (chaque etape est une
+    transaction courte). Retourne le nombre de pages liberees (0 si auto_vacuum n'est pas
+    INCREMENTAL : python -m app.manage vacuum).
+    """
+    conn = get_db_connection()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    freed = 0
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free:
+        with db_connection() as conn:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if left >= free:
+            break
+        freed += free - left
+        free = left
+    # Reduit le fichier -wal sans attendre les lecteurs
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    return freed
+
+
+def vacuum():
+    """VACUUM complet (bloque la DB) : active auto_vacuum=INCREMENTAL sur une base existante"""
+    conn = get_db_connection()
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
 
 
 # ==================== GESTION DES ESP32 ====================
@@ -179,46 +1485,38 @@ def register_esp32(mac_address, ip_address=None):
     from zoneinfo import ZoneInfo
     now = datetime.now(ZoneInfo("Europe/Zurich")).strftime("%Y-%m-%d %H:%M:%S")
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    # Verifier si l'ESP32 existe deja
-    cursor.execute("SELECT sensor_number FROM esp32_devices WHERE mac_address = ?", (mac_address,))
-    result = cursor.fetchone()
+        # Verifier si l'ESP32 existe deja
+        cursor.execute("SELECT sensor_number FROM esp32_devices WHERE mac_address = ?", (mac_address,))
+        result = cursor.fetchone()
 
-    if result:
-        # Mettre a jour last_seen et IP
-        cursor.execute(
-            "UPDATE esp32_devices SET last_seen = ?, ip_address = ? WHERE mac_address = ?",
-            (now, ip_address, mac_address)
-        )
-        conn.commit()
-        conn.close()
-        return result[0]  # Retourne le sensor_number (peut etre None)
-    else:
-        # Nouvel ESP32, l'ajouter sans numero de capteur
-        cursor.execute(
-            "INSERT INTO esp32_devices (mac_address, ip_address, last_seen) VALUES (?, ?, ?)",
-            (mac_address, ip_address, now)
-        )
-        conn.commit()
-        conn.close()
-        return None  # Pas encore configure
+        if result:
+            # Mettre a jour last_seen et IP
+            cursor.execute(
+                "UPDATE esp32_devices SET last_seen = ?, ip_address = ? WHERE mac_address = ?",
+                (now, ip_address, mac_address)
+            )
+            return result[0]  # Retourne le sensor_number (peut etre None)
+        else:
+            # Nouvel ESP32, l'ajouter sans numero de capteur
+            cursor.execute(
+                "INSERT INTO esp32_devices (mac_address, ip_address, last_seen) VALUES (?, ?, ?)",
+                (mac_address, ip_address, now)
+            )
+            return None  # Pas encore configure
 
 
 def get_esp32_config(mac_address):
     """
     Retourne la configuration d'un ESP32 par son adresse MAC.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT sensor_number, name FROM esp32_devices WHERE mac_address = ?",
-        (mac_address,)
-    )
-    result = cursor.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        result = conn.execute(
+            "SELECT sensor_number, name FROM esp32_devices WHERE mac_address = ?",
+            (mac_address,)
+        ).fetchone()
 
     if result:
         return {"sensor_number": result[0], "name": result[1]}
@@ -229,27 +1527,27 @@ def set_esp32_sensor_number(mac_address, sensor_number, name=None):
     """
     Assigne un numero de capteur a un ESP32.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    if name:
-        cursor.execute(
-            "UPDATE esp32_devices SET sensor_number = ?, name = ? WHERE mac_address = ?",
-            (sensor_number, name, mac_address)
-        )
-    else:
-        cursor.execute(
-            "UPDATE esp32_devices SET sensor_number = ? WHERE mac_address = ?",
-            (sensor_number, mac_address)
-        )
+        if name:
+            cursor.execute(
+                "UPDATE esp32_devices SET sensor_number = ?, name = ? WHERE mac_address = ?",
+                (sensor_number, name, mac_address)
+            )
+        else:
+            cursor.execute(
+                "UPDATE esp32_devices SET sensor_number = ? WHERE mac_address = ?",
+                (sensor_number, mac_address)
+            )
 
-    conn.commit()
-    rows_affected = cursor.rowcount
-    conn.close()
+        rows_affected = cursor.rowcount
 
-    # Creer la table pour ce capteur si elle n'existe pas
+    # Ajouter ce capteur a la liste des capteurs (et relire les noms)
+    if rows_affected > 0:
+        invalidate_sensors()
     if rows_affected > 0 and sensor_number:
-        create_table_if_not_exists(f"esp{sensor_number}")
+        register_sensor(int(sensor_number))
 
     return rows_affected > 0
 
@@ -258,16 +1556,12 @@ def get_all_esp32_devices():
     """
     Retourne la liste de tous les ESP32 enregistres.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT mac_address, sensor_number, name, last_seen, ip_address, created_at
-        FROM esp32_devices
-        ORDER BY sensor_number, created_at
-    """)
-    results = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        results = conn.execute("""
+            SELECT mac_address, sensor_number, name, last_seen, ip_address, created_at
+            FROM esp32_devices
+            ORDER BY sensor_number, created_at
+        """).fetchall()
 
     devices = []
     for row in results:
@@ -286,31 +1580,33 @@ def get_all_esp32_devices():
 def delete_esp32_device(mac_address):
     """
     Supprime un ESP32 de la base de donnees.
-    Supprime aussi la table de donnees du capteur (espX).
+    Supprime aussi les mesures du capteur (espX).
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    # Recuperer le numero du capteur avant suppression
-    cursor.execute("SELECT sensor_number FROM esp32_devices WHERE mac_address = ?", (mac_address,))
-    result = cursor.fetchone()
-    sensor_number = result[0] if result else None
+        # Recuperer le numero du capteur avant suppression
+        cursor.execute("SELECT sensor_number FROM esp32_devices WHERE mac_address = ?", (mac_address,))
+        result = cursor.fetchone()
+        sensor_number = result[0] if result else None
 
-    # Supprimer l'entree de esp32_devices
-    cursor.execute("DELETE FROM esp32_devices WHERE mac_address = ?", (mac_address,))
-    rows_affected = cursor.rowcount
+        # Supprimer l'entree de esp32_devices
+        cursor.execute("DELETE FROM esp32_devices WHERE mac_address = ?", (mac_address,))
+        rows_affected = cursor.rowcount
 
-    # Supprimer aussi la table de donnees si elle existe
-    if sensor_number:
-        table_name = f"esp{sensor_number}"
-        try:
-            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-            print(f"Table {table_name} supprimee")
-        except Exception as e:
-            print(f"Erreur suppression table {table_name}: {e}")
+        # Supprimer aussi les mesures du capteur
+        if sensor_number:
+            cursor.execute("DELETE FROM readings WHERE sensor_id = ?", (sensor_number,))
+            cursor.execute("DELETE FROM daily_rollup WHERE sensor_id = ?", (sensor_number,))
+            cursor.execute("DELETE FROM hourly_rollup WHERE sensor_id = ?", (sensor_number,))
+            cursor.execute("DELETE FROM sensors WHERE sensor_id = ?", (sensor_number,))
+            archive.remove(archive_dir(), sensor_number)
+            # Ancienne table espX si elle n'a pas ete migree
+            cursor.execute(f"DROP TABLE IF EXISTS esp{int(sensor_number)}")
+            print(f"Donnees du capteur esp{sensor_number} supprimees")
 
-    conn.commit()
-    conn.close()
+    if rows_affected > 0:
+        invalidate_sensors()
 
     return rows_affected > 0
 
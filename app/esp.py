@@ -4,62 +4,134 @@
 # Fonction : recevoir les requêtes POST des ESP32 et ajouter les données à la base de données
 
 try:
-    from app.database import add_data, create_table_if_not_exists, get_all_sensors, register_esp32
+    from app.database import register_sensor, get_all_sensors, register_esp32, now_ts, parse_time, insert_readings
+    from app import align, cache, broadcast
 except:
-    from database import add_data, create_table_if_not_exists, get_all_sensors, register_esp32
+    from database import register_sensor, get_all_sensors, register_esp32, now_ts, parse_time, insert_readings
+    import align
+    import cache
+    import broadcast
 
 from flask import request, Blueprint, jsonify
 from werkzeug.exceptions import InternalServerError
 
-from datetime import datetime
-from zoneinfo import ZoneInfo
+import math
+import os
 import re
-import threading
-import time
+import struct
 
-# Fuseau horaire Suisse (Berne)
-TIMEZONE_SUISSE = ZoneInfo("Europe/Zurich")
-
-# Buffer pour stocker les données en attente (clé: table_name, valeur: données + timestamp)
-pending_data = {}
-# Lock pour éviter les conditions de concurrence
-pending_data_lock = threading.Lock()
+# Trame binaire (Content-Type: application/octet-stream), little-endian, 19 octets :
+# version (uint8), numero du capteur (uint16), temperature, humidite, pression (float32, NaN = pas de valeur),
+# instant de la mesure en secondes UTC (uint32, 0 ou avant 2020 = horloge non synchronisee, heure de reception)
+BINARY_MIMETYPE = "application/octet-stream"
+FRAME_VERSION = 1
+FRAME = struct.Struct("<BHfffI")
 
+# Envoi groupe (/request/batch) : nombre maximum de mesures par requete,
+# et avance maximum acceptee sur l'horloge du serveur (ms)
+BATCH_MAX_READINGS = int(os.environ.get('BATCH_MAX_READINGS', 1000))
+BATCH_MAX_FUTURE_MS = 5 * 60 * 1000
+# Instant le plus ancien accepte pour une mesure : 2020-01-01 00:00 UTC (ms)
+MIN_READING_TS = 1577836800000
 
 esp = Blueprint("esp",__name__)
 
-def insert_paired_data(table_name, main_data, other_table):
+def sensor_number(capteur_id):
+    """Retourne le numero du capteur ("ATOM_001" -> 1), ou None si le format est invalide"""
+    match = re.search(r'ATOM_0*(\d+)', capteur_id if isinstance(capteur_id, str) else "")
+    return int(match.group(1)) if match else None
+
+
+def _measure(item, key):
+    """Lit une valeur mesuree : nombre ou null. Leve ValueError sinon."""
+    value = item.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{key} invalide: {value!r}")
+    return float(value)
+
+
+def parse_batch_item(item, default_capteur_id, now):
     """
-    Insère les données du capteur actif et du capteur inactif dans la DB.
+    Valide une mesure de /request/batch et la convertit en ligne de readings.
+    Instant de la mesure : "ts" (ms ou date "AAAA-MM-JJTHH:MM:SS"), ou "age" (secondes avant l'envoi),
+    sinon l'heure de reception. Leve ValueError si la mesure est invalide.
     """
-    result_main = add_data(table_name, value=main_data)
-    
-    result_other = True
-    if other_table:
-        result_other = add_data(other_table, value={
-            "temperature": None,
-            "humidity": None,
-            "pressure": None,
-            "date": main_data["date"],
-            "hour": main_data["hour"]
-        })
-    
-    return result_main and result_other
+    if not isinstance(item, dict):
+        raise ValueError("la mesure doit etre un objet JSON")
+
+    numero = sensor_number(item.get("capteur_id", default_capteur_id))
+    if numero is None:
+        raise ValueError(f"capteur_id invalide: {item.get('capteur_id', default_capteur_id)!r}")
+
+    if item.get("ts") is not None:
+        ts = item["ts"]
+        ts = parse_time(ts) if isinstance(ts, str) else int(_measure(item, "ts"))
+    elif item.get("age") is not None:
+        ts = now - int(_measure(item, "age") * 1000)
+    else:
+        ts = now
+    if ts > now + BATCH_MAX_FUTURE_MS:
+        raise ValueError(f"ts dans le futur: {ts}")
+    if ts < MIN_READING_TS:
+        raise ValueError(f"ts trop ancien (avant 2020-01-01): {ts}")
+
+    reading = {
+        "sensor_id": numero,
+        "ts": ts,
+        "temperature": _measure(item, "temperature"),
+        "humidity": _measure(item, "humidite"),
+        "pressure": _measure(item, "pression")
+    }
+    if reading["temperature"] is None and reading["humidity"] is None and reading["pressure"] is None:
+        raise ValueError("aucune valeur mesuree")
+    return reading
 
 
-def timeout_callback(table_name, main_data, other_table, capteur_id, temperature, humidity, pressure):
+def decode_frames(payload):
     """
-    Appelée après 17 secondes si l'autre capteur n'a pas envoyé ses données.
-    Ajoute les données du capteur actif et une ligne vide pour l'autre.
+    Decoupe un corps binaire en trames de FRAME_FORMAT (une ou plusieurs a la suite).
+    Retourne la liste des tuples (version, capteur, temperature, humidite, pression, ts_s).
+    Leve ValueError si la taille ne correspond pas a un nombre entier de trames.
     """
-    with pending_data_lock:
-        # Vérifier si les données existent toujours (pas encore traitées par l'autre capteur)
-        if table_name in pending_data:
-            print(f"Timeout pour {capteur_id}: ajout des données avec valeurs NULL pour l'autre capteur")
-            insert_paired_data(table_name, main_data, other_table)
-            del pending_data[table_name]
-        else:
-            print(f"Timeout pour {capteur_id}: données déjà traitées par l'autre capteur")
+    if not payload or len(payload) % FRAME.size:
+        raise ValueError(f"taille invalide: {len(payload)} octets (trame de {FRAME.size} octets)")
+    return list(FRAME.iter_unpack(payload))
+
+
+def _frame_value(value, name):
+    """
+    float32 -> float (NaN = pas de valeur). Leve ValueError si infini.
+    Arrondi a la precision du float32 a l'ecriture (database.insert_readings).
+    """
+    if math.isnan(value):
+        return None
+    if not math.isfinite(value):
+        raise ValueError(f"{name} invalide: {value!r}")
+    return value
+
+
+def frame_to_reading(frame, now):
+    """Convertit une trame decodee en ligne de readings. Leve ValueError si la trame est invalide."""
+    version, numero, temperature, humidity, pressure, device_ts = frame
+    if version != FRAME_VERSION:
+        raise ValueError(f"version de trame inconnue: {version}")
+    # Horloge pas encore synchronisee (0, ou secondes depuis le demarrage) : heure de reception
+    ts = device_ts * 1000 if device_ts * 1000 >= MIN_READING_TS else now
+    if ts > now + BATCH_MAX_FUTURE_MS:
+        raise ValueError(f"ts dans le futur: {ts}")
+
+    reading = {
+        "sensor_id": numero,
+        "ts": ts,
+        "temperature": _frame_value(temperature, "temperature"),
+        "humidity": _frame_value(humidity, "humidite"),
+        "pressure": _frame_value(pressure, "pression")
+    }
+    if reading["temperature"] is None and reading["humidity"] is None and reading["pressure"] is None:
+        raise ValueError("aucune valeur mesuree")
+    return reading
 
 
 @esp.route("/", methods=["POST"])
@@ -67,104 +139,170 @@ def esp_request():
     """
     Recoit les donnees d'un capteur ESP32.
     Accepte n'importe quel capteur_id au format ATOM_00X (X = 1, 2, 3, ...)
+    en JSON, ou une trame binaire (Content-Type: application/octet-stream, voir FRAME).
     
-    Synchronisation des capteurs:
-    - Attend 17 secondes pour recevoir les données de l'autre capteur
-    - Si reçu: insère les deux données ensemble
-    - Si timeout: insère sa valeur + NULL pour l'autre avec la même date/heure
+    Synchronisation des capteurs (voir align.py):
+    - La mesure est rangee dans l'intervalle de temps commun a tous les capteurs
+    - L'intervalle est ecrit des que tous les capteurs actifs ont envoye
+    - Sinon il est ecrit apres ALIGN_TIMEOUT secondes, sans ligne vide pour les absents
     """
-    # Lire les données JSON
-    data = request.get_json()
-    if not data:
-        print("Aucune donnée JSON reçue")
-        return "Bad Request", 400
-
-    capteur_id = data.get('capteur_id')
-    temperature = data.get('temperature')
-    humidity = data.get('humidite')
-    pressure = data.get('pression')
-    mac_address = data.get('mac_address')  # Optionnel
-
-    # Utiliser l'heure suisse (Berne)
-    now_suisse = datetime.now(TIMEZONE_SUISSE)
-    date_now = now_suisse.strftime("%Y-%m-%d")
-    hour_now = now_suisse.strftime("%H:%M:%S")
-
-    # Extraire le numero du capteur (ATOM_001 -> 1, ATOM_002 -> 2, etc.)
-    match = re.search(r'ATOM_0*(\d+)', capteur_id)
-    if match:
-        numero = match.group(1)
-        table_name = f"esp{numero}"
+    if request.mimetype == BINARY_MIMETYPE:
+        # Trame binaire (voir decode_frames) : ni JSON ni regex
+        try:
+            frames = decode_frames(request.get_data())
+            if len(frames) != 1:
+                raise ValueError("une seule trame attendue (plusieurs trames : /request/batch)")
+            reading = frame_to_reading(frames[0], now_ts())
+        except ValueError as e:
+            print(f"Trame binaire invalide: {e}")
+            return jsonify({"error": str(e)}), 400
+
+        numero = reading["sensor_id"]
+        capteur_id = f"ATOM_{numero:03d}"
+        ts = reading["ts"]
+        temperature = reading["temperature"]
+        humidity = reading["humidity"]
+        pressure = reading["pressure"]
+        mac_address = None
     else:
-        print(f"Format capteur_id invalide: {capteur_id}")
-        return jsonify({"error": "Format capteur_id invalide"}), 400
+        # Lire les données JSON (un objet, memes regles que /request/batch pour les valeurs)
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data:
+            print("Aucune donnée JSON reçue")
+            return jsonify({"error": "Le corps doit etre un objet JSON"}), 400
 
-    # Creer la table si elle n'existe pas (nouveau capteur)
-    create_table_if_not_exists("esp1")
-    create_table_if_not_exists("esp2")
+        capteur_id = data.get('capteur_id')
+        try:
+            temperature = _measure(data, 'temperature')
+            humidity = _measure(data, 'humidite')
+            pressure = _measure(data, 'pression')
+        except ValueError as e:
+            print(f"Mesure invalide de {capteur_id}: {e}")
+            return jsonify({"error": str(e)}), 400
+        if temperature is None and humidity is None and pressure is None:
+            return jsonify({"error": "aucune valeur mesuree"}), 400
+        mac_address = data.get('mac_address')  # Optionnel
+
+        # Instant de la mesure (ms UTC, affiche en heure suisse)
+        ts = now_ts()
+
+        # Extraire le numero du capteur (ATOM_001 -> 1, ATOM_002 -> 2, etc.)
+        numero = sensor_number(capteur_id)
+        if numero is None:
+            print(f"Format capteur_id invalide: {capteur_id}")
+            return jsonify({"error": "Format capteur_id invalide"}), 400
+
+    table_name = f"esp{numero}"
+
+    # Ajouter le capteur a la liste des capteurs (nouveau capteur)
+    register_sensor(numero)
 
     # Mettre a jour last_seen si mac_address fourni
     if mac_address:
         ip_address = request.remote_addr
         register_esp32(mac_address, ip_address)
 
-    # Déterminer l'autre table
-    if table_name == "esp1":
-        other_table = "esp2"
-    elif table_name == "esp2":
-        other_table = "esp1"
-    else:
-        other_table = None
-
-    # Préparer les données
-    main_data = {
+    bucket, complete = align.add({
+        "sensor_id": numero,
+        "ts": ts,
         "temperature": temperature,
         "humidity": humidity,
-        "pressure": pressure,
-        "date": date_now,
-        "hour": hour_now
-    }
+        "pressure": pressure
+    })
+
+    if complete:
+        print(f"Intervalle {bucket} complet: {capteur_id} (T={temperature}C, H={humidity}%, P={pressure}hPa)")
+        return jsonify({"Serveur local": "Succès appairage", "capteur": table_name, "paired": True,
+                        "ts": ts, "bucket": bucket}), 201
+
+    print(f"Donnees en attente de {capteur_id}: en attente des autres capteurs pendant {align.ALIGN_TIMEOUT:g} secondes")
+    return jsonify({"Serveur local": "En attente", "capteur": table_name, "timeout": int(align.ALIGN_TIMEOUT),
+                    "ts": ts, "bucket": bucket}), 202
+
+
+@esp.route("/batch", methods=["POST"])
+def esp_batch_request():
+    """
+    Recoit plusieurs mesures en une seule requete (mesures gardees par l'ESP32, par ex. apres une coupure Wi-Fi).
+    Corps JSON : une liste de mesures, ou {"capteur_id": ..., "mac_address": ..., "readings": [...]}.
+    Chaque mesure : {"capteur_id", "temperature", "humidite", "pression", "ts" ou "age"}
+    (capteur_id optionnel si donne pour tout le lot).
+    Ou des trames binaires a la suite (Content-Type: application/octet-stream, voir FRAME).
+
+    Les mesures valides sont ecrites en une seule transaction, sans attendre les autres capteurs,
+    avec leur propre ts.
+    Retourne le statut de chaque mesure : "ok" (ecrite), "duplicate" (meme capteur et meme ts
+    deja en DB ou deux fois dans le lot, non ecrite) ou "error".
+    """
+    now = now_ts()
+    if request.mimetype == BINARY_MIMETYPE:
+        # Trames binaires a la suite (voir decode_frames)
+        try:
+            items = decode_frames(request.get_data())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        data = {}
+        parse = lambda frame: frame_to_reading(frame, now)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, list):
+            data = {"readings": data}
+        if not isinstance(data, dict) or not isinstance(data.get("readings"), list):
+            return jsonify({"error": "Liste de mesures attendue"}), 400
+        items = data["readings"]
+        parse = lambda item: parse_batch_item(item, data.get("capteur_id"), now)
+
+    if len(items) > BATCH_MAX_READINGS:
+        return jsonify({"error": f"Trop de mesures (maximum {BATCH_MAX_READINGS})"}), 413
+
+    results = []
+    accepted = []  # (resultat, mesure) des mesures valides
+    for index, item in enumerate(items):
+        try:
+            reading = parse(item)
+        except ValueError as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+            continue
+        results.append({"index": index, "status": "ok", "capteur": f"esp{reading['sensor_id']}", "ts": reading["ts"]})
+        accepted.append((results[-1], reading))
+    readings = [reading for _, reading in accepted]
 
-    with pending_data_lock:
-        # Vérifier si l'autre capteur a des données en attente
-        if other_table and other_table in pending_data:
-            # L'autre capteur a déjà envoyé ses données!
-            other_data = pending_data[other_table]
-            del pending_data[other_table]
-            
-            # Annuler le timeout si encore actif
-            if "timer" in other_data:
-                other_data["timer"].cancel()
-            
-            # Ajouter les données du capteur actif dans sa table
-            result_main = add_data(table_name, value=main_data)
-            
-            # Ajouter les données de l'autre capteur dans sa table (reçues avant)
-            result_other = add_data(other_table, value=other_data["data"])
-            
-            if result_main and result_other:
-                print(f"Donnees appariées: {capteur_id} (T={temperature}C, H={humidity}%, P={pressure}hPa) + {other_data['capteur_id']}")
-                return jsonify({"Serveur local": "Succès appairage", "capteur": table_name, "paired": True}), 201
-            else:
-                return InternalServerError("Erreur lors de l'ajout de données dans la DB")
+    for numero in {r["sensor_id"] for r in readings}:
+        register_sensor(numero)
+
+    if data.get("mac_address"):
+        register_esp32(data["mac_address"], request.remote_addr)
+
+    # Une seule transaction (executemany) pour tout le lot
+    try:
+        inserted = insert_readings(readings) if readings else []
+    except Exception as e:
+        print(f"Erreur lors de l'ajout du lot: {e}")
+        return InternalServerError("Erreur lors de l'ajout de données dans la DB")
+
+    for reading in inserted:
+        cache.update(reading)
+    if inserted:
+        broadcast.notify()
+
+    # Les mesures deja en DB (ou deux fois dans le lot) sont signalees comme doublons
+    remaining = {(r["sensor_id"], r["ts"]) for r in inserted}
+    for result, reading in accepted:
+        key = (reading["sensor_id"], reading["ts"])
+        if key in remaining:
+            remaining.discard(key)
         else:
-            # Mettre en attente les données du capteur actif
-            timer = threading.Timer(
-                17.0,
-                timeout_callback,
-                args=(table_name, main_data, other_table, capteur_id, temperature, humidity, pressure)
-            )
-            timer.daemon = True
-            timer.start()
-            
-            pending_data[table_name] = {
-                "data": main_data,
-                "capteur_id": capteur_id,
-                "timer": timer
-            }
-            
-            print(f"Donnees en attente de {capteur_id}: en attente de l'autre capteur pendant 17 secondes")
-            return jsonify({"Serveur local": "En attente", "capteur": table_name, "timeout": 17}), 202
+            result["status"] = "duplicate"
+
+    count = {status: sum(1 for r in results if r["status"] == status) for status in ("ok", "duplicate", "error")}
+    print(f"Lot recu: {len(items)} mesures, {count['ok']} ajoutees, {count['duplicate']} doublons, {count['error']} erreurs")
+    return jsonify({
+        "received": len(items),
+        "inserted": count["ok"],
+        "duplicates": count["duplicate"],
+        "errors": count["error"],
+        "results": results
+    }), 201 if count["ok"] else 200
 
 
 @esp.route("/sensors", methods=["GET"])
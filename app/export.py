@@ -0,0 +1,88 @@
+# Fonction : export de l'historique complet d'un capteur en CSV ou NDJSON (une mesure JSON par ligne)
+#
+# Les lignes sont lues par paquets sur le curseur SQLite (database.iter_range) et envoyees
+# au fur et a mesure par un generateur : la memoire utilisee est la meme pour un jour
+# ou pour cinq ans, et le debut du fichier part tout de suite.
+
+try:
+    import app.database as db
+except:
+    import database as db
+
+import csv
+import io
+import json
+import os
+import zlib
+
+# Lignes lues par paquet
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 5000))
+# Niveau de compression gzip (1 = rapide, 9 = plus petit)
+EXPORT_GZIP_LEVEL = int(os.environ.get('EXPORT_GZIP_LEVEL', 6))
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson"
+}
+EXPORT_COLUMNS = ("ts", "date", "hour", "temperature", "humidity", "pressure")
+
+
+def export_rows(sensor_id, start=None, end=None):
+    """Generateur de paquets de lignes (ts, date, hour, temperature, humidity, pressure)"""
+    for rows in db.iter_range(sensor_id, ("ts", "temperature", "humidity", "pressure"), start, end,
+                              chunk_size=EXPORT_CHUNK_ROWS):
+        yield [(ts, *db.ts_to_date_hour(ts), temperature, humidity, pressure)
+               for ts, temperature, humidity, pressure in rows]
+
+
+def csv_chunks(chunks):
+    """En-tete CSV puis un bloc de texte par paquet de lignes (valeur absente = champ vide)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(chunks):
+    """Un objet JSON par mesure et par ligne (valeur absente = null)"""
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+
+
+def gzip_chunks(chunks, level=None):
+    """Compresse un flux de texte en gzip au fil de l'eau"""
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+    first = True
+    for text in chunks:
+        data = compressor.compress(text.encode("utf-8"))
+        if first:
+            # Envoyer l'en-tete tout de suite (premier octet sans attendre un bloc complet)
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(sensor_id, fmt, start=None, end=None, gzip=False):
+    """Generateur du fichier exporte (str, ou bytes si gzip)"""
+    if fmt not in FORMATS:
+        raise ValueError(f"format invalide: {fmt} (csv ou ndjson)")
+    chunks = export_rows(sensor_id, start, end)
+    text = csv_chunks(chunks) if fmt == "csv" else ndjson_chunks(chunks)
+    return gzip_chunks(text) if gzip else text
+
+
+def export_filename(sensor_id, fmt, start=None, end=None, gzip=False):
+    """Nom du fichier telecharge : esp1_2026-01-01_2026-01-31.csv(.gz)"""
+    name = f"esp{sensor_id}"
+    if start is not None:
+        name += f"_{db.ts_to_date_hour(start)[0]}"
+    if end is not None:
+        name += f"_{db.ts_to_date_hour(end - 1)[0]}"
+    return f"{name}.{fmt}" + (".gz" if gzip else "")
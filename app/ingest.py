@@ -0,0 +1,141 @@
+# Fonction : file d'ecriture en arriere-plan (write-behind) pour les donnees des ESP32
+#
+# Au lieu d'un INSERT + commit par mesure, les mesures sont mises dans une file
+# bornee en memoire. Un thread d'ecriture les regroupe et les insere par lots,
+# avec un seul commit par lot (des que le lot est plein ou apres un delai).
+
+try:
+    import app.database as db
+    from app import cache, broadcast
+except:
+    import database as db
+    import cache
+    import broadcast
+
+import atexit
+import os
+import queue
+import threading
+import time
+
+# Mode de durabilite :
+#  - "batch" : reponse immediate, ecriture groupee en arriere-plan (defaut)
+#  - "sync"  : chaque mesure est ecrite et commitee avant la reponse au capteur
+INGEST_DURABILITY = os.environ.get('INGEST_DURABILITY', 'batch')
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 200))
+INGEST_FLUSH_INTERVAL = float(os.environ.get('INGEST_FLUSH_INTERVAL', 1.0))  # secondes
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 10000))
+
+_queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+_STOP = object()
+_writer_thread = None
+_writer_lock = threading.Lock()
+
+
+def submit(reading):
+    """
+    Envoie une mesure a ecrire dans readings
+    (dict {"sensor_id", "ts", "temperature", "humidity", "pressure"}).
+    En mode "batch", la mesure part dans la file et sera ecrite au prochain lot.
+    La derniere valeur du capteur est mise a jour tout de suite dans le cache
+    et envoyee aux pages ouvertes (voir broadcast.py).
+    """
+    cache.update(reading)
+    broadcast.notify()
+
+    if INGEST_DURABILITY == "sync":
+        db.add_readings([reading])
+        return True
+
+    _start_writer()
+    try:
+        _queue.put(reading, timeout=1.0)
+    except queue.Full:
+        # File pleine : on ecrit directement (le capteur attend le disque)
+        print("File d'ecriture pleine, ecriture directe")
+        db.add_readings([reading])
+        return True
+    return True
+
+
+def queue_size():
+    """Retourne le nombre de mesures dans la file d'ecriture"""
+    return _queue.qsize()
+
+
+def flush():
+    """Attend que toutes les lignes en file soient ecrites dans la DB"""
+    if _writer_thread is not None:
+        _queue.join()
+
+
+def stop_writer():
+    """Vide la file puis arrete le thread d'ecriture (appele a l'arret du serveur)"""
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None:
+            return
+        _queue.put(_STOP)
+        _writer_thread.join()
+        _writer_thread = None
+
+
+def _start_writer():
+    """Demarre le thread d'ecriture au premier envoi (apres le fork de gunicorn)"""
+    global _writer_thread
+    if _writer_thread is not None:
+        return
+    with _writer_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer_loop, name="ingest-writer", daemon=True)
+            _writer_thread.start()
+
+
+def _writer_loop():
+    """Boucle du thread d'ecriture : regroupe les lignes par lot et les ecrit"""
+    running = True
+    while running:
+        item = _queue.get()
+        if item is _STOP:
+            _queue.task_done()
+            break
+
+        batch = [item]
+        deadline = time.monotonic() + INGEST_FLUSH_INTERVAL
+        # Remplir le lot jusqu'a INGEST_BATCH_SIZE ou jusqu'a la fin du delai
+        while len(batch) < INGEST_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                _queue.task_done()
+                running = False
+                break
+            batch.append(item)
+
+        _write_batch(batch)
+        for _ in batch:
+            _queue.task_done()
+
+    db.close_db_connection()
+
+
+def _write_batch(batch):
+    """Ecrit un lot en une transaction, mesure par mesure si le lot echoue"""
+    try:
+        db.add_readings(batch)
+    except Exception as e:
+        print(f"Erreur ecriture du lot ({len(batch)} mesures): {e}")
+        for reading in batch:
+            try:
+                db.add_readings([reading])
+            except Exception as e:
+                print(f"Mesure perdue pour esp{reading['sensor_id']}: {e}")
+
+
+# Ecrire ce qui reste dans la file a l'arret du processus
+atexit.register(stop_writer)
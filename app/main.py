@@ -3,7 +3,7 @@
 # Modifications : ajout des commentraires
 # Fonction : Lance l'application Flask et enregistre les blueprints
 import os
-from flask import Flask, render_template
+from flask import Flask, Response, render_template, request
 
 app = Flask(__name__)
 
@@ -11,10 +11,18 @@ try:
     from app.api import api
     from app.route import route
     from app.esp import esp
+    from app import align, broadcast, cache, ingest, metrics, retention, scheduler
 except:
     from api import api
     from route import route
     from esp import esp
+    import align
+    import broadcast
+    import cache
+    import ingest
+    import metrics
+    import retention
+    import scheduler
 # Les blueprints serevnt à séparer les différentes parties de l'application
 # Quand on va sur /api/quelquechose, ça va aller dans api.py puis sur les
 # routes définies dans là bas.
@@ -22,6 +30,49 @@ app.register_blueprint(route, url_prefix='/')
 app.register_blueprint(api, url_prefix='/api')
 app.register_blueprint(esp, url_prefix='/request')
 
+# Remplir le cache des dernieres mesures depuis la DB
+cache.warm()
+
+# Compactage des anciennes mesures (retention.py), demarre dans chaque worker
+app.before_request(retention.start)
+
+
+###############################################################################
+#############################___METRIQUES___###################################
+###############################################################################
+
+
+@app.before_request
+def start_timer():
+    """Debut de la mesure de la requete (duree et requetes SQL, voir metrics.py)"""
+    metrics.start_request(request.endpoint)
+
+
+@app.after_request
+def stop_timer(response):
+    """Fin de la mesure avec le code de la reponse"""
+    metrics.end_request(request.method, response.status_code)
+    return response
+
+
+@app.teardown_request
+def stop_timer_on_error(error):
+    """Requete terminee par une exception (after_request n'a pas ete appele)"""
+    metrics.end_request(request.method, 500)
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Metriques du processus au format texte Prometheus"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+# Files d'attente lues au moment de l'export
+metrics.register_gauge("align_pending_readings", "Mesures en attente des autres capteurs", align.pending_count)
+metrics.register_gauge("scheduler_pending_deadlines", "Echeances d'alignement planifiees", scheduler.pending_count)
+metrics.register_gauge("ingest_queue_size", "Mesures dans la file d'ecriture", ingest.queue_size)
+metrics.register_gauge("stream_subscribers", "Pages abonnees a /api/stream", broadcast.subscriber_count)
+
 
 ###############################################################################
 ###########################___LANCE L'APPLICATION___###########################
@@ -0,0 +1,106 @@
+# Fonction : commandes d'administration de la base de donnees
+#
+# Usage (depuis la racine du projet) :
+#   python -m app.manage migrate            copie les anciennes tables espX dans readings
+#   python -m app.manage migrate --drop     ... puis supprime les anciennes tables
+#   python -m app.manage rebuild-rollup     recalcule le resume journalier (daily_rollup)
+#   python -m app.manage archive            deplace les mois termines vers l'archive .npy
+#   python -m app.manage archive --keep 3   ... en gardant les 3 derniers mois en DB
+#   python -m app.manage retention --raw-days 30   resume par heure puis supprime les anciennes mesures
+#   python -m app.manage vacuum             VACUUM complet, active l'auto_vacuum incremental
+
+import argparse
+import os
+
+try:
+    import app.database as db
+    from app import retention
+except:
+    import database as db
+    import retention
+
+
+def migrate(args):
+    """Copie les anciennes tables espX dans la table readings (par morceaux)"""
+    tables = db.get_legacy_tables()
+    if not tables:
+        print("Aucune ancienne table a migrer")
+    for table in tables:
+        print(f"Migration de {table}...")
+        copied = db.migrate_legacy_table(table, chunk_size=args.chunk)
+        print(f"{table} : {copied} lignes copiees dans readings")
+
+    if args.drop:
+        for table in db.get_migrated_legacy_tables():
+            db.drop_legacy_table(table)
+            print(f"Table {table} supprimee")
+
+
+def rebuild_rollup(args):
+    """Recalcule le resume journalier a partir des mesures"""
+    sensors = [args.sensor] if args.sensor else [db.sensor_id_of(name) for name in db.get_all_sensors()]
+    for sensor_id in sensors:
+        days = db.rebuild_daily_rollup(sensor_id)
+        print(f"esp{sensor_id} : {days} jours recalcules")
+
+
+def archive_months(args):
+    """Deplace les mois termines de la DB vers les fichiers d'archive (voir archive.py)"""
+    sensors = [args.sensor] if args.sensor else [db.sensor_id_of(name) for name in db.get_all_sensors()]
+    print(f"Archive : {db.archive_dir()}")
+    for sensor_id in sensors:
+        months = db.archivable_months(sensor_id, keep=args.keep)
+        if not months:
+            print(f"esp{sensor_id} : aucun mois a archiver")
+        for month in months:
+            moved = db.archive_month(sensor_id, month)
+            print(f"esp{sensor_id} {month} : {moved} lignes archivees")
+
+
+def apply_retention(args):
+    """Applique la politique de retention une fois (voir retention.py)"""
+    result = retention.run_once(raw_days=args.raw_days, hourly_days=args.hourly_days)
+    print(f"{result['readings']} mesures et {result['months']} mois archives resumes par heure")
+    print(f"{result['hourly']} lignes du resume horaire expirees, {result['pages']} pages liberees")
+
+
+def vacuum(args):
+    """Reconstruit la DB (bloque les ecritures pendant l'operation)"""
+    before = os.path.getsize(db.DB_PATH)
+    db.vacuum()
+    print(f"{db.DB_PATH} : {before / 1e6:.1f} Mo -> {os.path.getsize(db.DB_PATH) / 1e6:.1f} Mo")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Administration de la station meteo")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("migrate", help="copie les anciennes tables espX dans readings")
+    cmd.add_argument("--chunk", type=int, default=5000, help="lignes copiees par transaction")
+    cmd.add_argument("--drop", action="store_true", help="supprime les anciennes tables une fois copiees")
+    cmd.set_defaults(func=migrate)
+
+    cmd = commands.add_parser("rebuild-rollup", help="recalcule le resume journalier (daily_rollup)")
+    cmd.add_argument("--sensor", type=int, help="numero du capteur (tous par defaut)")
+    cmd.set_defaults(func=rebuild_rollup)
+
+    cmd = commands.add_parser("archive", help="deplace les mois termines vers l'archive .npy")
+    cmd.add_argument("--keep", type=int, default=2, help="mois recents gardes en DB, mois en cours compris")
+    cmd.add_argument("--sensor", type=int, help="numero du capteur (tous par defaut)")
+    cmd.set_defaults(func=archive_months)
+
+    cmd = commands.add_parser("retention", help="resume par heure puis supprime les anciennes mesures")
+    cmd.add_argument("--raw-days", type=int, help=f"jours de mesures brutes gardes (defaut {retention.RETENTION_RAW_DAYS}, 0 = tout)")
+    cmd.add_argument("--hourly-days", type=int,
+                     help=f"jours de resume horaire gardes (defaut {retention.RETENTION_HOURLY_DAYS}, 0 = tout)")
+    cmd.set_defaults(func=apply_retention)
+
+    cmd = commands.add_parser("vacuum", help="VACUUM complet, active l'auto_vacuum incremental")
+    cmd.set_defaults(func=vacuum)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
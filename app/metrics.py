@@ -0,0 +1,176 @@
+# Fonction : metriques du serveur au format texte Prometheus (GET /metrics)
+#
+# - requetes HTTP : nombre par endpoint, methode et code, duree par endpoint (histogramme)
+# - requetes SQL par endpoint : nombre, lignes lues ou modifiees, temps passe, et par requete
+#   HTTP le nombre de requetes SQL et leur duree totale (histogrammes). Un endpoint qui fait
+#   des dizaines de requetes SQL par appel (N+1) se voit dans sql_queries_per_request.
+# - connexions SQLite ouvertes
+# - files d'attente (mesures a aligner, echeances, file d'ecriture, pages abonnees),
+#   lues au moment de l'export (voir register_gauge, branche dans main.py)
+# Les requetes SQL sont comptees par la connexion (database.MeteredConnection). Hors requete
+# HTTP (thread d'ecriture, retention...), l'endpoint est le nom du thread.
+# Chaque processus (worker gunicorn) a ses propres compteurs.
+
+import os
+import threading
+import time
+
+# METRICS_ENABLED=0 : connexions SQLite sans comptage et requetes HTTP non mesurees
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+_requests = {}          # (endpoint, methode, code) -> nombre
+_request_seconds = {}   # endpoint -> Histogram
+_sql = {}               # endpoint -> [requetes, lignes, secondes]
+_sql_queries = {}       # endpoint -> Histogram (requetes SQL par requete HTTP)
+_sql_seconds = {}       # endpoint -> Histogram (temps SQL par requete HTTP)
+_connections = [0]
+_gauges = []            # (nom, aide, fonction)
+_lock = threading.Lock()
+_local = threading.local()  # requete HTTP en cours dans ce thread
+
+
+class Histogram:
+    """Histogramme cumulatif (compteurs par borne, somme et nombre d'observations)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Ajoute une observation (appele avec _lock)"""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        """Lignes Prometheus : name_bucket (cumule), name_sum, name_count"""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound:g}"}} {total}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+def register_gauge(name, help_text, provider):
+    """Ajoute une valeur lue a chaque export : provider() retourne un nombre"""
+    _gauges.append((name, help_text, provider))
+
+
+def start_request(endpoint):
+    """Debut d'une requete HTTP dans ce thread (endpoint Flask, None si aucune route)"""
+    if not METRICS_ENABLED:
+        return
+    _local.endpoint = endpoint or "none"
+    _local.start = time.perf_counter()
+    _local.queries = 0
+    _local.sql_seconds = 0.0
+
+
+def end_request(method, status):
+    """Fin de la requete HTTP en cours (sans effet si deja terminee)"""
+    start = getattr(_local, "start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    endpoint = _local.endpoint
+    _local.start = None
+    _local.endpoint = None
+    with _lock:
+        key = (endpoint, method, status)
+        _requests[key] = _requests.get(key, 0) + 1
+        _histogram(_request_seconds, endpoint, DURATION_BUCKETS).observe(elapsed)
+        _histogram(_sql_queries, endpoint, QUERY_COUNT_BUCKETS).observe(_local.queries)
+        _histogram(_sql_seconds, endpoint, DURATION_BUCKETS).observe(_local.sql_seconds)
+
+
+def current_endpoint():
+    """Endpoint de la requete HTTP en cours dans ce thread, sinon nom du thread"""
+    return getattr(_local, "endpoint", None) or threading.current_thread().name
+
+
+def record_sql(elapsed, rows, queries=0):
+    """Compte une requete SQL (queries=1) ou une lecture de lignes, pour l'endpoint en cours"""
+    endpoint = getattr(_local, "endpoint", None)
+    if endpoint is None:
+        endpoint = threading.current_thread().name
+    else:
+        _local.queries += queries
+        _local.sql_seconds += elapsed
+    with _lock:
+        stats = _sql.get(endpoint)
+        if stats is None:
+            stats = _sql[endpoint] = [0, 0, 0.0]
+        stats[0] += queries
+        stats[1] += rows
+        stats[2] += elapsed
+
+
+def record_connection():
+    """Compte une connexion SQLite ouverte"""
+    with _lock:
+        _connections[0] += 1
+
+
+def render():
+    """Toutes les metriques au format texte Prometheus"""
+    lines = []
+
+    def header(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    with _lock:
+        header("http_requests_total", "counter", "Requetes HTTP par endpoint, methode et code")
+        for (endpoint, method, status), count in sorted(_requests.items(), key=str):
+            lines.append(f'http_requests_total{{endpoint="{_escape(endpoint)}",method="{method}",status="{status}"}} {count}')
+        for name, histograms, help_text in (
+            ("http_request_duration_seconds", _request_seconds, "Duree des requetes HTTP"),
+            ("sql_queries_per_request", _sql_queries, "Requetes SQL par requete HTTP"),
+            ("sql_seconds_per_request", _sql_seconds, "Temps SQL par requete HTTP (secondes)")
+        ):
+            header(name, "histogram", help_text)
+            for endpoint, histogram in sorted(histograms.items()):
+                lines.extend(histogram.lines(name, f'endpoint="{_escape(endpoint)}"'))
+        for i, (name, help_text) in enumerate((
+            ("sql_queries_total", "Requetes SQL par endpoint (ou thread)"),
+            ("sql_rows_total", "Lignes lues ou modifiees par endpoint (ou thread)"),
+            ("sql_seconds_total", "Temps passe dans SQLite par endpoint (ou thread)")
+        )):
+            header(name, "counter", help_text)
+            for endpoint, stats in sorted(_sql.items()):
+                value = f"{stats[i]:.6f}" if i == 2 else stats[i]
+                lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {value}')
+        header("sqlite_connections_opened_total", "counter", "Connexions SQLite ouvertes")
+        lines.append(f"sqlite_connections_opened_total {_connections[0]}")
+
+    for name, help_text, provider in _gauges:
+        header(name, "gauge", help_text)
+        try:
+            lines.append(f"{name} {provider()}")
+        except Exception as e:
+            print(f"Erreur metrique {name} : {e}")
+    return "\n".join(lines) + "\n"
+
+
+def _histogram(histograms, endpoint, buckets):
+    """Histogramme d'un endpoint, cree a la premiere observation (appele avec _lock)"""
+    histogram = histograms.get(endpoint)
+    if histogram is None:
+        histogram = histograms[endpoint] = Histogram(buckets)
+    return histogram
+
+
+def _escape(value):
+    """Valeur de label Prometheus : \\, " et retour a la ligne echappes"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
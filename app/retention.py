@@ -0,0 +1,95 @@
+# Fonction : politique de retention des mesures et compactage en arriere-plan
+#
+# Trois niveaux de detail, chacun avec sa duree de conservation (0 = pour toujours) :
+#  - mesures brutes (table readings et mois archives) : RETENTION_RAW_DAYS jours,
+#    puis resumees par heure (hourly_rollup) et supprimees
+#  - resume horaire (hourly_rollup) : RETENTION_HOURLY_DAYS jours
+#  - resume journalier (daily_rollup) : garde pour toujours
+# Le compactage tourne dans un thread toutes les RETENTION_INTERVAL secondes, par
+# transactions courtes de RETENTION_CHUNK_ROWS lignes (les lecteurs et la file
+# d'ecriture ne sont jamais bloques longtemps), puis rend les pages liberees au
+# systeme avec PRAGMA incremental_vacuum.
+# Par defaut les mesures brutes sont gardees : RETENTION_RAW_DAYS=30 pour activer.
+
+try:
+    import app.database as db
+    from app import cache
+except:
+    import database as db
+    import cache
+
+import os
+import threading
+import time
+
+RETENTION_RAW_DAYS = int(os.environ.get('RETENTION_RAW_DAYS', 0))
+RETENTION_HOURLY_DAYS = int(os.environ.get('RETENTION_HOURLY_DAYS', 730))
+RETENTION_INTERVAL = float(os.environ.get('RETENTION_INTERVAL', 3600))  # secondes
+RETENTION_CHUNK_ROWS = int(os.environ.get('RETENTION_CHUNK_ROWS', 5000))
+RETENTION_PAUSE = float(os.environ.get('RETENTION_PAUSE', 0.05))  # secondes entre deux paquets
+RETENTION_VACUUM_PAGES = int(os.environ.get('RETENTION_VACUUM_PAGES', 1000))
+
+_thread = None
+_pid = None
+_lock = threading.Lock()
+
+
+def cutoff(days, now=None):
+    """Debut du jour (heure suisse) a partir duquel les donnees sont gardees, None si pas de limite"""
+    if not days:
+        return None
+    limit = (db.now_ts() if now is None else now) - days * 86400 * 1000
+    # Jours entiers : un jour est resume par heure en entier (voir rebuild_daily_rollup)
+    return db.day_bounds(db.ts_to_date_hour(limit)[0])[0]
+
+
+def run_once(raw_days=None, hourly_days=None, now=None):
+    """
+    Applique la politique de retention a tous les capteurs.
+    Retourne {"readings": lignes compactees, "months": mois archives compactes,
+    "hourly": heures expirees, "pages": pages rendues au systeme}.
+    """
+    raw_cutoff = cutoff(RETENTION_RAW_DAYS if raw_days is None else raw_days, now)
+    hourly_cutoff = cutoff(RETENTION_HOURLY_DAYS if hourly_days is None else hourly_days, now)
+    result = {"readings": 0, "months": 0, "hourly": 0, "pages": 0}
+
+    for sensor_id in (db.sensor_id_of(name) for name in db.get_all_sensors()):
+        if raw_cutoff is not None:
+            result["months"] += db.compact_archive(sensor_id, raw_cutoff)
+            result["readings"] += db.compact_readings(sensor_id, raw_cutoff, RETENTION_CHUNK_ROWS, RETENTION_PAUSE)
+        if hourly_cutoff is not None:
+            result["hourly"] += db.expire_hourly(sensor_id, hourly_cutoff, RETENTION_CHUNK_ROWS)
+
+    if result["readings"] or result["months"] or result["hourly"]:
+        result["pages"] = db.incremental_vacuum(RETENTION_VACUUM_PAGES)
+        # La derniere mesure d'un capteur muet depuis longtemps a pu etre supprimee
+        cache.warm()
+    return result
+
+
+def start():
+    """Demarre le thread de retention (une fois par processus, apres le fork de gunicorn)"""
+    global _thread, _pid
+    if not RETENTION_RAW_DAYS and not RETENTION_HOURLY_DAYS:
+        return
+    if _thread is not None and _pid == os.getpid():
+        return
+    with _lock:
+        if _thread is not None and _pid == os.getpid():
+            return
+        _pid = os.getpid()
+        _thread = threading.Thread(target=_loop, name="retention", daemon=True)
+        _thread.start()
+
+
+def _loop():
+    """Applique la retention toutes les RETENTION_INTERVAL secondes"""
+    while True:
+        try:
+            result = run_once()
+            if any(result.values()):
+                print(f"Retention : {result['readings']} mesures et {result['months']} mois archives resumes par heure, "
+                      f"{result['hourly']} heures expirees, {result['pages']} pages liberees")
+        except Exception as e:
+            print(f"Erreur retention : {e}")
+        time.sleep(RETENTION_INTERVAL)
@@ -10,54 +10,27 @@ route = Blueprint("route",__name__)
 ####################___PARTIE API : DAILY SUMMARY___############################
 ###############################################################################
 
-import sqlite3 #pour lire la bd
-import os
-
-"""
-    Cette fonction retourne le chemin ABSOLU vers la base de données.
-    Le fichier route.py est dans le dossier /app,
-    donc on remonte d’un niveau pour atteindre la racine du projet.
-    """
-def get_db_path():
-    # Remonte de app/ vers la racine du projet
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    return os.path.join(base_dir, "weather_data.db")
+try:
+    import app.database as db
+except:
+    import database as db
 
 
 @route.route("/daily_summary")
 def daily_summary():
-    sensor_id = request.args.get("sensor_id", "1")
+    sensor_id = request.args.get("sensor_id", 1, type=int)
     limit = int(request.args.get("limit", "999"))
 
-    table = f"esp{sensor_id}"  # esp1, esp2
-
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-
-    query = f"""
-    SELECT date,
-           MAX(temperature) AS tmax, MIN(temperature) AS tmin,
-           MAX(humidity)    AS hmax, MIN(humidity)    AS hmin,
-           MAX(pressure)    AS pmax, MIN(pressure)    AS pmin
-    FROM {table}
-    GROUP BY date
-    ORDER BY date DESC
-    LIMIT ?
-    """
-
-    cur.execute(query, (limit,))
-    rows = cur.fetchall()
-    conn.close()
-
-    result = []
-    for r in rows:
-        result.append({
-            "date": r["date"],
-            "temperature": {"max": r["tmax"], "min": r["tmin"]},
-            "humidity": {"max": r["hmax"], "min": r["hmin"]},
-            "pressure": {"max": r["pmax"], "min": r["pmin"]},
-        })
+    # Intervalle optionnel ?from=...&to=... (ou ?date=AAAA-MM-JJ), bornes en ts (ms)
+    try:
+        start, end = db.time_range(
+            date=request.args.get("date"), start=request.args.get("from"), end=request.args.get("to")
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Parametre de date invalide: {e}"}), 400
+
+    # Min/max par jour lus dans le resume journalier (daily_rollup), pas dans les mesures
+    result = db.read_daily_summary(sensor_id, start, end, limit)
 
     return jsonify(result)
 
@@ -0,0 +1,97 @@
+# Fonction : planificateur d'echeances unique pour l'alignement des capteurs (voir align.py)
+#
+# Remplace un threading.Timer (donc un thread) par intervalle en attente.
+# Toutes les echeances sont gardees dans un tas (heapq) trie par date limite,
+# surveillees par un seul thread. Les echeances depassees sont traitees par lot.
+
+import heapq
+import itertools
+import threading
+import time
+
+_heap = []          # (date limite, numero, cle) trie par date limite
+_entries = {}       # cle -> (numero, donnees) de l'echeance active
+_counter = itertools.count()
+_cond = threading.Condition()
+_handler = None
+_thread = None
+
+
+def set_handler(handler):
+    """
+    Definit la fonction appelee avec la liste des echeances depassees :
+    handler([(cle, donnees), ...])
+    """
+    global _handler
+    _handler = handler
+
+
+def schedule(key, delay, payload=None):
+    """
+    Planifie une echeance dans `delay` secondes pour une cle (O(log n)).
+    Une echeance deja planifiee pour la meme cle est remplacee.
+    """
+    with _cond:
+        _start_thread()
+        seq = next(_counter)
+        _entries[key] = (seq, payload)
+        heapq.heappush(_heap, (time.monotonic() + delay, seq, key))
+        _compact()
+        _cond.notify()
+
+
+def cancel(key):
+    """
+    Annule l'echeance d'une cle (O(1), l'entree du tas est ignoree plus tard).
+    Retourne les donnees de l'echeance ou None si elle n'existait pas.
+    """
+    with _cond:
+        entry = _entries.pop(key, None)
+    return entry[1] if entry else None
+
+
+def pending_count():
+    """Retourne le nombre d'echeances en attente"""
+    with _cond:
+        return len(_entries)
+
+
+def _compact():
+    """Reconstruit le tas quand il contient trop d'entrees annulees"""
+    global _heap
+    if len(_heap) > 2 * len(_entries) + 64:
+        _heap = [item for item in _heap if _entries.get(item[2], (None,))[0] == item[1]]
+        heapq.heapify(_heap)
+
+
+def _start_thread():
+    """Demarre le thread du planificateur (une seule fois par processus)"""
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_run, name="pairing-scheduler", daemon=True)
+        _thread.start()
+
+
+def _run():
+    """Boucle du planificateur : attend la prochaine echeance puis traite le lot"""
+    while True:
+        with _cond:
+            expired = []
+            while not expired:
+                now = time.monotonic()
+                # Sortir du tas toutes les echeances depassees
+                while _heap and _heap[0][0] <= now:
+                    deadline, seq, key = heapq.heappop(_heap)
+                    entry = _entries.get(key)
+                    if entry and entry[0] == seq:
+                        del _entries[key]
+                        expired.append((key, entry[1]))
+                if not expired:
+                    _cond.wait(_heap[0][0] - now if _heap else None)
+
+        # Le traitement se fait hors du verrou (il peut replanifier)
+        try:
+            if _handler:
+                _handler(expired)
+        except Exception as e:
+            print(f"Erreur traitement des echeances: {e}")
@@ -170,8 +170,86 @@ function refreshDevices() {
     loadDevices();
 }
 
-// Charger les appareils au demarrage
+/**
+ * Echappe le texte avant de l'inserer dans le HTML (SQL, parametres)
+ */
+function escapeHtml(text) {
+    return String(text)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;');
+}
+
+/**
+ * Charge le journal des requetes SQL lentes (/api/slow_queries)
+ */
+async function loadSlowQueries() {
+    const container = document.getElementById('slow-queries-container');
+    const info = document.getElementById('slow-queries-info');
+
+    try {
+        const response = await fetch('/api/slow_queries?limit=50');
+        const data = await response.json();
+
+        info.textContent = data.threshold_ms
+            ? `Requetes de plus de ${data.threshold_ms} ms (SCAN = table parcourue en entier, index manquant ?)`
+            : 'Journal desactive (SLOW_QUERY_MS=0)';
+
+        if (!data.queries.length) {
+            container.innerHTML = '<p class="hint">Aucune requete lente</p>';
+            return;
+        }
+
+        container.innerHTML = `
+            <table class="history-table">
+                <thead>
+                    <tr><th>Heure</th><th>ms</th><th>Endpoint</th><th>Lignes</th><th>Requete et plan</th></tr>
+                </thead>
+                <tbody>
+                    ${data.queries.map(query => `
+                        <tr>
+                            <td>${escapeHtml(query.time)}</td>
+                            <td>${query.ms}</td>
+                            <td>${escapeHtml(query.endpoint)}</td>
+                            <td>${query.rows}</td>
+                            <td class="slow-query">
+                                ${query.scan ? '<span class="slow-query-scan">SCAN</span>' : ''}
+                                <code>${escapeHtml(query.sql)}</code>
+                                <code>${escapeHtml(query.params)}</code>
+                                <pre>${escapeHtml(query.plan.join('\n'))}</pre>
+                            </td>
+                        </tr>
+                    `).join('')}
+                </tbody>
+            </table>
+        `;
+    } catch (error) {
+        console.error('Erreur chargement requetes lentes:', error);
+        container.innerHTML = `
+            <div class="error-message">
+                <p>Erreur de connexion au serveur</p>
+            </div>
+        `;
+    }
+}
+
+/**
+ * Vide le journal des requetes lentes
+ */
+async function clearSlowQueries() {
+    try {
+        await fetch('/api/slow_queries', { method: 'DELETE' });
+        loadSlowQueries();
+    } catch (error) {
+        console.error('Erreur suppression requetes lentes:', error);
+    }
+}
+
+// Charger les appareils et les requetes lentes au demarrage
 loadDevices();
+loadSlowQueries();
 
 // Actualiser toutes les 30 secondes
 setInterval(loadDevices, 30000);
+setInterval(loadSlowQueries, 30000);
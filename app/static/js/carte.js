@@ -1,6 +1,36 @@
 console.log("carte.js chargé");
 
 
+// Jour affiché pour chaque capteur ({date, temperature: {min, max}, ...}), mis à jour par le flux
+const shownDay = {};
+
+// Mettre à jour les éléments HTML d'un capteur
+function showSummary(sensorId) {
+    const day = shownDay[sensorId];
+    document.getElementById(`date${sensorId}`).textContent = day.date;
+    document.getElementById(`temp-max${sensorId}`).textContent = day.temperature.max !== null ? day.temperature.max : "—";
+    document.getElementById(`temp-min${sensorId}`).textContent = day.temperature.min !== null ? day.temperature.min : "—";
+    document.getElementById(`hum-max${sensorId}`).textContent = day.humidity.max !== null ? day.humidity.max : "—";
+    document.getElementById(`hum-min${sensorId}`).textContent = day.humidity.min !== null ? day.humidity.min : "—";
+    document.getElementById(`press-max${sensorId}`).textContent = day.pressure.max !== null ? day.pressure.max : "—";
+    document.getElementById(`press-min${sensorId}`).textContent = day.pressure.min !== null ? day.pressure.min : "—";
+}
+
+// Ajoute une mesure du flux au jour affiché (min/max), sans relire le résumé
+function addToSummary(sensorId, reading) {
+    const day = shownDay[sensorId];
+    for (const metric of ["temperature", "humidity", "pressure"]) {
+        const value = reading[metric];
+        if (value === null || value === undefined) continue;
+        const { min, max } = day[metric];
+        day[metric] = {
+            min: min === null ? value : Math.min(min, value),
+            max: max === null ? value : Math.max(max, value)
+        };
+    }
+    showSummary(sensorId);
+}
+
 // Fonction pour récupérer les données résumées d'un capteur
 function fetchSummary(sensorId, dateFilter = "today") {
     fetch(`/daily_summary?sensor_id=${sensorId}&limit=999&date=${dateFilter}`)
@@ -16,16 +46,8 @@ function fetchSummary(sensorId, dateFilter = "today") {
                 return;
             }
 
-            const day = data[0];
-
-            // Mettre à jour les éléments HTML
-            document.getElementById(`date${sensorId}`).textContent = day.date;
-            document.getElementById(`temp-max${sensorId}`).textContent = day.temperature.max !== null ? day.temperature.max : "—";
-            document.getElementById(`temp-min${sensorId}`).textContent = day.temperature.min !== null ? day.temperature.min : "—";
-            document.getElementById(`hum-max${sensorId}`).textContent = day.humidity.max !== null ? day.humidity.max : "—";
-            document.getElementById(`hum-min${sensorId}`).textContent = day.humidity.min !== null ? day.humidity.min : "—";
-            document.getElementById(`press-max${sensorId}`).textContent = day.pressure.max !== null ? day.pressure.max : "—";
-            document.getElementById(`press-min${sensorId}`).textContent = day.pressure.min !== null ? day.pressure.min : "—";
+            shownDay[sensorId] = data[0];
+            showSummary(sensorId);
         })
         .catch(err => {
             console.error(`Erreur lors de la récupération des données du capteur ${sensorId} :`, err);
@@ -48,5 +70,21 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 
-setInterval(() => fetchSummary("1",date_selected = date_selected), 20000);
-setInterval(() => fetchSummary("2",date_selected = date_selected), 20000);
\ No newline at end of file
+// Nouvelle mesure (voir stream.js) : seuls les capteurs affichés sont mis à jour
+onStreamEvent('reading', (reading) => {
+    const selected = typeof date_selected !== "undefined" ? date_selected : "today";
+    if (!reading) {
+        // Actualisation périodique (pas de flux)
+        fetchSummary("1", selected);
+        fetchSummary("2", selected);
+        return;
+    }
+    const sensorId = String(reading.number);
+    if (!["1", "2"].includes(sensorId)) return;
+    if (shownDay[sensorId] && shownDay[sensorId].date === reading.date) {
+        addToSummary(sensorId, reading);
+    } else if (selected === "today") {
+        // Premier jour affiché ou nouveau jour : le résumé est relu
+        fetchSummary(sensorId, selected);
+    }
+});
\ No newline at end of file
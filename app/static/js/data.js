@@ -48,12 +48,11 @@ function createSensorCard(sensorNum, status = 'offline', statusText = 'Inconnu',
 }
 
 /**
- * Charge la liste des capteurs avec leur statut
+ * Charge la liste des capteurs avec leur statut et leurs dernieres valeurs (une seule requete)
  */
 async function loadSensors() {
     try {
-        // Utiliser la nouvelle API de statut
-        const response = await fetch('/api/sensors/status');
+        const response = await fetch('/api/dashboard');
         const data = await response.json();
 
         // Vider le conteneur
@@ -76,8 +75,8 @@ async function loadSensors() {
             `;
         }
 
-        // Mettre a jour les donnees
-        updateData();
+        // Afficher les donnees
+        data.sensors.forEach(sensor => showValues(sensor.number, sensor));
 
     } catch (error) {
         console.error('Erreur chargement capteurs:', error);
@@ -104,65 +103,64 @@ async function loadSensors() {
 }
 
 /**
- * Met a jour uniquement le statut des capteurs (sans recharger les cartes)
+ * Affiche les valeurs d'un capteur dans sa carte
  */
-async function updateSensorStatus() {
-    try {
-        const response = await fetch('/api/sensors/status');
-        const data = await response.json();
+function showValues(sensorNum, values) {
+    // Temperature
+    const tempEl = document.getElementById(`temperature${sensorNum}`);
+    if (tempEl) {
+        tempEl.textContent = values.temperature !== null
+            ? `${values.temperature.toFixed(1)} °C`
+            : '-- °C';
+    }
 
-        data.sensors.forEach(sensor => {
-            const dot = document.getElementById(`status-dot-${sensor.number}`);
-            const text = document.getElementById(`status-text-${sensor.number}`);
+    // Pression
+    const pressEl = document.getElementById(`pressure${sensorNum}`);
+    if (pressEl) {
+        pressEl.textContent = values.pressure !== null
+            ? `${values.pressure.toFixed(1)} hPa`
+            : '-- hPa';
+    }
 
-            if (dot) {
-                dot.className = `status-dot ${sensor.status}`;
-            }
-            if (text) {
-                text.textContent = sensor.status_text;
-            }
-        });
-    } catch (error) {
-        console.error('Erreur mise a jour statut:', error);
+    // Humidite
+    const humEl = document.getElementById(`humidity${sensorNum}`);
+    if (humEl) {
+        humEl.textContent = values.humidity !== null
+            ? `${values.humidity.toFixed(1)} %`
+            : '-- %';
     }
 }
 
 /**
- * Met a jour les donnees de tous les capteurs (nouvelle API)
+ * Affiche le statut des capteurs (recharge les cartes si un nouveau capteur apparait)
+ */
+function showStatus(data) {
+    for (const sensor of data.sensors) {
+        const dot = document.getElementById(`status-dot-${sensor.number}`);
+        const text = document.getElementById(`status-text-${sensor.number}`);
+
+        if (!dot) {
+            loadSensors();
+            return;
+        }
+        dot.className = `status-dot ${sensor.status}`;
+        if (text) {
+            text.textContent = sensor.status_text;
+        }
+    }
+}
+
+/**
+ * Met a jour les donnees et le statut de tous les capteurs (sans flux /api/stream)
+ * Le navigateur renvoie l'ETag : si rien n'a change, le serveur repond 304 sans donnees.
  */
 async function updateData() {
     try {
-        const response = await fetch('/api/all/latest');
+        const response = await fetch('/api/dashboard');
         const data = await response.json();
 
-        // Mettre a jour chaque capteur
-        for (const [sensor, values] of Object.entries(data)) {
-            const sensorNum = sensor.replace('esp', '');
-
-            // Temperature
-            const tempEl = document.getElementById(`temperature${sensorNum}`);
-            if (tempEl) {
-                tempEl.textContent = values.temperature !== null
-                    ? `${values.temperature.toFixed(1)} °C`
-                    : '-- °C';
-            }
-
-            // Pression
-            const pressEl = document.getElementById(`pressure${sensorNum}`);
-            if (pressEl) {
-                pressEl.textContent = values.pressure !== null
-                    ? `${values.pressure.toFixed(1)} hPa`
-                    : '-- hPa';
-            }
-
-            // Humidite
-            const humEl = document.getElementById(`humidity${sensorNum}`);
-            if (humEl) {
-                humEl.textContent = values.humidity !== null
-                    ? `${values.humidity.toFixed(1)} %`
-                    : '-- %';
-            }
-        }
+        showStatus(data);
+        data.sensors.forEach(sensor => showValues(sensor.number, sensor));
     } catch (error) {
         console.error('Erreur mise a jour:', error);
         // Fallback vers l'ancienne API
@@ -222,11 +220,19 @@ function updateDataLegacy() {
 // Charger les capteurs au demarrage
 loadSensors();
 
-// Recharger la liste des capteurs toutes les 60 secondes (pour detecter nouveaux capteurs)
-setInterval(loadSensors, 60000);
-
-// Mettre a jour les donnees toutes les 20 secondes
-setInterval(updateData, 20000);
+// Mises a jour poussees par le serveur (voir stream.js) au lieu d'interroger l'API
+onStreamEvent('reading', (reading) => {
+    if (!reading) {
+        updateData();
+        return;
+    }
+    if (!document.getElementById(`sensor${reading.number}`)) {
+        loadSensors();
+        return;
+    }
+    showValues(reading.number, reading);
+});
 
-// Mettre a jour le statut toutes les 30 secondes
-setInterval(updateSensorStatus, 30000);
+onStreamEvent('status', (status) => {
+    if (status) showStatus(status);
+}, { fallbackMs: 0 });
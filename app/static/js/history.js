@@ -3,7 +3,82 @@ let limit_selected = 50; // valeur par défaut
 
 // Fonction pour récupérer le résumé des données
 
-// Fonction pour charger les données depuis l'API Flask
+// Curseur de la page suivante (plus ancienne) pour chaque capteur
+const nextBeforeId = {};
+// Pages plus anciennes affichées : pas de rechargement automatique (on perdrait la position)
+const scrolledBack = {};
+
+// Ligne du tableau pour une mesure (ts : id de la mesure, curseur de pagination)
+function makeRow(ts, date, hour, tVal, humidity, pressure) {
+    const row = document.createElement('tr');
+    row.dataset.ts = ts;
+
+    row.innerHTML = `
+        <td>${date !== undefined ? date : '—'}</td>
+        <td>${hour !== undefined ? hour : '—'}</td>
+        <td class="temp-cell">
+            ${tVal !== undefined ? tVal + ' °C' : '—'}
+        </td>
+        <td>${humidity !== undefined ? humidity + ' %' : '—'}</td>
+        <td>${pressure !== undefined ? pressure + ' hPa' : '—'}</td>
+    `;
+
+    const tempCell = row.querySelector('.temp-cell');
+    if (tVal !== undefined && tVal !== null && !isNaN(tVal)) {
+        const tempNum = Number(tVal);
+        if (tempNum >= 22) {
+            tempCell.style.color = 'red';
+            tempCell.style.fontWeight = 'bold';
+        } else {
+            tempCell.style.color = '';
+            tempCell.style.fontWeight = '';
+        }
+    }
+    return row;
+}
+
+// Bouton "Older" visible seulement s'il reste des lignes plus anciennes
+function setNextBeforeId(sensorId, beforeId) {
+    nextBeforeId[sensorId] = beforeId;
+    const moreBtn = document.getElementById(`more${sensorId}`);
+    if (moreBtn) moreBtn.style.display = beforeId ? '' : 'none';
+}
+
+// Fonction pour ajouter des lignes au tableau (du plus récent au plus ancien)
+function appendRows(sensorId, data) {
+    const { date, hour, temperature, humidity, pressure } = data;
+    if (!date || !hour || !temperature || !humidity || !pressure) {
+        throw new Error('Données incomplètes reçues');
+    }
+
+    const tbody = document.getElementById(`history${sensorId}-body`);
+
+    for (let i = date.length - 1; i >= 0; i--) {
+        tbody.appendChild(makeRow(data.id[i], date[i], hour[i], temperature[i], humidity[i], pressure[i]));
+    }
+    setNextBeforeId(sensorId, data.next_before_id);
+}
+
+// Ajoute en haut du tableau une mesure reçue par le flux, sans relire la page
+function prependReading(sensorId, reading) {
+    const tbody = document.getElementById(`history${sensorId}-body`);
+    const newest = tbody.querySelector('tr[data-ts]');
+    if (newest && Number(newest.dataset.ts) >= reading.ts) return;
+
+    // Ligne "Erreur" ou tableau vide : première ligne de la page
+    if (!newest) tbody.innerHTML = '';
+    tbody.prepend(makeRow(reading.ts, reading.date, reading.hour,
+                          reading.temperature, reading.humidity, reading.pressure));
+
+    // La page garde `limit` lignes : la plus ancienne passe à la page suivante
+    const rows = tbody.querySelectorAll('tr[data-ts]');
+    if (rows.length > limit_selected) {
+        rows[rows.length - 1].remove();
+        setNextBeforeId(sensorId, Number(rows[rows.length - 2].dataset.ts));
+    }
+}
+
+// Fonction pour charger les données depuis l'API Flask (première page)
 async function loadHistory(sensorId, dateFilter = "today",limit=50) {
     try {
         const url = `/api/history${sensorId}?date=${dateFilter}&limit=${limit}`;
@@ -11,48 +86,9 @@ async function loadHistory(sensorId, dateFilter = "today",limit=50) {
         if (!response.ok) throw new Error('Erreur du serveur');
         
         const data = await response.json();
-        
-        const { date, hour, temperature, humidity, pressure } = data;
-        if (!date || !hour || !temperature || !humidity || !pressure) {
-            throw new Error('Données incomplètes reçues');
-        }
-        
-        const maxLength = Math.max(date.length, hour.length, temperature.length, humidity.length, pressure.length);
-        const tbody = document.getElementById(`history${sensorId}-body`);
-        tbody.innerHTML = '';
-        
-        
-        
-        for (let i = maxLength - 1; i >= 0; i--) {
-            const row = document.createElement('tr');
-            
-            const tVal = temperature[i];
-            
-            row.innerHTML = `
-        <td>${date[i] !== undefined ? date[i] : '—'}</td>
-        <td>${hour[i] !== undefined ? hour[i] : '—'}</td>
-        <td class="temp-cell">
-            ${tVal !== undefined ? tVal + ' °C' : '—'}
-        </td>
-        <td>${humidity[i] !== undefined ? humidity[i] + ' %' : '—'}</td>
-        <td>${pressure[i] !== undefined ? pressure[i] + ' hPa' : '—'}</td>
-    `;
-            
-            const tempCell = row.querySelector('.temp-cell');
-            if (tVal !== undefined && tVal !== null && !isNaN(tVal)) {
-                const tempNum = Number(tVal);
-                if (tempNum >= 22) {
-                    tempCell.style.color = 'red';
-                    tempCell.style.fontWeight = 'bold';
-                } else {
-                    tempCell.style.color = '';
-                    tempCell.style.fontWeight = '';
-                }
-            }
-            
-            tbody.appendChild(row);
-        }
-        
+        document.getElementById(`history${sensorId}-body`).innerHTML = '';
+        scrolledBack[sensorId] = false;
+        appendRows(sensorId, data);
         
     } catch (error) {
         console.error('Erreur lors du chargement de l’historique :', error);
@@ -60,6 +96,26 @@ async function loadHistory(sensorId, dateFilter = "today",limit=50) {
     }
 }
 
+// Fonction pour charger la page plus ancienne (curseur before_id, coût constant)
+async function loadOlder(sensorId) {
+    if (!nextBeforeId[sensorId]) return;
+    try {
+        const url = `/api/history${sensorId}?date=${date_selected}&limit=${limit_selected}&before_id=${nextBeforeId[sensorId]}`;
+        const response = await fetch(url);
+        if (!response.ok) throw new Error('Erreur du serveur');
+
+        scrolledBack[sensorId] = true;
+        appendRows(sensorId, await response.json());
+    } catch (error) {
+        console.error('Erreur lors du chargement de l’historique :', error);
+    }
+}
+
+for (const sensorId of ["1", "2"]) {
+    const moreBtn = document.getElementById(`more${sensorId}`);
+    if (moreBtn) moreBtn.addEventListener("click", () => loadOlder(sensorId));
+}
+
 
 // Fonction pour charger les dates uniques depuis l'API
 async function loadDates() {
@@ -118,9 +174,18 @@ document.addEventListener('DOMContentLoaded', () => {
     refresh_date();
 });
 
-// Actualiser toutes les 20 secondes
-setInterval(() => loadHistory("1",date_selected = date_selected,limit=limit_selected), 20000);
-setInterval(() => loadHistory("2",date_selected = date_selected,limit=limit_selected), 20000);
+// Nouvelle mesure (voir stream.js) : ajoutée au tableau de son capteur s'il affiche ce jour
+onStreamEvent('reading', (reading) => {
+    if (!reading) {
+        // Actualisation périodique (pas de flux)
+        if (!scrolledBack["1"]) loadHistory("1",date_selected = date_selected,limit=limit_selected);
+        if (!scrolledBack["2"]) loadHistory("2",date_selected = date_selected,limit=limit_selected);
+        return;
+    }
+    const sensorId = String(reading.number);
+    if (!["1", "2"].includes(sensorId) || scrolledBack[sensorId]) return;
+    if (date_selected === "today" || date_selected === reading.date) prependReading(sensorId, reading);
+});
 
 // petit script inutile pour rendre le bouton swag
 document.querySelectorAll('input[type=button]').forEach(button => {
@@ -2,9 +2,52 @@ let temperatureChart = null;
 let pressureChart = null;
 let humidityChart = null;
 
+// Couleurs des capteurs : Sensor 1, Sensor 2, puis les capteurs ajoutes
+const SENSOR_COLORS = [
+    'rgba(0, 162, 255, 1)', 'rgba(245, 24, 72, 1)', 'rgba(46, 204, 113, 1)',
+    'rgba(255, 159, 28, 1)', 'rgba(155, 89, 182, 1)', 'rgba(52, 73, 94, 1)'
+];
+
+// Capteurs affiches dans les graphiques (numeros en texte, comme "number" du flux)
+let shownSensors = new Set(["1", "2"]);
+
+// Une serie par capteur (data1, data2, data3, ...), alignees sur les memes heures
+function sensorDatasets(json, bar = false) {
+    const sensors = json.sensors || [1, 2];
+    shownSensors = new Set(sensors.map(String));
+    return sensors.map((number, i) => {
+        const color = SENSOR_COLORS[i % SENSOR_COLORS.length];
+        const dataset = { label: `Sensor ${number}`, data: json[`data${number}`] || [] };
+        if (bar) {
+            dataset.backgroundColor = color;
+        } else {
+            dataset.borderColor = color;
+            dataset.tension = 0.1;
+        }
+        return dataset;
+    });
+}
+
+// Met a jour un graphique (ajoute les capteurs apparus depuis le chargement)
+function updateChart(chart, json, bar = false) {
+    const datasets = sensorDatasets(json, bar);
+    chart.data.labels = json.hours;
+    datasets.forEach((dataset, i) => {
+        if (chart.data.datasets[i]) {
+            chart.data.datasets[i].label = dataset.label;
+            chart.data.datasets[i].data = dataset.data;
+        } else {
+            chart.data.datasets.push(dataset);
+        }
+    });
+    chart.data.datasets.length = datasets.length;
+    chart.update();
+}
+
 
 async function loadStatictical(data_type, dateFilter = "today",limit=20) {
-    const url = `/api/statistical?type=${data_type}&date=${dateFilter}&limit=${limit}`;
+    // points : le serveur reduit la serie si la periode contient trop de mesures
+    const url = `/api/statistical?type=${data_type}&date=${dateFilter}&limit=${limit}&points=300`;
     const response = await fetch(url);
     const data = await response.json();
     console.log(data)
@@ -16,8 +59,6 @@ async function loadStatictical(data_type, dateFilter = "today",limit=20) {
 async function fetchTemperatureData(date_selected = "today",limit=20) {
     const json_temp = await loadStatictical("temperature", dateFilter = date_selected,limit=limit);
     let labels = json_temp.hours;
-    let datas1 = json_temp.data1;
-    let datas2 = json_temp.data2;
 
     const temperature = document.getElementById('temperature');
 
@@ -25,20 +66,7 @@ async function fetchTemperatureData(date_selected = "today",limit=20) {
         type: 'line',
         data: {
             labels: labels,
-            datasets: [
-                {
-                    label: 'Sensor 1',
-                    data: datas1,
-                    borderColor: 'rgba(0, 162, 255, 1)',
-                    tension: 0.1
-                },
-                {
-                    label: 'Sensor 2',
-                    data: datas2,
-                    borderColor: 'rgba(245, 24, 72, 1)',
-                    tension: 0.1
-                }
-            ]
+            datasets: sensorDatasets(json_temp)
         },
         options: {
             responsive: true,
@@ -86,8 +114,6 @@ async function fetchTemperatureData(date_selected = "today",limit=20) {
 async function fetchPressureData(date_selected = "today",limit=20) {
     const json_temp = await loadStatictical("pressure", dateFilter = date_selected,limit=limit);
     let labels = json_temp.hours;
-    let datas1 = json_temp.data1;
-    let datas2 = json_temp.data2;
 
     const pressure = document.getElementById('pressure');
 
@@ -95,20 +121,7 @@ async function fetchPressureData(date_selected = "today",limit=20) {
         type: 'line',
         data: {
             labels: labels,
-            datasets: [
-                {
-                    label: 'Sensor 1',
-                    data: datas1,
-                    borderColor: 'rgba(0, 162, 255, 1)',
-                    tension: 0.1,
-                },
-                {
-                    label: 'Sensor 2',
-                    data: datas2,
-                    borderColor: 'rgba(245, 24, 72, 1)',
-                    tension: 0.1
-                }
-            ]
+            datasets: sensorDatasets(json_temp)
         },
         options: {
             responsive: true,
@@ -155,8 +168,6 @@ async function fetchPressureData(date_selected = "today",limit=20) {
 async function fetchHumidityData(date_selected = "today",limit=20) {
     const json_temp = await loadStatictical("humidity", dateFilter = date_selected,limit=limit);
     let labels = json_temp.hours;
-    let datas1 = json_temp.data1;
-    let datas2 = json_temp.data2;
 
     const humidity = document.getElementById('humidity');
 
@@ -164,18 +175,7 @@ async function fetchHumidityData(date_selected = "today",limit=20) {
     type: 'bar',
     data: {
         labels: labels,
-        datasets: [
-            {
-                label: 'Sensor 1',
-                data: datas1,
-                backgroundColor: 'rgba(0, 162, 255, 1)'
-            },
-            {
-                label: 'Sensor 2',
-                data: datas2,
-                backgroundColor: 'rgba(245, 24, 72, 1)'
-            }
-        ]
+        datasets: sensorDatasets(json_temp, true)
     },
     options: {
     responsive: true,
@@ -248,35 +248,17 @@ async function loadDates() {
 
 async function updateTemperature(date_selected="today",limit=20) {
     const json_temp = await loadStatictical("temperature", dateFilter = date_selected,limit=limit);
-    let labels = json_temp.hours;
-    let datas1 = json_temp.data1;
-    let datas2 = json_temp.data2;
-    temperatureChart.data.labels = labels;
-    temperatureChart.data.datasets[0].data = datas1;
-    temperatureChart.data.datasets[1].data = datas2;
-    temperatureChart.update();
+    updateChart(temperatureChart, json_temp);
 }
 
 async function updatePressure(date_selected="today",limit=20) {
     const json_pres = await loadStatictical("pressure", dateFilter = date_selected,limit=limit);
-    let labels = json_pres.hours;
-    let datas1 = json_pres.data1;
-    let datas2 = json_pres.data2;
-    pressureChart.data.labels = labels;
-    pressureChart.data.datasets[0].data = datas1;
-    pressureChart.data.datasets[1].data = datas2;
-    pressureChart.update();
+    updateChart(pressureChart, json_pres);
 }
 
 async function updateHumidity(date_selected="today",limit=20) {
     const json_humi = await loadStatictical("humidity", dateFilter = date_selected,limit=limit);
-    let label = json_humi.hours;
-    let datas1 = json_humi.data1;
-    let datas2 = json_humi.data2;
-    humidityChart.data.labels = label;
-    humidityChart.data.datasets[0].data = datas1;
-    humidityChart.data.datasets[1].data = datas2;
-    humidityChart.update();
+    updateChart(humidityChart, json_humi, true);
 }
 
 let date_selected = "today";
@@ -323,6 +305,14 @@ document.querySelectorAll('input[type=button]').forEach(button => {
     });
 });
 
-setInterval(() => updateTemperature(date_selected = date_selected,limit=limit_selected), 20000);
-setInterval(() => updatePressure(date_selected = date_selected,limit=limit_selected), 20000);
-setInterval(() => updateHumidity(date_selected = date_selected,limit=limit_selected), 20000);
\ No newline at end of file
+// Actualiser quand une nouvelle mesure d'un capteur affiche arrive (voir stream.js),
+// sauf si un autre jour est affiche
+onStreamEvent('reading', () => {
+    updateTemperature(date_selected = date_selected,limit=limit_selected);
+    updatePressure(date_selected = date_selected,limit=limit_selected);
+    updateHumidity(date_selected = date_selected,limit=limit_selected);
+}, {
+    debounceMs: 1000,
+    filter: (reading) => shownSensors.has(String(reading.number))
+        && (date_selected === "today" || date_selected === reading.date)
+});
\ No newline at end of file
@@ -0,0 +1,55 @@
+/**
+ * Station Meteo - Flux temps reel
+ *
+ * Une seule connexion /api/stream (Server-Sent Events) par page,
+ * partagee par les autres scripts. Le serveur envoie :
+ *  - "reading" : nouvelle mesure d'un capteur
+ *  - "status"  : statut des capteurs (meme format que /api/sensors/status)
+ * Si le navigateur ne supporte pas EventSource, ou si le serveur refuse la connexion
+ * (503 : trop de pages ouvertes), on revient a l'actualisation periodique.
+ */
+
+const stationStream = window.EventSource ? new EventSource('/api/stream') : null;
+
+// Actualisations periodiques a demarrer si le flux est refuse : [callback, fallbackMs]
+const streamFallbacks = [];
+let streamFallbackStarted = false;
+
+if (stationStream) {
+    stationStream.addEventListener('error', () => {
+        // CLOSED : reponse autre que 200 (503), le navigateur ne se reconnecte pas
+        if (stationStream.readyState !== EventSource.CLOSED || streamFallbackStarted) return;
+        streamFallbackStarted = true;
+        streamFallbacks.forEach(([callback, fallbackMs]) => {
+            callback(null);
+            setInterval(() => callback(null), fallbackMs);
+        });
+    });
+}
+
+/**
+ * Appelle callback(donnees) a chaque evenement du type donne.
+ * debounceMs : regroupe les evenements proches (ex: les 2 capteurs apparies) en un seul appel.
+ * fallbackMs : intervalle d'actualisation si EventSource n'est pas disponible ou si le flux est refuse (0 = aucune).
+ * filter : filter(donnees) -> false pour ignorer un evenement (avant le regroupement).
+ */
+function onStreamEvent(type, callback, { debounceMs = 0, fallbackMs = 20000, filter = null } = {}) {
+    if (!stationStream) {
+        if (fallbackMs) setInterval(() => callback(null), fallbackMs);
+        return;
+    }
+
+    if (fallbackMs) streamFallbacks.push([callback, fallbackMs]);
+
+    let timer = null;
+    stationStream.addEventListener(type, (event) => {
+        const data = JSON.parse(event.data);
+        if (filter && !filter(data)) return;
+        if (!debounceMs) {
+            callback(data);
+            return;
+        }
+        clearTimeout(timer);
+        timer = setTimeout(() => callback(data), debounceMs);
+    });
+}
@@ -0,0 +1,468 @@
+# Fonction : banc de charge d'une flotte d'ESP32 et de navigateurs, avec une reference sauvegardee
+#
+# Simule N capteurs qui envoient POST /request/ (trame ATOM_00X) a chaque intervalle, decales
+# dans l'intervalle comme de vrais ESP32 (l'alignement attend les autres capteurs pendant
+# ALIGN_TIMEOUT, 17 s sur 20 s en vrai : meme rapport ici), et M navigateurs qui rejouent
+# les requetes des pages (data.js, history.js, statistical.js) avec If-None-Match.
+# Le temps est accelere : --interval secondes au lieu de 20 s.
+#
+# Cibles :
+#   --target testclient   application Flask dans ce processus (app.main:app, client de test)
+#   --target gunicorn     gunicorn demarre sur un port local (gthread)
+#   --target url --url    serveur deja demarre (sa DB n'est pas mesuree)
+#
+# Affiche le debit, la latence p50/p95/p99 par endpoint et la croissance de la DB.
+# --save FICHIER enregistre le resultat comme reference, --compare FICHIER compare a une reference
+# (code de sortie 1 si un p95 ou le debit se degrade de plus de --tolerance %, ecarts de p95
+# inferieurs a --min-delta ms ignores).
+#
+# Usage (depuis la racine du projet) :
+#   python3 scripts/bench_fleet.py --target testclient --save scripts/bench_baseline.json
+#   python3 scripts/bench_fleet.py --target gunicorn --compare scripts/bench_baseline.json
+
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Requetes de chaque page : au chargement, puis a chaque nouvelle mesure (evenement "reading")
+PAGES = {
+    "dashboard": {
+        "weight": 2,
+        "load": ["/api/sensors", "/api/dashboard"],
+        # Sans EventSource : actualisation de /api/dashboard (avec ETag)
+        "refresh": ["/api/dashboard"]
+    },
+    "history": {
+        "weight": 1,
+        "load": ["/api/dates_unique", "/api/history1?date=today&limit=50", "/api/history2?date=today&limit=50"],
+        # history.js ajoute la mesure du flux au tableau, sans requete
+        "refresh": []
+    },
+    "statistical": {
+        "weight": 1,
+        "load": ["/api/dates_unique"] + [f"/api/statistical?type={t}&date=today&limit=20&points=300"
+                                         for t in ("temperature", "pressure", "humidity")],
+        "refresh": [f"/api/statistical?type={t}&date=today&limit=20&points=300"
+                    for t in ("temperature", "pressure", "humidity")]
+    }
+}
+
+
+class Stats:
+    """Latences par endpoint (thread-safe)"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, status, elapsed):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status is None or status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def endpoint_name(method, path):
+    """Nom d'un endpoint dans le rapport : methode + chemin, avec le type pour /api/statistical"""
+    base, _, query = path.partition("?")
+    if base == "/api/statistical":
+        base += "?" + query.split("&")[0]
+    return f"{method} {base}"
+
+
+def percentile(values, p):
+    """Percentile simple (valeurs triees)"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+###############################################################################
+#############################___CLIENTS HTTP___################################
+###############################################################################
+
+
+class TestClient:
+    """Requetes vers l'application Flask de ce processus"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers or {})
+        return response.status_code, response.headers.get("ETag")
+
+
+class HttpClient:
+    """Requetes HTTP (connexion gardee ouverte comme un navigateur, nouvelle connexion si keep_alive=False)"""
+
+    def __init__(self, url, keep_alive=True, timeout=30):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        if not self.keep_alive:
+            headers["Connection"] = "close"
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=data, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                if not self.keep_alive or response.getheader("Connection", "").lower() == "close":
+                    self.conn.close()
+                    self.conn = None
+                return response.status, response.getheader("ETag")
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    return None, None
+
+
+###############################################################################
+##########################___CAPTEURS ET NAVIGATEURS___########################
+###############################################################################
+
+
+def sensor_loop(number, client, args, stats, stop, counters):
+    """Un ESP32 : une mesure par intervalle, toujours au meme decalage dans l'intervalle"""
+    rng = random.Random(number)
+    # Horloges des ESP32 decalees : envois repartis sur la premiere moitie de l'intervalle
+    offset = (number - 1) / max(args.sensors, 1) * args.interval * 0.5
+    cycle = int(time.time() // args.interval) + 1
+    while not stop.is_set():
+        wait = cycle * args.interval + offset - time.time()
+        if wait > 0 and stop.wait(wait):
+            return
+        cycle += 1
+        if rng.random() < args.drop:
+            # Capteur absent pour cet intervalle : les autres sont ecrits a l'echeance
+            continue
+        body = {
+            "capteur_id": f"ATOM_{number:03d}",
+            "temperature": round(20 + rng.uniform(-5, 5), 2),
+            "humidite": round(50 + rng.uniform(-10, 10), 2),
+            "pression": round(1013 + rng.uniform(-5, 5), 2)
+        }
+        start = time.perf_counter()
+        status, _ = client.request("POST", "/request/", body)
+        stats.add("POST /request/", status, time.perf_counter() - start)
+        with stats.lock:
+            counters["sent"] += 1
+            if status == 201:
+                counters["paired"] += 1
+
+
+def browser_loop(number, client, args, stats, stop):
+    """Un navigateur : charge sa page puis l'actualise a chaque intervalle (comme sur un evenement "reading")"""
+    rng = random.Random(1000 + number)
+    names = [name for name, page in PAGES.items() for _ in range(page["weight"])]
+    page = PAGES[names[number % len(names)]]
+    etags = {}
+
+    def get(path):
+        headers = {"If-None-Match": etags[path]} if path in etags else None
+        start = time.perf_counter()
+        status, etag = client.request("GET", path, headers=headers)
+        stats.add(endpoint_name("GET", path), status, time.perf_counter() - start)
+        if etag:
+            etags[path] = etag
+
+    # Pages ouvertes a des instants differents
+    if stop.wait(rng.uniform(0, args.interval)):
+        return
+    for path in page["load"]:
+        get(path)
+    while not stop.wait(args.interval * rng.uniform(0.9, 1.1)):
+        for path in page["refresh"]:
+            get(path)
+
+
+###############################################################################
+##################################___CIBLES___#################################
+###############################################################################
+
+
+def server_env(args, db_path):
+    """Variables d'environnement du serveur teste : DB de test et alignement a l'echelle de --interval"""
+    env = dict(os.environ)
+    env["DATABASE_PATH"] = db_path
+    env["ALIGN_BUCKET_MS"] = str(int(args.interval * 1000))
+    env["ALIGN_TIMEOUT"] = str(args.interval * 17 / 20)
+    env["PYTHONPATH"] = ROOT
+    return env
+
+
+def prefill(db, sensors, days):
+    """Historique deja present : `days` jours de mesures toutes les 20 s pour chaque capteur"""
+    if days <= 0:
+        return 0
+    now = db.now_ts()
+    rng = random.Random(0)
+    total = 0
+    for sensor_id in range(1, sensors + 1):
+        db.register_sensor(sensor_id)
+        rows = [{"sensor_id": sensor_id, "ts": ts, "temperature": round(20 + rng.uniform(-5, 5), 2),
+                 "humidity": round(50 + rng.uniform(-10, 10), 2), "pressure": round(1013 + rng.uniform(-5, 5), 2)}
+                for ts in range(now - days * 86400000, now - 60000, 20000)]
+        for i in range(0, len(rows), 50000):
+            total += db.add_readings(rows[i:i + 50000])
+    return total
+
+
+def db_size(path):
+    """Taille de la DB (octets), apres report du journal WAL dans le fichier"""
+    import sqlite3
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return os.path.getsize(path)
+
+
+def count_readings(path):
+    """Nombre de lignes dans readings (lecture seule)"""
+    import sqlite3
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=30):
+    """Attend que le serveur reponde"""
+    client = HttpClient(url, keep_alive=False, timeout=2)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.request("GET", "/api/sensors")[0] == 200:
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"le serveur {url} ne repond pas")
+
+
+def run(args):
+    stats = Stats()
+    counters = {"sent": 0, "paired": 0}
+    stop = threading.Event()
+    db_path = None
+    server = None
+
+    if args.target in ("testclient", "gunicorn"):
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench_fleet_"), "weather_data.db")
+        os.environ.update(server_env(args, db_path))
+        sys.path.insert(0, ROOT)
+        import app.database as db
+        print(f"Historique : {prefill(db, args.sensors, args.history_days)} mesures ({args.history_days} jours)")
+        db.close_db_connection()
+
+    if args.target == "testclient":
+        from app.main import app
+        make_sensor_client = make_browser_client = lambda: TestClient(app)
+    else:
+        if args.target == "gunicorn":
+            url = f"http://127.0.0.1:{free_port()}"
+            server = subprocess.Popen(
+                ["gunicorn", "app.main:app", "--bind", url[7:], "--worker-class", "gthread",
+                 "--workers", str(args.workers), "--threads", str(args.threads)],
+                cwd=ROOT, env=server_env(args, db_path), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        else:
+            url = args.url
+        wait_ready(url)
+        # Un ESP32 ouvre une connexion par envoi, un navigateur garde la sienne
+        make_sensor_client = lambda: HttpClient(url, keep_alive=False)
+        make_browser_client = lambda: HttpClient(url)
+
+    size_before = db_size(db_path) if db_path else None
+    rows_before = count_readings(db_path) if db_path else None
+
+    threads = [threading.Thread(target=sensor_loop, args=(n, make_sensor_client(), args, stats, stop, counters))
+               for n in range(1, args.sensors + 1)]
+    threads += [threading.Thread(target=browser_loop, args=(n, make_browser_client(), args, stats, stop))
+                for n in range(args.browsers)]
+    # Messages de l'application (une ligne par mesure) masques pendant la mesure, comme pour gunicorn
+    quiet = contextlib.redirect_stdout(open(os.devnull, "w")) if args.target == "testclient" else contextlib.nullcontext()
+    with quiet:
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        # Mesures en attente et en file ecrites avant de mesurer la DB
+        if args.target == "testclient":
+            from app import align, ingest
+            align.flush_all()
+            ingest.flush()
+    if server is not None:
+        server.terminate()
+        server.wait(timeout=60)
+
+    result = {
+        "target": args.target,
+        "config": {name: getattr(args, name) for name in
+                   ("sensors", "browsers", "duration", "interval", "drop", "history_days", "workers", "threads")},
+        "duration": round(elapsed, 2),
+        "requests": sum(len(v) for v in stats.latencies.values()),
+        "throughput": round(sum(len(v) for v in stats.latencies.values()) / elapsed, 1),
+        "readings_sent": counters["sent"],
+        "readings_paired": counters["paired"],
+        "statuses": {str(status): count for status, count in sorted(stats.statuses.items(), key=str)},
+        "endpoints": {
+            name: {
+                "count": len(values),
+                "errors": stats.errors.get(name, 0),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2)
+            }
+            for name, values in sorted(stats.latencies.items())
+        }
+    }
+    if db_path:
+        rows_after = count_readings(db_path)
+        growth = db_size(db_path) - size_before
+        result["db"] = {
+            "size_before": size_before,
+            "growth_bytes": growth,
+            "rows_written": rows_after - rows_before,
+            "bytes_per_row": round(growth / max(rows_after - rows_before, 1), 1)
+        }
+        shutil.rmtree(os.path.dirname(db_path), ignore_errors=True)
+    return result
+
+
+###############################################################################
+############################___RAPPORT ET REFERENCE___#########################
+###############################################################################
+
+
+def report(result):
+    config = result["config"]
+    print(f"\nCible {result['target']} : {config['sensors']} capteurs, {config['browsers']} navigateurs, "
+          f"{result['duration']} s (intervalle {config['interval']} s)")
+    print(f"{result['requests']} requetes, {result['throughput']} req/s, statuts {result['statuses']}")
+    print(f"Mesures envoyees : {result['readings_sent']} ({result['readings_paired']} intervalles complets a l'envoi)")
+    if "db" in result and result["db"]["rows_written"] != result["readings_sent"]:
+        print(f"ATTENTION : {result['db']['rows_written']} mesures ecrites en DB")
+    print(f"\n{'endpoint':<48}{'n':>7}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, e in result["endpoints"].items():
+        print(f"{name:<48}{e['count']:>7}{e['errors']:>5}{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['p99_ms']:>9.1f}")
+    if "db" in result:
+        db = result["db"]
+        print(f"\nDB : {db['size_before'] / 1e6:.1f} Mo au depart, +{db['growth_bytes'] / 1e3:.0f} Ko "
+              f"pour {db['rows_written']} mesures ({db['bytes_per_row']} octets/mesure)")
+
+
+def compare(result, baseline, tolerance, min_delta):
+    """
+    Compare a la reference de la meme cible. Retourne False si une degradation depasse tolerance %
+    (et min_delta ms pour les latences : quelques ms d'ecart sur un p95 de 5 ms ne sont que du bruit).
+    """
+    reference = baseline.get(result["target"])
+    if reference is None:
+        print(f"\nPas de reference pour la cible {result['target']}")
+        return True
+    if reference["config"] != result["config"]:
+        print(f"\nATTENTION : parametres differents de la reference {reference['config']}")
+    ok = True
+
+    def delta(new, old):
+        return (new - old) / old * 100 if old else 0.0
+
+    print(f"\nComparaison avec la reference ({reference['throughput']} req/s) :")
+    change = delta(result["throughput"], reference["throughput"])
+    print(f"{'debit':<48}{change:>+8.1f} %")
+    if change < -tolerance:
+        ok = False
+    for name, e in result["endpoints"].items():
+        old = reference["endpoints"].get(name)
+        if old is None:
+            continue
+        change = delta(e["p95_ms"], old["p95_ms"])
+        slower = change > tolerance and e["p95_ms"] - old["p95_ms"] > min_delta
+        flag = "  <-- plus lent" if slower else ""
+        print(f"{name + ' p95':<48}{change:>+8.1f} %  ({old['p95_ms']} -> {e['p95_ms']} ms){flag}")
+        if flag:
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de charge : flotte d'ESP32 + navigateurs")
+    parser.add_argument("--target", choices=("testclient", "gunicorn", "url"), default="testclient")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="serveur deja demarre (--target url)")
+    parser.add_argument("--sensors", type=int, default=10, help="capteurs ATOM_001..ATOM_N")
+    parser.add_argument("--browsers", type=int, default=20, help="navigateurs simules")
+    parser.add_argument("--duration", type=float, default=30, help="duree de la mesure (s)")
+    parser.add_argument("--interval", type=float, default=2.0, help="intervalle d'envoi des capteurs (s, 20 en vrai)")
+    parser.add_argument("--drop", type=float, default=0.05, help="probabilite qu'un capteur saute un envoi")
+    parser.add_argument("--history-days", type=int, default=7, help="jours d'historique dans la DB de test")
+    parser.add_argument("--workers", type=int, default=1, help="workers gunicorn")
+    parser.add_argument("--threads", type=int, default=8, help="threads par worker gunicorn")
+    parser.add_argument("--save", help="enregistre le resultat comme reference (fichier JSON, une entree par cible)")
+    parser.add_argument("--compare", help="compare a une reference enregistree")
+    parser.add_argument("--tolerance", type=float, default=20, help="degradation toleree (%%)")
+    parser.add_argument("--min-delta", type=float, default=5, help="ecart de p95 ignore (ms)")
+    args = parser.parse_args()
+
+    result = run(args)
+    report(result)
+
+    ok = True
+    if args.compare:
+        with open(args.compare) as f:
+            ok = compare(result, json.load(f), args.tolerance, args.min_delta)
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.save):
+            with open(args.save) as f:
+                baseline = json.load(f)
+        baseline[result["target"]] = result
+        with open(args.save, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"\nReference enregistree : {args.save} ({result['target']})")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
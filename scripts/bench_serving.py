@@ -0,0 +1,137 @@
+# Fonction : comparer le mode Gunicorn (threads) et le mode ASGI (app/asgi.py) sous charge
+#
+# Ouvre N connexions /api/stream (pages ouvertes) puis envoie des mesures comme M capteurs
+# en parallele (POST /request/batch). Affiche le debit, la latence des POST, le nombre de
+# connexions acceptees et le nombre d'evenements "reading" recus.
+#
+# Usage (serveur deja demarre, base de test) :
+#   python3 scripts/bench_serving.py --url http://127.0.0.1:5000 --subscribers 500 --sensors 200 --requests 20
+#
+# Exemples de serveurs a comparer :
+#   gunicorn app.main:app --bind 127.0.0.1:5000 --worker-class gthread --threads 32
+#   uvicorn app.asgi:app --host 127.0.0.1 --port 5000
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+
+async def open_stream(host, port, stats, ready, timeout):
+    """Garde une connexion /api/stream ouverte et compte les evenements recus"""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats["stream_failed"] += 1
+        ready.release()
+        return
+    writer.write(f"GET /api/stream HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    try:
+        status = await asyncio.wait_for(reader.readline(), timeout)
+    except (asyncio.TimeoutError, OSError):
+        status = b""
+    ready.release()
+    if b" 200 " not in status:
+        stats["stream_failed"] += 1
+        writer.close()
+        return
+    stats["stream_ok"] += 1
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"event: reading"):
+                stats["events"] += 1
+    except (OSError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def post_readings(host, port, sensor, count, latencies, stats, timeout):
+    """Envoie count lots d'une mesure comme le ferait un capteur (une connexion par requete)"""
+    for i in range(count):
+        body = json.dumps({"readings": [{
+            "capteur_id": f"ATOM_{sensor % 2 + 1:03d}",
+            "temperature": 20 + (sensor % 10) / 10,
+            "humidite": 50.0,
+            "pression": 1013.0,
+            "ts": int(time.time() * 1000) - sensor * 1000 - i
+        }]}).encode()
+        request = (
+            f"POST /request/batch HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        ).encode() + body
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            writer.write(request)
+            response = await asyncio.wait_for(reader.read(), timeout)
+            writer.close()
+        except (OSError, asyncio.TimeoutError):
+            stats["post_failed"] += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.startswith(b"HTTP/1.1 20") or response.startswith(b"HTTP/1.0 20"):
+            stats["post_ok"] += 1
+        else:
+            stats["post_failed"] += 1
+
+
+def percentile(values, p):
+    """Percentile simple (valeurs triees)"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    stats = {"stream_ok": 0, "stream_failed": 0, "events": 0, "post_ok": 0, "post_failed": 0}
+    latencies = []
+
+    # 1. Pages ouvertes
+    ready = asyncio.Semaphore(0)
+    streams = [asyncio.create_task(open_stream(host, port, stats, ready, args.timeout)) for _ in range(args.subscribers)]
+    for _ in range(args.subscribers):
+        await ready.acquire()
+
+    # 2. Capteurs qui envoient en parallele
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        post_readings(host, port, sensor, args.requests, latencies, stats, args.timeout)
+        for sensor in range(args.sensors)
+    ))
+    elapsed = time.perf_counter() - start
+
+    # Laisse le temps aux derniers evenements d'arriver
+    await asyncio.sleep(2)
+    for task in streams:
+        task.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+
+    total = args.sensors * args.requests
+    print(f"Connexions /api/stream : {stats['stream_ok']} ouvertes, {stats['stream_failed']} refusees")
+    print(f"POST /request/batch    : {stats['post_ok']}/{total} ok, {stats['post_failed']} en erreur")
+    print(f"Duree                  : {elapsed:.2f} s ({stats['post_ok'] / elapsed:.0f} req/s)")
+    print(f"Latence POST (ms)      : p50 {percentile(latencies, 50) * 1000:.1f}"
+          f"  p95 {percentile(latencies, 95) * 1000:.1f}  p99 {percentile(latencies, 99) * 1000:.1f}")
+    print(f"Evenements recus       : {stats['events']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge : pages ouvertes + capteurs")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--subscribers", type=int, default=100, help="connexions /api/stream ouvertes")
+    parser.add_argument("--sensors", type=int, default=50, help="capteurs qui envoient en parallele")
+    parser.add_argument("--requests", type=int, default=20, help="requetes par capteur")
+    parser.add_argument("--timeout", type=float, default=10, help="attente maximum d'une reponse (s)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -71,9 +71,13 @@ echo ""
 # Option 1: Mode developpement (plus de logs)
 # python3 -m flask --app app.main run --host=0.0.0.0 --port=5000
 
+# Option 3: Mode asynchrone (beaucoup de capteurs / pages ouvertes, voir app/asgi.py)
+# uvicorn app.asgi:app --host 0.0.0.0 --port 5000
+
 # Option 2: Mode production avec Gunicorn (recommande)
+# Workers a threads : chaque page ouverte garde une connexion /api/stream
 if command -v gunicorn &> /dev/null; then
-    gunicorn app.main:app --bind 0.0.0.0:5000 --workers 2 --access-logfile - --error-logfile -
+    gunicorn app.main:app --bind 0.0.0.0:5000 --workers 2 --worker-class gthread --threads 32 --access-logfile - --error-logfile -
 else
     echo "Gunicorn non installe, utilisation de Flask en mode dev"
     python3 -m flask --app app.main run --host=0.0.0.0 --port=5000
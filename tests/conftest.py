@@ -0,0 +1,42 @@
+# Fonction : configuration commune des tests (pytest)
+#
+# Chaque test a sa propre DB SQLite dans un dossier temporaire (et son dossier d'archive
+# a cote). DATABASE_PATH est defini avant le premier import de app.database, qui cree
+# les tables a l'import ; ensuite database.DB_PATH est change pour chaque test.
+
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="station_meteo_"), "weather_data.db"))
+# Ecriture immediate des mesures (pas de thread d'ecriture entre le POST et la lecture)
+os.environ.setdefault("INGEST_DURABILITY", "sync")
+
+import pytest
+
+from app import cache
+from app import database as db
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """DB vide pour le test (tables creees, registre et cache des dernieres mesures vides)"""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "weather_data.db"))
+    monkeypatch.setattr(db, "ARCHIVE_DIR", None)
+    db.close_db_connection()
+    db.create_tables()
+    db.invalidate_sensors()
+    db._own_writes.clear()
+    with cache._lock:
+        cache._latest.clear()
+        cache._known_writes.clear()
+    cache._local.__dict__.clear()
+    yield db
+    db.close_db_connection()
+
+
+@pytest.fixture
+def client():
+    """Client de test Flask de l'application complete"""
+    from app.main import app
+    return app.test_client()
+
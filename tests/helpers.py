@@ -0,0 +1,13 @@
+# Fonction : petites fonctions communes aux tests
+
+from app import database as db
+
+
+def at(date, hour="00:00:00"):
+    """ts (ms) d'une date et heure suisses"""
+    return db.date_hour_to_ts(date, hour)
+
+
+def reading(sensor_id, ts, temperature=None, humidity=None, pressure=None):
+    """Mesure au format de database.add_readings"""
+    return {"sensor_id": sensor_id, "ts": ts, "temperature": temperature, "humidity": humidity, "pressure": pressure}
@@ -0,0 +1,115 @@
+# Tests : alignement des capteurs sur des intervalles communs (align.py)
+
+import pytest
+
+from app import align
+
+W = align.ALIGN_BUCKET_MS
+BUCKET = 1_800_000_000_000 - 1_800_000_000_000 % W  # debut d'un intervalle
+
+
+class Written(list):
+    """Mesures envoyees a la file d'ecriture, avec les echeances planifiees (deadlines)"""
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """Etat vide, echeances et file d'ecriture remplacees : retourne la liste des mesures ecrites"""
+    monkeypatch.setattr(align, "_buckets", {})
+    monkeypatch.setattr(align, "_last_seen", {})
+    monkeypatch.setattr(align, "_written", {})
+    deadlines = {}
+    monkeypatch.setattr(align.scheduler, "schedule", lambda key, delay, payload=None: deadlines.__setitem__(key, delay))
+    monkeypatch.setattr(align.scheduler, "cancel", lambda key: deadlines.pop(key, None))
+    out = Written()
+    monkeypatch.setattr(align.ingest, "submit", out.append)
+    out.deadlines = deadlines
+    return out
+
+
+def measure(sensor_id, ts, temperature=20.0):
+    return {"sensor_id": sensor_id, "ts": ts, "temperature": temperature, "humidity": None, "pressure": None}
+
+
+def active(*sensor_ids, bucket=BUCKET - W):
+    """Capteurs qui ont envoye dans un intervalle recent (donc attendus)"""
+    for sensor_id in sensor_ids:
+        align._last_seen[sensor_id] = bucket
+
+
+def test_snap_returns_bucket_start():
+    assert align.snap(BUCKET) == BUCKET
+    assert align.snap(BUCKET + W - 1) == BUCKET
+    assert align.snap(BUCKET + W) == BUCKET + W
+
+
+def test_bucket_written_when_all_active_sensors_sent(written):
+    active(1, 2)
+    bucket, complete = align.add(measure(1, BUCKET + 1000))
+    assert (bucket, complete) == (BUCKET, False)
+    assert written == []
+    assert BUCKET in written.deadlines
+
+    bucket, complete = align.add(measure(2, BUCKET + 5000))
+    assert (bucket, complete) == (BUCKET, True)
+    # Chaque mesure garde son propre ts, l'echeance est annulee
+    assert sorted((r["sensor_id"], r["ts"]) for r in written) == [(1, BUCKET + 1000), (2, BUCKET + 5000)]
+    assert BUCKET not in written.deadlines
+    assert align.pending_count() == 0
+
+
+def test_two_readings_of_one_sensor_in_a_bucket_are_both_written(written):
+    active(1, 2)
+    align.add(measure(1, BUCKET + 1000, 20.0))
+    align.add(measure(1, BUCKET + 9000, 21.0))
+    assert align.pending_count() == 2
+    align.add(measure(2, BUCKET + 2000))
+    assert [(r["ts"], r["temperature"]) for r in written if r["sensor_id"] == 1] == [(BUCKET + 1000, 20.0),
+                                                                                     (BUCKET + 9000, 21.0)]
+
+
+def test_timeout_writes_received_readings_without_missing_sensors(written):
+    active(1, 2)
+    align.add(measure(1, BUCKET + 1000))
+    align.timeout_callback([(BUCKET, None)])
+    assert [(r["sensor_id"], r["ts"]) for r in written] == [(1, BUCKET + 1000)]
+    assert align.pending_count() == 0
+
+    # Le capteur en retard est ecrit tout de suite : l'autre capteur de l'intervalle est deja ecrit
+    bucket, complete = align.add(measure(2, BUCKET + 18000))
+    assert complete
+    assert [(r["sensor_id"], r["ts"]) for r in written] == [(1, BUCKET + 1000), (2, BUCKET + 18000)]
+
+
+def test_timeout_of_an_already_written_bucket_does_nothing(written):
+    active(1)
+    align.add(measure(1, BUCKET + 1000))
+    align.timeout_callback([(BUCKET, None)])
+    assert len(written) == 1
+
+
+def test_inactive_sensor_is_not_waited_for(written):
+    active(2, bucket=BUCKET - (align.ALIGN_ACTIVE_BUCKETS + 1) * W)
+    bucket, complete = align.add(measure(1, BUCKET + 1000))
+    assert complete
+    assert len(written) == 1
+
+
+def test_readings_go_to_the_bucket_of_their_own_ts(written):
+    active(1, 2)
+    align.add(measure(1, BUCKET + 1000))
+    align.add(measure(1, BUCKET + W + 1000))
+    assert set(align._buckets) == {BUCKET, BUCKET + W}
+    align.add(measure(2, BUCKET + W + 3000))
+    # Seul l'intervalle suivant est complet
+    assert [(r["sensor_id"], r["ts"]) for r in written] == [(1, BUCKET + W + 1000), (2, BUCKET + W + 3000)]
+    assert set(align._buckets) == {BUCKET}
+
+
+def test_flush_all_writes_open_buckets(written):
+    active(1, 2)
+    align.add(measure(1, BUCKET + 1000))
+    align.add(measure(1, BUCKET + W + 1000))
+    align.flush_all()
+    assert sorted(r["ts"] for r in written) == [BUCKET + 1000, BUCKET + W + 1000]
+    assert align.pending_count() == 0
@@ -0,0 +1,108 @@
+# Tests : archive des mois termines en colonnes .npy (archive.py, database.archive_month)
+
+import os
+
+import numpy as np
+
+from app import analytics, archive
+from app import database as db
+from tests.helpers import at, reading
+
+# Valeurs qui ne sont pas exactes en float32 (21.3 -> 21.299999237...)
+VALUES = [(21.3, 45.7, 1013.2), (-3.15, 99.9, 987.65), (0.1, None, 1020.05), (None, None, 1001.0), (25.05, 12.3, None)]
+
+
+def readings(month="2026-02"):
+    stamps = [at(f"{month}-{day:02d}", "08:15:30") for day in range(1, len(VALUES) + 1)]
+    return [reading(1, ts, *values) for ts, values in zip(stamps, VALUES)]
+
+
+def test_round_trip_gives_back_the_received_values():
+    db.add_readings(readings())
+    before = db.read_range(1, newest_first=False)
+    assert db.archive_month(1, "2026-02") == len(VALUES)
+
+    # Plus rien en DB pour ce mois, les fichiers existent
+    with db.db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 0
+    assert archive.months(db.archive_dir(), 1) == ["2026-02"]
+    for name in archive.COLUMNS:
+        assert os.path.exists(os.path.join(archive.sensor_dir(db.archive_dir(), 1), "2026-02", f"{name}.npy"))
+
+    after = db.read_range(1, newest_first=False)
+    assert after == before
+    assert [row[1:] for row in after] == VALUES
+
+
+def test_columns_are_int64_ts_and_float32_values():
+    db.add_readings(readings())
+    db.archive_month(1, "2026-02")
+    data = archive.load(db.archive_dir(), 1, "2026-02")
+    assert data["ts"].dtype == np.int64 and data["temperature"].dtype == np.float32
+    assert np.all(np.diff(data["ts"]) > 0)
+    assert np.isnan(data["humidity"]).sum() == 2
+
+
+def test_exact_uses_the_shortest_float32_representation():
+    values = np.array([21.3, 0.1, 1013.2, np.nan], dtype=np.float32)
+    assert analytics.to_json_list(values) == [21.3, 0.1, 1013.2, None]
+    # Meme valeur depuis le float32 ou depuis la valeur recue
+    assert analytics.exact(values.astype(np.float64)).tolist()[:3] == [21.3, 0.1, 1013.2]
+    assert analytics.exact_value(20.99999870490893) == 20.999998
+    assert analytics.exact_value(None) is None
+
+
+def test_archived_reading_sent_again_is_a_duplicate():
+    rows = readings()
+    db.add_readings(rows)
+    db.archive_month(1, "2026-02")
+    assert db.add_readings(rows) == 0
+    assert db.read_range(1, ("ts",), newest_first=False) == [(r["ts"],) for r in rows]
+
+
+def test_late_reading_in_an_archived_month_is_merged_in_order():
+    rows = readings()
+    db.add_readings(rows)
+    db.archive_month(1, "2026-02")
+    late = reading(1, at("2026-02-02", "23:00:00"), 18.5)
+    assert db.add_readings([late]) == 1
+
+    stamps = [row[0] for row in db.read_range(1, ("ts",), newest_first=False)]
+    assert stamps == sorted([r["ts"] for r in rows] + [late["ts"]])
+
+    # Un second archivage fusionne la mesure en retard avec les fichiers existants
+    assert db.archive_month(1, "2026-02") == 1
+    data = archive.load(db.archive_dir(), 1, "2026-02")
+    assert data["ts"].tolist() == stamps
+    with db.db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 0
+
+
+def test_read_columns_is_the_same_before_and_after_archiving():
+    db.add_readings(readings())
+    before = db.read_columns(1)
+    db.archive_month(1, "2026-02")
+    after = db.read_columns(1)
+    for name in before:
+        np.testing.assert_array_equal(before[name], after[name])
+
+
+def test_full_precision_reading_is_the_same_number_in_every_tier(client):
+    """Regression : 20.99999870490893 en DB, 20.999998 une fois archive ou apres rebuild-rollup"""
+    stamps = [at("2026-02-03", f"{hour:02d}:00:00") for hour in range(6)]
+    values = [20.99999870490893, 21.30000001, 19.123456789, 22.5, 20.1, 18.77777777]
+    db.add_readings([reading(1, ts, value) for ts, value in zip(stamps, values)])
+    expected = [float(str(np.float32(value))) for value in values]
+
+    def served():
+        rows = [row[1] for row in db.read_range(1, ("ts", "temperature"), newest_first=False)]
+        summary = db.read_daily_summary(1)[0]["temperature"]
+        chart = client.get("/api/statistical?type=temperature&date=2026-02-03&points=3").get_json()
+        return rows, (summary["min"], summary["max"]), (min(chart["min1"]), max(chart["max1"]))
+
+    live = served()
+    assert live == (expected, (min(expected), max(expected)), (min(expected), max(expected)))
+    db.archive_month(1, "2026-02")
+    assert served() == live
+    db.rebuild_daily_rollup(1)
+    assert served() == live
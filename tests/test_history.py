@@ -0,0 +1,98 @@
+# Tests : lecture par intervalles et pagination par curseur sur la DB et les mois archives
+
+import numpy as np
+import pytest
+
+from app import database as db
+from tests.helpers import at, reading
+
+MINUTE = 60 * 1000
+
+
+@pytest.fixture
+def history():
+    """
+    Capteur 1 : une mesure toutes les 6 heures de janvier a mars 2026. Janvier et fevrier sont
+    archives, puis une mesure de fevrier arrive en retard (en DB dans un mois archive).
+    Retourne tous les ts, du plus ancien au plus recent.
+    """
+    stamps = list(range(at("2026-01-01"), at("2026-04-01"), 6 * 60 * MINUTE))
+    db.add_readings([reading(1, ts, 20 + i % 10 / 10, 40.5, 1013.25) for i, ts in enumerate(stamps)])
+    assert db.archive_month(1, "2026-01") > 0
+    assert db.archive_month(1, "2026-02") > 0
+    late = at("2026-02-14", "12:30:00")
+    assert db.add_readings([reading(1, late, 19.9)]) == 1
+    return sorted(stamps + [late])
+
+
+def test_segments_split_the_range_around_archived_months(history):
+    jan, feb, mar = (db.month_bounds(month)[0] for month in ("2026-01", "2026-02", "2026-03"))
+    assert db._segments(1) == [(None, jan, None), (jan, feb, "2026-01"), (feb, mar, "2026-02"), (mar, None, None)]
+    assert db._segments(1, jan + 1000, feb + 1000) == [(jan + 1000, feb, "2026-01"), (feb, feb + 1000, "2026-02")]
+    assert db._segments(1, mar, mar + 1000) == [(mar, mar + 1000, None)]
+    # Sans archive : un seul morceau lu en DB
+    assert db._segments(2, jan, mar) == [(jan, mar, None)]
+
+
+def test_read_range_merges_db_and_archive(history):
+    rows = db.read_range(1, ("ts", "temperature"), newest_first=False)
+    assert [row[0] for row in rows] == history
+    # Valeur recue, pas le float32 de l'archive
+    assert rows[1][1] == 20.1
+
+
+def test_keyset_pagination_backwards_visits_every_row_once(history):
+    seen, before = [], None
+    while True:
+        page = db.read_range(1, ("ts",), limit=37, before=before)
+        if not page:
+            break
+        assert len(page) <= 37
+        seen += [row[0] for row in page]
+        before = page[-1][0]
+    assert seen == history[::-1]
+
+
+def test_keyset_pagination_forwards_visits_every_row_once(history):
+    seen, after = [], history[0] - 1
+    while True:
+        page = db.read_range(1, ("ts",), limit=41, newest_first=False, after=after)
+        if not page:
+            break
+        seen += [row[0] for row in page]
+        after = page[-1][0]
+    assert seen == history
+
+
+def test_pagination_with_a_range(history):
+    start, end = at("2026-01-20"), at("2026-03-10")
+    expected = [ts for ts in history if start <= ts < end][::-1]
+    seen, before = [], None
+    while True:
+        page = db.read_range(1, ("ts",), start, end, limit=25, before=before)
+        if not page:
+            break
+        seen += [row[0] for row in page]
+        before = page[-1][0]
+    assert seen == expected
+
+
+def test_history_endpoint_pages_across_archive(history, client):
+    seen, before_id = [], None
+    while True:
+        url = "/api/sensor/1/history?from=2026-01-01&to=2026-04-01&limit=100"
+        page = client.get(url + (f"&before_id={before_id}" if before_id else "")).get_json()
+        # Colonnes du plus ancien au plus recent, toutes de la meme longueur
+        assert page["id"] == sorted(page["id"])
+        assert len(page["temperature"]) == len(page["id"])
+        seen = page["id"] + seen
+        if not page["has_more"]:
+            break
+        before_id = page["next_before_id"]
+    assert seen == history
+
+
+def test_read_columns_is_sorted_and_complete(history):
+    columns = db.read_columns(1, ("temperature",))
+    assert columns["ts"].tolist() == history
+    assert np.isnan(columns["temperature"]).sum() == 0
@@ -0,0 +1,127 @@
+# Tests : retention, resume horaire (hourly_rollup) des mesures et mois archives supprimes
+
+import numpy as np
+import pytest
+
+from app import archive
+from app import database as db
+from app import retention
+from tests.helpers import at, reading
+
+MINUTE = 60 * 1000
+
+
+def minutes(start, count, step=7):
+    """count mesures toutes les step minutes, valeurs exactes en float32 ou presque (21.3, ...)"""
+    return [reading(1, start + i * step * MINUTE, round(15 + i % 23 * 0.7, 1), 40 + i % 11, None)
+            for i in range(count)]
+
+
+def hourly_from_python(rows, metric):
+    """Resume horaire attendu : {heure: (min, max, somme, nombre)}"""
+    groups = {}
+    for r in rows:
+        value = r[metric]
+        if value is None:
+            continue
+        value = float(str(np.float32(value)))
+        hour = r["ts"] - r["ts"] % db.HOUR_MS
+        mn, mx, total, count = groups.get(hour, (value, value, 0.0, 0))
+        groups[hour] = (min(mn, value), max(mx, value), total + value, count + 1)
+    return groups
+
+
+def hourly_from_db(metric):
+    hours, sums, counts, mins, maxs = db.read_hourly(1, metric)
+    return {hour: (mn, mx, total, int(count))
+            for hour, total, count, mn, mx in zip(hours.tolist(), sums, counts, mins, maxs)}
+
+
+def assert_same_hours(expected, actual):
+    assert sorted(actual) == sorted(expected)
+    for hour, (mn, mx, total, count) in expected.items():
+        assert actual[hour][0] == mn and actual[hour][1] == mx and actual[hour][3] == count
+        assert actual[hour][2] == pytest.approx(total)
+
+
+def test_compact_readings_summarizes_deleted_rows_by_hour():
+    rows = minutes(at("2026-03-02", "22:00:00"), 100)
+    db.add_readings(rows)
+    cutoff = at("2026-03-03", "06:00:00")
+
+    # Petits paquets : une heure peut etre resumee en plusieurs fois
+    removed = db.compact_readings(1, cutoff, chunk_size=13)
+    old = [r for r in rows if r["ts"] < cutoff]
+    assert removed == len(old)
+    for metric in ("temperature", "humidity"):
+        assert_same_hours(hourly_from_python(old, metric), hourly_from_db(metric))
+    assert db.read_hourly(1, "pressure")[0].size == 0
+
+    # Les mesures apres cutoff restent en DB
+    assert [row[0] for row in db.read_range(1, ("ts",), newest_first=False)] == [
+        r["ts"] for r in rows if r["ts"] >= cutoff]
+    assert db.compact_readings(1, cutoff) == 0
+
+
+def test_compact_archive_removes_month_and_fills_hourly_rollup():
+    rows = minutes(at("2026-01-31", "20:00:00"), 120, step=11)
+    db.add_readings(rows)
+    assert db.archive_month(1, "2026-01") > 0
+
+    assert db.compact_archive(1, at("2026-02-01")) == 1
+    assert archive.months(db.archive_dir(), 1) == []
+    january = [r for r in rows if r["ts"] < at("2026-02-01")]
+    assert_same_hours(hourly_from_python(january, "temperature"), hourly_from_db("temperature"))
+    # Fevrier n'est pas archive : pas touche
+    assert len(db.read_range(1, ("ts",))) == len(rows) - len(january)
+
+
+def test_compact_archive_keeps_months_ending_after_cutoff():
+    db.add_readings(minutes(at("2026-01-20"), 50))
+    db.archive_month(1, "2026-01")
+    assert db.compact_archive(1, at("2026-01-31")) == 0
+    assert archive.months(db.archive_dir(), 1) == ["2026-01"]
+
+
+def test_expire_hourly_deletes_old_hours():
+    db.add_readings(minutes(at("2026-03-01"), 60, step=30))
+    db.compact_readings(1, at("2026-03-02"))
+    hours = db.read_hourly(1, "temperature")[0].tolist()
+    assert db.expire_hourly(1, hours[10]) == 10 * 2
+    assert db.read_hourly(1, "temperature")[0].tolist() == hours[10:]
+
+
+def test_stats_keep_counting_compacted_readings(client):
+    """Regression : apres la retention, /stats lisait 0 mesure sur les periodes compactees"""
+    rows = minutes(at("2026-02-20"), 6000, step=5)
+    db.add_readings(rows)
+    url = "/api/sensor/1/stats?from=2026-02-01&to=2026-04-01"
+    before = client.get(url).get_json()
+    assert before["tier"] == "raw"
+
+    assert db.archive_month(1, "2026-02") > 0
+    result = retention.run_once(raw_days=30, hourly_days=0, now=at("2026-05-15"))
+    assert result["months"] == 1 and result["readings"] > 0
+    with db.db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 0
+
+    after = client.get(url).get_json()
+    assert after["tier"] == "hourly"
+    for metric in ("temperature", "humidity"):
+        assert after[metric]["count"] == before[metric]["count"] == len(rows)
+        assert after[metric]["min"] == before[metric]["min"]
+        assert after[metric]["max"] == before[metric]["max"]
+        assert after[metric]["mean"] == pytest.approx(before[metric]["mean"])
+    assert after["pressure"]["count"] == 0
+
+
+def test_stats_mix_raw_and_hourly_tiers(client):
+    rows = minutes(at("2026-03-01"), 48, step=60)
+    db.add_readings(rows)
+    db.compact_readings(1, at("2026-03-02"))
+    result = client.get("/api/sensor/1/stats?from=2026-03-01&to=2026-03-03&type=temperature").get_json()
+    assert result["tier"] == "mixed"
+    assert result["temperature"]["count"] == 48
+    values = [r["temperature"] for r in rows]
+    assert result["temperature"]["mean"] == pytest.approx(sum(values) / len(values))
+    assert (result["temperature"]["min"], result["temperature"]["max"]) == (min(values), max(values))
@@ -0,0 +1,93 @@
+# Tests : resume journalier (daily_rollup) tenu a jour a l'insertion, compare a rebuild_daily_rollup
+
+import random
+
+import pytest
+
+from app import database as db
+from tests.helpers import at, reading
+
+MINUTE = 60 * 1000
+
+
+def daily_rollup(sensor_id=1):
+    with db.db_connection() as conn:
+        rows = conn.execute(
+            "SELECT day, metric, min, max, sum, count FROM daily_rollup WHERE sensor_id = ? ORDER BY day, metric",
+            (sensor_id,)).fetchall()
+    return {(day, metric): (mn, mx, total, count) for day, metric, mn, mx, total, count in rows}
+
+
+def assert_same_rollup(expected, actual):
+    assert sorted(actual) == sorted(expected)
+    for key, (mn, mx, total, count) in expected.items():
+        assert actual[key][0] == mn and actual[key][1] == mx and actual[key][3] == count, key
+        assert actual[key][2] == pytest.approx(total), key
+
+
+@pytest.fixture
+def rows():
+    """Deux capteurs, trois jours autour du passage a l'heure d'ete (2026-03-29), valeurs manquantes"""
+    rng = random.Random(4)
+    start = at("2026-03-27", "20:00:00")
+    result = []
+    for i in range(500):
+        for sensor_id in (1, 2):
+            ts = start + i * 10 * MINUTE + sensor_id * 1000
+            result.append(reading(sensor_id, ts,
+                                  round(rng.uniform(-5, 25), 1) if i % 17 else None,
+                                  round(rng.uniform(20, 95), 1) if i % 5 else None,
+                                  round(rng.uniform(980, 1040), 2)))
+    return result
+
+
+def test_incremental_rollup_matches_rebuild(rows):
+    # Lots dans le desordre, avec des mesures deja recues
+    batches = [rows[i:i + 97] for i in range(0, len(rows), 97)]
+    random.Random(7).shuffle(batches)
+    for batch in batches:
+        db.add_readings(batch + batch[:5])
+    db.add_readings(rows[:300])
+
+    incremental = {sensor_id: daily_rollup(sensor_id) for sensor_id in (1, 2)}
+    assert {day for day, _ in incremental[1]} == {"2026-03-27", "2026-03-28", "2026-03-29", "2026-03-30",
+                                                  "2026-03-31"}
+    for sensor_id in (1, 2):
+        db.rebuild_daily_rollup(sensor_id)
+        assert_same_rollup(daily_rollup(sensor_id), incremental[sensor_id])
+
+
+def test_rollup_counts_swiss_days(rows):
+    db.add_readings(rows)
+    expected = {}
+    for r in rows:
+        if r["sensor_id"] == 1 and r["temperature"] is not None:
+            day = db.ts_to_date_hour(r["ts"])[0]
+            expected[day] = expected.get(day, 0) + 1
+    assert {day: count for (day, metric), (*_, count) in daily_rollup().items()
+            if metric == "temperature"} == expected
+
+
+def test_rebuild_after_archiving_and_compaction_keeps_rollup(rows):
+    db.add_readings(rows)
+    incremental = daily_rollup()
+    db.archive_month(1, "2026-03")
+    db.rebuild_daily_rollup(1)
+    assert_same_rollup(incremental, daily_rollup())
+
+    # Mesures brutes resumees par heure : le resume journalier est recalcule depuis hourly_rollup
+    db.compact_archive(1, at("2026-04-01"))
+    db.rebuild_daily_rollup(1)
+    assert_same_rollup(incremental, daily_rollup())
+
+
+def test_late_reading_updates_rollup(rows):
+    db.add_readings(rows)
+    late = reading(1, at("2026-03-28", "03:03:03"), 40.5, None, 900.0)
+    db.add_readings([late])
+    temperature = daily_rollup()[("2026-03-28", "temperature")]
+    assert temperature[1] == 40.5
+    assert daily_rollup()[("2026-03-28", "pressure")][0] == 900.0
+    incremental = daily_rollup()
+    db.rebuild_daily_rollup(1)
+    assert_same_rollup(incremental, daily_rollup())